@@ -1,12 +1,19 @@
 # AI module - YOLO detection and other AI logic
-from .yolo_detector import (
-    YOLODetector,
-    create_yolo_detector,
-    get_yolo_detector
-)
-
-__all__ = [
-    'YOLODetector',
-    'create_yolo_detector',
-    'get_yolo_detector'
-]
+# Exports resolve on first use so importing a light submodule (ingest,
+# inference client) does not load torch and ultralytics
+import importlib
+
+_EXPORTS = {
+    'YOLODetector': '.yolo_detector',
+    'create_yolo_detector': '.yolo_detector',
+    'get_yolo_detector': '.yolo_detector',
+    'ImageContext': '.image_context'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,150 @@
+"""
+Cross-request micro-batching for the EfficientNet classifiers
+Tensors submitted by concurrent scans are collected for a few milliseconds
+(or until the batch is full) and run through one batched forward; the softmax
+rows are scattered back to the waiting callers through futures
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from .model_pool import ModelPool
+
+MICROBATCH_ENABLED = os.getenv("SCANNER_MICROBATCH", "true").lower() == "true"
+MICROBATCH_MAX_SIZE = max(1, int(os.getenv("SCANNER_MICROBATCH_MAX_SIZE", "8")))
+MICROBATCH_WAIT_MS = float(os.getenv("SCANNER_MICROBATCH_WAIT_MS", "5"))
+# Intra-op threads for batch workers; 0 keeps torch's default
+MICROBATCH_THREADS = int(os.getenv("SCANNER_MICROBATCH_THREADS", "0"))
+
+_Request = Tuple[torch.Tensor, Future]
+_STOP = object()  # queued by close(); a worker exits when it dequeues it
+
+
+class MicroBatcher:
+    """Batches classifier forwards across concurrent requests"""
+
+    def __init__(
+        self,
+        pool: ModelPool,
+        max_batch: int = MICROBATCH_MAX_SIZE,
+        max_wait_ms: float = MICROBATCH_WAIT_MS,
+        enabled: bool = MICROBATCH_ENABLED,
+        name: str = "model"
+    ):
+        """
+        Args:
+            pool: Replica pool of the classifier; one batch worker per replica
+            max_batch: Maximum rows per forward
+            max_wait_ms: How long the first request of a batch waits for company
+            enabled: When False, predict() runs the caller's forward directly
+            name: Label used for worker thread names
+        """
+        self.pool = pool
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.enabled = enabled
+        self.name = name
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        if len(self._workers) >= self.pool.size:
+            return
+        with self._lock:
+            while not self._closed and len(self._workers) < self.pool.size:
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"batch-{self.name}-{len(self._workers)}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, x: torch.Tensor) -> "Future[np.ndarray]":
+        """
+        Queue an NxCxHxW tensor for the next batch
+
+        Returns:
+            Future resolving to an N x num_classes array of softmax rows
+        """
+        self._ensure_workers()
+        future: "Future[np.ndarray]" = Future()
+        with self._lock:
+            if not self._closed:
+                self._queue.put((x, future))
+                return future
+        # Closed (model version swapped out): serve this straggler directly
+        try:
+            future.set_result(self._forward(x))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        """Stop the workers once the requests already queued are served"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for _ in self._workers:
+                self._queue.put(_STOP)
+
+    def predict(self, x: torch.Tensor) -> np.ndarray:
+        """Softmax rows for x, batched with other callers when enabled"""
+        if self.enabled:
+            return self.submit(x).result()
+        return self._forward(x)
+
+    def _forward(self, x: torch.Tensor) -> np.ndarray:
+        with self.pool.acquire() as model, torch.no_grad():
+            outputs = model(x)
+            return torch.softmax(outputs, dim=1).cpu().numpy()
+
+    def _collect(self, first: _Request) -> Tuple[List[_Request], Optional[_Request]]:
+        batch = [first]
+        rows = first[0].shape[0]
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP or rows + item[0].shape[0] > self.max_batch:
+                # Does not fit (or is the stop marker); it opens the next batch
+                return batch, item
+            batch.append(item)
+            rows += item[0].shape[0]
+        return batch, None
+
+    def _worker_loop(self):
+        if MICROBATCH_THREADS > 0:
+            torch.set_num_threads(MICROBATCH_THREADS)
+        carry = None
+        while True:
+            first = carry if carry is not None else self._queue.get()
+            if first is _STOP:
+                return
+            batch, carry = self._collect(first)
+            try:
+                inputs = batch[0][0] if len(batch) == 1 else torch.cat([x for x, _ in batch])
+                probs = self._forward(inputs)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for x, future in batch:
+                n = x.shape[0]
+                future.set_result(probs[offset:offset + n])
+                offset += n
@@ -0,0 +1,80 @@
+"""
+BlurHash placeholders computed with numpy
+A ~30 character string the client decodes into a blurred preview of a photo,
+so lists can be drawn before any thumbnail has been downloaded.
+Encoding follows the reference algorithm (https://blurha.sh).
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Components along the longer side; the shorter side gets proportionally fewer
+MAX_COMPONENTS = 4
+# The hash only keeps a handful of cosine terms, so a tiny input is enough
+SAMPLE_SIDE = 32
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(px: np.ndarray) -> np.ndarray:
+    v = px / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = min(max(value, 0.0), 1.0)
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def components_for(size: Tuple[int, int], max_components: int = MAX_COMPONENTS) -> Tuple[int, int]:
+    """(x, y) component counts keeping the aspect ratio of size=(width, height)"""
+    width, height = size
+    if width >= height:
+        return max_components, max(1, min(9, round(max_components * height / width)))
+    return max(1, min(9, round(max_components * width / height))), max_components
+
+
+def blurhash(image: Image.Image, components: Optional[Tuple[int, int]] = None) -> str:
+    """BlurHash of an upright, decoded image"""
+    cx, cy = components or components_for(image.size)
+    scale = SAMPLE_SIDE / max(image.size)
+    if scale < 1:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    small = image.convert("RGB")
+    linear = _srgb_to_linear(np.asarray(small, dtype=np.float64))
+    height, width = linear.shape[:2]
+
+    # factors[j, i] = mean over pixels of cos(pi*i*x/w) * cos(pi*j*y/h) * color
+    basis_x = np.cos(np.pi * np.arange(cx)[:, None] * np.arange(width)[None, :] / width)
+    basis_y = np.cos(np.pi * np.arange(cy)[:, None] * np.arange(height)[None, :] / height)
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, linear) / (width * height)
+    factors[1:] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+
+    parts = [_base83((cx - 1) + (cy - 1) * 9, 1)]
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum = 0, 1.0
+    parts.append(_base83(quantised_max, 1))
+
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    parts.append(_base83((r << 16) + (g << 8) + b, 4))
+
+    # Signed square root, quantised to 0..18 per channel
+    quantised = np.clip(np.floor(np.sign(ac) * np.sqrt(np.abs(ac / maximum)) * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        parts.append(_base83(int(qr) * 19 * 19 + int(qg) * 19 + int(qb), 2))
+    return "".join(parts)
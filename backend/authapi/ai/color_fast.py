@@ -0,0 +1,265 @@
+"""
+Classical color fast path
+HSV and Lab histograms of the durian region, classified by a small
+calibrated softmax (logistic) regression. get_durian_color answers from it
+when its confidence clears the calibrated threshold and runs the CNN only
+for the uncertain rest.
+
+The model is a JSON file written by training_scripts/calibrate_color_fast.py
+(backend/models/durian_color_histogram.json by default). Without it the
+fast path is off and every image goes to the CNN.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+from .image_context import ImageContext
+
+BASE_DIR = Path(__file__).parent.parent.parent
+MODELS_DIR = BASE_DIR / "models"
+
+COLOR_FAST_ENABLED = os.getenv("SCANNER_COLOR_FAST", "true").lower() == "true"
+COLOR_FAST_MODEL = Path(os.getenv("SCANNER_COLOR_FAST_MODEL", str(MODELS_DIR / "durian_color_histogram.json")))
+# Overrides the calibrated confidence threshold when set
+COLOR_FAST_MIN_CONFIDENCE = os.getenv("SCANNER_COLOR_FAST_MIN_CONFIDENCE")
+
+# Regions are reduced to this size before the histograms; color statistics
+# do not need more pixels
+FEATURE_SIDE = 64
+HUE_BINS = 18
+CHANNEL_BINS = 8
+# Lab a*/b* ranges the bins cover; values outside are clamped to the edge bins
+A_RANGE = (-40.0, 40.0)
+B_RANGE = (-10.0, 70.0)
+# Hue is weighted by saturation; grey pixels carry no hue information
+FEATURE_NAMES = (
+    [f"hue_{i}" for i in range(HUE_BINS)]
+    + [f"sat_{i}" for i in range(CHANNEL_BINS)]
+    + [f"val_{i}" for i in range(CHANNEL_BINS)]
+    + [f"a_{i}" for i in range(CHANNEL_BINS)]
+    + [f"b_{i}" for i in range(CHANNEL_BINS)]
+)
+FEATURE_SIZE = len(FEATURE_NAMES)
+
+# Pixels inside the ellipse inscribed in the region; the corners of a
+# detection box are mostly background
+_yy, _xx = np.mgrid[0:FEATURE_SIDE, 0:FEATURE_SIDE]
+_center = (FEATURE_SIDE - 1) / 2
+ELLIPSE_MASK = (((_xx - _center) / (FEATURE_SIDE / 2)) ** 2 + ((_yy - _center) / (FEATURE_SIDE / 2)) ** 2) <= 1.0
+del _yy, _xx, _center
+
+
+def _srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """Nx3 sRGB in [0, 1] -> Nx3 CIE Lab (D65)"""
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    return np.stack([
+        116 * f[:, 1] - 16,
+        500 * (f[:, 0] - f[:, 1]),
+        200 * (f[:, 1] - f[:, 2]),
+    ], axis=1)
+
+
+def _histogram(values: np.ndarray, bins: int, low: float, high: float, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    index = np.clip(((values - low) / (high - low) * bins).astype(np.int64), 0, bins - 1)
+    hist = np.bincount(index, weights=weights, minlength=bins).astype(np.float32)
+    total = hist.sum()
+    return hist / total if total > 0 else hist
+
+
+def color_features(image: ImageContext) -> np.ndarray:
+    """FEATURE_SIZE-long vector of normalized HSV and Lab histograms"""
+    small = image.image.resize((FEATURE_SIDE, FEATURE_SIDE), Image.BILINEAR)
+    hsv = np.asarray(small.convert("HSV"), dtype=np.float32)[ELLIPSE_MASK] / 255.0
+    rgb = np.asarray(small, dtype=np.float32)[ELLIPSE_MASK] / 255.0
+    lab = _srgb_to_lab(rgb)
+
+    return np.concatenate([
+        _histogram(hsv[:, 0], HUE_BINS, 0.0, 1.0, weights=hsv[:, 1]),
+        _histogram(hsv[:, 1], CHANNEL_BINS, 0.0, 1.0),
+        _histogram(hsv[:, 2], CHANNEL_BINS, 0.0, 1.0),
+        _histogram(lab[:, 1], CHANNEL_BINS, *A_RANGE),
+        _histogram(lab[:, 2], CHANNEL_BINS, *B_RANGE),
+    ])
+
+
+def color_features_batch(images: Sequence[ImageContext]) -> np.ndarray:
+    """N x FEATURE_SIZE feature matrix"""
+    if not images:
+        return np.zeros((0, FEATURE_SIZE), dtype=np.float32)
+    return np.stack([color_features(img) for img in images])
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class HistogramColorModel:
+    """Standardized features -> softmax regression, plus its calibrated threshold"""
+
+    def __init__(
+        self,
+        classes: List[str],
+        weights: np.ndarray,
+        bias: np.ndarray,
+        mean: np.ndarray,
+        std: np.ndarray,
+        min_confidence: float,
+        version: str = "1",
+        report: Optional[Dict[str, Any]] = None
+    ):
+        self.classes = list(classes)
+        self.weights = np.asarray(weights, dtype=np.float32)  # C x F
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.std = np.asarray(std, dtype=np.float32)
+        self.min_confidence = float(min_confidence)
+        self.version = str(version)
+        self.report = report or {}
+        if self.weights.shape != (len(self.classes), FEATURE_SIZE):
+            raise ValueError(f"Expected weights of shape {(len(self.classes), FEATURE_SIZE)}, got {self.weights.shape}")
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """N x C class probabilities"""
+        z = (features - self.mean) / self.std
+        return softmax(z @ self.weights.T + self.bias)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "classes": self.classes,
+            "features": FEATURE_NAMES,
+            "weights": self.weights.tolist(),
+            "bias": self.bias.tolist(),
+            "mean": self.mean.tolist(),
+            "std": self.std.tolist(),
+            "min_confidence": self.min_confidence,
+            "report": self.report,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HistogramColorModel":
+        if data.get("features") and list(data["features"]) != FEATURE_NAMES:
+            raise ValueError("Model was calibrated on a different feature layout; re-run the calibration")
+        return cls(
+            data["classes"], data["weights"], data["bias"], data["mean"], data["std"],
+            data["min_confidence"], data.get("version", "1"), data.get("report")
+        )
+
+    def save(self, path: Path):
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2))
+
+    @classmethod
+    def load(cls, path: Path) -> "HistogramColorModel":
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+
+class ColorFastPath:
+    """The calibrated model, reloaded when its file changes, and hit counters"""
+
+    def __init__(self, path: Path = COLOR_FAST_MODEL, enabled: bool = COLOR_FAST_ENABLED):
+        self.path = Path(path)
+        self.enabled = enabled
+        self._model: Optional[HistogramColorModel] = None
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self.stats = {"fast": 0, "fallback": 0}
+
+    @property
+    def model(self) -> Optional[HistogramColorModel]:
+        if not self.enabled:
+            return None
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self._model = HistogramColorModel.load(self.path)
+                        print(f"✅ Color fast path v{self._model.version} loaded (min confidence {self.min_confidence_for(self._model)})")
+                    except Exception as e:
+                        print(f"❌ Color fast path not loaded: {e}")
+                        self._model = None
+                    self._mtime = mtime
+        return self._model
+
+    @staticmethod
+    def min_confidence_for(model: HistogramColorModel) -> float:
+        if COLOR_FAST_MIN_CONFIDENCE is not None:
+            return float(COLOR_FAST_MIN_CONFIDENCE)
+        return model.min_confidence
+
+    def classify(self, images: Sequence[ImageContext]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Fast-path predictions
+
+        Returns:
+            One color result per image, or None where the fast model is not
+            confident enough (or not available) and the CNN has to decide
+        """
+        model = self.model
+        if model is None or not images:
+            return [None] * len(images)
+
+        probs = model.predict_proba(color_features_batch(images))
+        threshold = self.min_confidence_for(model)
+        results: List[Optional[Dict[str, Any]]] = []
+        for row in probs:
+            class_idx = int(np.argmax(row))
+            confidence = float(row[class_idx])
+            if confidence < threshold:
+                results.append(None)
+                continue
+            results.append({
+                "success": True,
+                "color_class": model.classes[class_idx],
+                "confidence": round(confidence, 4),
+                "class_index": class_idx,
+                "raw": [float(x) for x in row.tolist()]
+            })
+        hits = sum(r is not None for r in results)
+        with self._lock:
+            self.stats["fast"] += hits
+            self.stats["fallback"] += len(results) - hits
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        model = self.model
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats["fast"] + stats["fallback"]
+        return {
+            "enabled": self.enabled,
+            "loaded": model is not None,
+            "file": self.path.name,
+            "version": model.version if model else None,
+            "min_confidence": self.min_confidence_for(model) if model else None,
+            **stats,
+            "fast_rate": round(stats["fast"] / total, 4) if total else None,
+        }
+
+
+_fast_path: Optional[ColorFastPath] = None
+
+
+def get_color_fast_path() -> ColorFastPath:
+    global _fast_path
+    if _fast_path is None:
+        _fast_path = ColorFastPath()
+    return _fast_path
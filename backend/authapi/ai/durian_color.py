@@ -3,78 +3,123 @@
 Durian Color Classifier using EfficientNetB0
 """
 
-import os
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 
 import torch
 import timm
 import numpy as np
-from torchvision import transforms
-from PIL import Image
 
-COLOR_CLASSES = ['Brownish', 'Greenish']  # Match your training classes
+from .image_context import ImageContext, as_image_context, B0_INPUT_SIZE
+from .model_pool import ModelPool
+from .batching import MicroBatcher
+from .onnx_backend import load_classifier
+from .model_registry import ModelSpec, get_model_registry
+from .color_fast import get_color_fast_path
 
-_color_model = None
+COLOR_CLASSES = ['Brownish', 'Greenish']  # Match your training classes
 
 BASE_DIR = Path(__file__).parent.parent.parent
 MODELS_DIR = BASE_DIR / "models"
 DEFAULT_MODEL = MODELS_DIR / "durian_color_binary_best.pth"  # Update with your model filename
 
-def load_color_model(model_path: Optional[str] = None):
-	global _color_model
-	if _color_model is not None:
-		return _color_model
-	if model_path is None:
-		model_path = DEFAULT_MODEL
-	if not os.path.exists(model_path):
-		raise FileNotFoundError(f"Color model not found: {model_path}")
+DEFAULT_SPEC = ModelSpec("color", "1", DEFAULT_MODEL.name, "efficientnet_b0", COLOR_CLASSES, B0_INPUT_SIZE)
+
+def build_color_model(model_path, architecture: str = "efficientnet_b0", num_classes: int = len(COLOR_CLASSES)):
+	"""Eager PyTorch color model from a .pth state dict"""
 	# Use timm to create the model, matching training
-	model = timm.create_model("efficientnet_b0", pretrained=False)
-	model.classifier = torch.nn.Linear(model.classifier.in_features, len(COLOR_CLASSES))
+	model = timm.create_model(architecture, pretrained=False)
+	model.classifier = torch.nn.Linear(model.classifier.in_features, num_classes)
 	model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
 	model.eval()
-	_color_model = model
-	return _color_model
-
-def preprocess_image(img_path: str, target_size=(224, 224)):
-	img = Image.open(img_path).convert('RGB')
-	transform = transforms.Compose([
-		transforms.Resize(target_size),
-		transforms.ToTensor(),
-		transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-	])
-	x = transform(img).unsqueeze(0)  # Add batch dim
-	return x
-
-def get_durian_color(image_path: str, model_path: Optional[str] = None) -> Dict[str, Any]:
+	return model
+
+def _load_color(spec: ModelSpec) -> MicroBatcher:
+	if not spec.path.exists():
+		raise FileNotFoundError(f"Color model not found: {spec.path}")
+	build = lambda path: build_color_model(path, spec.architecture, len(spec.classes))
+	pool = ModelPool(lambda: load_classifier(spec.path, build), name=f"color@{spec.version}")
+	return MicroBatcher(pool, name="color")
+
+get_model_registry().register(DEFAULT_SPEC, _load_color, close=MicroBatcher.close)
+
+def get_color_batcher(model_path: Optional[str] = None) -> MicroBatcher:
+	"""The micro-batcher in front of the serving color model version"""
+	return get_model_registry().get("color", model_path).handle
+
+def get_color_pool(model_path: Optional[str] = None) -> ModelPool:
+	"""Replica pool serving the color model"""
+	return get_color_batcher(model_path).pool
+
+def load_color_model(model_path: Optional[str] = None):
+	return get_color_pool(model_path).primary
+
+def preprocess_image(image: Union[str, ImageContext], target_size=B0_INPUT_SIZE):
+	return as_image_context(image).tensor(target_size)  # 1x3xHxW, shared
+
+def _color_result(probs, model) -> Dict[str, Any]:
+	classes = model.spec.classes
+	class_idx = int(np.argmax(probs))
+	confidence = float(np.max(probs))
+	color_class = classes[class_idx] if class_idx < len(classes) else str(class_idx)
+	return {
+		"success": True,
+		"color_class": color_class,
+		"confidence": round(confidence, 4),
+		"class_index": class_idx,
+		"raw": [float(x) for x in probs.tolist()]  # Ensure all values are native Python floats
+	}
+
+def get_durian_color(image: Union[str, ImageContext], model_path: Optional[str] = None) -> Dict[str, Any]:
 	"""
 	Predict durian color class from image using EfficientNetB0 (PyTorch)
+	The histogram fast path answers first when it is confident; an explicit
+	model_path always runs that CNN.
 	Args:
-		image_path: Path to image file
+		image: Path to image file or an already decoded ImageContext
 		model_path: Optional path to .pth model
 	Returns:
-		Dict with prediction result
+		Dict with prediction result (the same keys whichever model answered)
 	"""
 	try:
-		model = load_color_model(model_path)
-		img = preprocess_image(image_path)
-		with torch.no_grad():
-			outputs = model(img)
-			probs = torch.softmax(outputs, dim=1).cpu().numpy()[0]
-		class_idx = int(np.argmax(probs))
-		confidence = float(np.max(probs))
-		color_class = COLOR_CLASSES[class_idx] if class_idx < len(COLOR_CLASSES) else str(class_idx)
-		return {
-			"success": True,
-			"color_class": color_class,
-			"confidence": round(confidence, 4),
-			"class_index": class_idx,
-			"raw": [float(x) for x in probs.tolist()]  # Ensure all values are native Python floats
-		}
+		image = as_image_context(image)
+		if model_path is None:
+			fast = get_color_fast_path().classify([image])[0]
+			if fast is not None:
+				return fast
+		model = get_model_registry().get("color", model_path)
+		img = preprocess_image(image, model.spec.input_size)
+		return _color_result(model.handle.predict(img)[0], model)
 	except Exception as e:
 		return {
 			"success": False,
 			"error": str(type(e).__name__),
 			"message": str(e)
 		}
+
+def get_durian_color_batch(images: List[ImageContext], model_path: Optional[str] = None) -> List[Dict[str, Any]]:
+	"""
+	Predict the color of several images (e.g. per-fruit crops); only those the
+	histogram fast path is unsure about go through one batched CNN forward
+	Returns:
+		One prediction dict per image, in order
+	"""
+	if not images:
+		return []
+	results = [None] * len(images)
+	try:
+		if model_path is None:
+			results = get_color_fast_path().classify(images)
+		pending = [i for i, result in enumerate(results) if result is None]
+		if pending:
+			model = get_model_registry().get("color", model_path)
+			batch = torch.cat([preprocess_image(images[i], model.spec.input_size) for i in pending])
+			for i, probs in zip(pending, model.handle.predict(batch)):
+				results[i] = _color_result(probs, model)
+		return results
+	except Exception as e:
+		return [result or {
+			"success": False,
+			"error": str(type(e).__name__),
+			"message": str(e)
+		} for result in results]
@@ -3,40 +3,104 @@ Durian Disease Detector (YOLOv8)
 Classes: mold, rot
 """
 
-import os
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 
 from ultralytics import YOLO
 
-_disease_model = None
+from .image_context import ImageContext
+from .model_pool import ModelPool
+from .onnx_backend import resolve_yolo_weights
+from .model_registry import ModelSpec, get_model_registry
 
 BASE_DIR = Path(__file__).parent.parent.parent
 MODELS_DIR = BASE_DIR / "models"
 DEFAULT_MODEL = MODELS_DIR / "durian_disease_v8_best.pt"
 
+DISEASE_CLASSES = ["mold", "rot"]
+
+DEFAULT_SPEC = ModelSpec("disease", "1", DEFAULT_MODEL.name, "yolov8", DISEASE_CLASSES, (640, 640))
+
+
+def _load_disease(spec: ModelSpec) -> ModelPool:
+    if not spec.path.exists():
+        raise FileNotFoundError(f"Disease model not found: {spec.path}")
+    # ultralytics predictors are not thread-safe; one YOLO per replica
+    weights = resolve_yolo_weights(spec.path)
+    return ModelPool(lambda: YOLO(str(weights), task="detect"), name=f"disease@{spec.version}")
+
+
+get_model_registry().register(DEFAULT_SPEC, _load_disease)
+
+
+def get_disease_pool(model_path: Optional[str] = None) -> ModelPool:
+    """Replica pool serving the disease model version in the manifest"""
+    return get_model_registry().get("disease", model_path).handle
+
 
 def load_disease_model(model_path: Optional[str] = None):
-    global _disease_model
+    return get_disease_pool(model_path).primary
+
 
-    if _disease_model is not None:
-        return _disease_model
+def _disease_result(results) -> Dict[str, Any]:
+    detections = []
+    best_detection = None  # highest confidence detection
 
-    if model_path is None:
-        model_path = DEFAULT_MODEL
+    for r in results:
+        boxes = r.boxes
+        names = r.names
 
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Disease model not found: {model_path}")
+        if boxes is None:
+            continue
 
-    model = YOLO(str(model_path))
-    _disease_model = model
-    return _disease_model
+        for box in boxes:
+            class_id = int(box.cls[0])
+            confidence = float(box.conf[0])
+            bbox = box.xyxy[0].tolist()
 
+            class_name = names[class_id]
 
-def get_durian_disease(image_path: str, model_path: Optional[str] = None) -> Dict[str, Any]:
+            detection_data = {
+                "class_id": class_id,
+                "class_name": class_name,
+                "confidence": round(confidence, 4),
+                "bbox": [float(x) for x in bbox]
+            }
+
+            detections.append(detection_data)
+
+            # Track highest confidence detection
+            if best_detection is None or confidence > best_detection["confidence"]:
+                best_detection = {
+                    "class_name": class_name,
+                    "confidence": confidence
+                }
+
+    # Decide final disease label
+    if best_detection:
+        final_disease = best_detection["class_name"]
+        final_confidence = round(best_detection["confidence"], 4)
+    else:
+        final_disease = "healthy"
+        final_confidence = 0.0
+
+    return {
+        "success": True,
+        "disease": final_disease,  # IMPORTANT for frontend
+        "confidence": final_confidence,
+        "total_detections": len(detections),
+        "detections": detections
+    }
+
+
+def get_durian_disease(image: Union[str, ImageContext], model_path: Optional[str] = None) -> Dict[str, Any]:
     """
     Detect durian diseases using YOLOv8
 
+    Args:
+        image: Path to image file or an already decoded ImageContext
+        model_path: Optional path to .pt model
+
     Classes:
         0 = mold
         1 = rot
@@ -44,61 +108,42 @@ def get_durian_disease(image_path: str, model_path: Optional[str] = None) -> Dic
     """
 
     try:
-        model = load_disease_model(model_path)
-        results = model(image_path, verbose=False)
+        loaded = get_model_registry().get("disease", model_path)
+        source = image.bgr if isinstance(image, ImageContext) else image
+        with loaded.handle.acquire() as model:
+            results = model(source, imgsz=loaded.spec.input_size[0], verbose=False)
 
-        detections = []
-        best_detection = None  # highest confidence detection
+        return _disease_result(results)
 
-        for r in results:
-            boxes = r.boxes
-            names = r.names
-
-            if boxes is None:
-                continue
-
-            for box in boxes:
-                class_id = int(box.cls[0])
-                confidence = float(box.conf[0])
-                bbox = box.xyxy[0].tolist()
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(type(e).__name__),
+            "message": str(e)
+        }
 
-                class_name = names[class_id]
 
-                detection_data = {
-                    "class_id": class_id,
-                    "class_name": class_name,
-                    "confidence": round(confidence, 4),
-                    "bbox": [float(x) for x in bbox]
-                }
-
-                detections.append(detection_data)
+def get_durian_disease_batch(images: List[ImageContext], model_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Detect diseases on several images (e.g. per-fruit crops) in one YOLO call
 
-                # Track highest confidence detection
-                if best_detection is None or confidence > best_detection["confidence"]:
-                    best_detection = {
-                        "class_name": class_name,
-                        "confidence": confidence
-                    }
+    Bbox coordinates in each result are relative to its own image.
 
-        # Decide final disease label
-        if best_detection:
-            final_disease = best_detection["class_name"]
-            final_confidence = round(best_detection["confidence"], 4)
-        else:
-            final_disease = "healthy"
-            final_confidence = 0.0
+    Returns:
+        One disease dict per image, in order
+    """
+    if not images:
+        return []
+    try:
+        loaded = get_model_registry().get("disease", model_path)
+        with loaded.handle.acquire() as model:
+            results = model([img.bgr for img in images], imgsz=loaded.spec.input_size[0], verbose=False)
 
-        return {
-            "success": True,
-            "disease": final_disease,  # IMPORTANT for frontend
-            "confidence": final_confidence,
-            "total_detections": len(detections),
-            "detections": detections
-        }
+        return [_disease_result([r]) for r in results]
 
     except Exception as e:
-        return {
+        return [{
             "success": False,
             "error": str(type(e).__name__),
             "message": str(e)
-        }
\ No newline at end of file
+        } for _ in images]
@@ -2,15 +2,18 @@
 Durian Shape Classifier using EfficientNetB3
 """
 
-import os
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 
 import torch
 import timm
 import numpy as np
-from torchvision import transforms
-from PIL import Image
+
+from .image_context import ImageContext, as_image_context, B3_INPUT_SIZE
+from .model_pool import ModelPool
+from .batching import MicroBatcher
+from .onnx_backend import load_classifier
+from .model_registry import ModelSpec, get_model_registry
 
 # 🔥 IMPORTANT:
 # Must match training folder order (alphabetical order of folders inside train/)
@@ -18,30 +21,20 @@ from PIL import Image
 # ['elongated', 'oval', 'round']
 SHAPE_CLASSES = ['Elongated', 'Irregular', 'Round']  
 
-_shape_model = None
-
 BASE_DIR = Path(__file__).parent.parent.parent
 MODELS_DIR = BASE_DIR / "models"
 DEFAULT_MODEL = MODELS_DIR / "durian_shape_best.pth"
 
+DEFAULT_SPEC = ModelSpec("shape", "1", DEFAULT_MODEL.name, "efficientnet_b3", SHAPE_CLASSES, B3_INPUT_SIZE)
 
-def load_shape_model(model_path: Optional[str] = None):
-    global _shape_model
-
-    if _shape_model is not None:
-        return _shape_model
-
-    if model_path is None:
-        model_path = DEFAULT_MODEL
-
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Shape model not found: {model_path}")
 
+def build_shape_model(model_path, architecture: str = "efficientnet_b3", num_classes: int = len(SHAPE_CLASSES)):
+    """Eager PyTorch shape model from a .pth state dict"""
     # Must match training architecture (EfficientNet-B3)
-    model = timm.create_model("efficientnet_b3", pretrained=False)
+    model = timm.create_model(architecture, pretrained=False)
     model.classifier = torch.nn.Linear(
         model.classifier.in_features,
-        len(SHAPE_CLASSES)
+        num_classes
     )
 
     model.load_state_dict(
@@ -49,68 +42,105 @@ def load_shape_model(model_path: Optional[str] = None):
     )
 
     model.eval()
-    _shape_model = model
-    return _shape_model
+    return model
+
+
+def _load_shape(spec: ModelSpec) -> MicroBatcher:
+    if not spec.path.exists():
+        raise FileNotFoundError(f"Shape model not found: {spec.path}")
+    build = lambda path: build_shape_model(path, spec.architecture, len(spec.classes))
+    pool = ModelPool(lambda: load_classifier(spec.path, build), name=f"shape@{spec.version}")
+    return MicroBatcher(pool, name="shape")
+
+
+get_model_registry().register(DEFAULT_SPEC, _load_shape, close=MicroBatcher.close)
+
+
+def get_shape_batcher(model_path: Optional[str] = None) -> MicroBatcher:
+    """The micro-batcher in front of the serving shape model version"""
+    return get_model_registry().get("shape", model_path).handle
+
+
+def get_shape_pool(model_path: Optional[str] = None) -> ModelPool:
+    """Replica pool serving the shape model"""
+    return get_shape_batcher(model_path).pool
+
+
+def load_shape_model(model_path: Optional[str] = None):
+    return get_shape_pool(model_path).primary
 
 
-def preprocess_image(img_path: str, target_size=(300, 300)):
-    img = Image.open(img_path).convert("RGB")
+def preprocess_image(image: Union[str, ImageContext], target_size=B3_INPUT_SIZE):
+    # Shared 1x3xHxW tensor; decoded and normalized once per image
+    return as_image_context(image).tensor(target_size)
 
-    transform = transforms.Compose([
-        transforms.Resize(target_size),
-        transforms.ToTensor(),
-        transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
-        ),
-    ])
 
-    x = transform(img).unsqueeze(0)
-    return x
+def _shape_result(probs, model) -> Dict[str, Any]:
+    classes = model.spec.classes
+    class_idx = int(np.argmax(probs))
+    confidence = float(np.max(probs))
+
+    shape_class = (
+        classes[class_idx]
+        if class_idx < len(classes)
+        else str(class_idx)
+    )
+
+    return {
+        "success": True,
+        "shape_class": shape_class,
+        "confidence": round(confidence, 4),
+        "class_index": class_idx,
+        "raw": [float(x) for x in probs.tolist()]
+    }
 
 
 def get_durian_shape(
-    image_path: str,
+    image: Union[str, ImageContext],
     model_path: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Predict durian shape class from image using EfficientNetB3 (PyTorch)
 
     Args:
-        image_path: Path to image file
+        image: Path to image file or an already decoded ImageContext
         model_path: Optional path to .pth model
 
     Returns:
         Dict with prediction result
     """
     try:
-        model = load_shape_model(model_path)
-        img = preprocess_image(image_path)
-
-        with torch.no_grad():
-            outputs = model(img)
-            probs = torch.softmax(outputs, dim=1).cpu().numpy()[0]
-
-        class_idx = int(np.argmax(probs))
-        confidence = float(np.max(probs))
+        model = get_model_registry().get("shape", model_path)
+        img = preprocess_image(image, model.spec.input_size)
 
-        shape_class = (
-            SHAPE_CLASSES[class_idx]
-            if class_idx < len(SHAPE_CLASSES)
-            else str(class_idx)
-        )
+        # Batched with concurrent scans when SCANNER_MICROBATCH is on
+        return _shape_result(model.handle.predict(img)[0], model)
 
+    except Exception as e:
         return {
-            "success": True,
-            "shape_class": shape_class,
-            "confidence": round(confidence, 4),
-            "class_index": class_idx,
-            "raw": [float(x) for x in probs.tolist()]
+            "success": False,
+            "error": str(type(e).__name__),
+            "message": str(e)
         }
 
+
+def get_durian_shape_batch(images: List[ImageContext], model_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Predict the shape of several images (e.g. per-fruit crops) in one batched forward
+
+    Returns:
+        One prediction dict per image, in order
+    """
+    if not images:
+        return []
+    try:
+        model = get_model_registry().get("shape", model_path)
+        batch = torch.cat([preprocess_image(img, model.spec.input_size) for img in images])
+        return [_shape_result(probs, model) for probs in model.handle.predict(batch)]
+
     except Exception as e:
-        return {
+        return [{
             "success": False,
             "error": str(type(e).__name__),
             "message": str(e)
-        }
\ No newline at end of file
+        } for _ in images]
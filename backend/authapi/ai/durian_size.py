@@ -2,42 +2,36 @@
 Durian Size Classifier using EfficientNetB0
 """
 
-import os
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 
 import torch
 import timm
 import numpy as np
-from torchvision import transforms
-from PIL import Image
+
+from .image_context import ImageContext, as_image_context, B0_INPUT_SIZE
+from .model_pool import ModelPool
+from .batching import MicroBatcher
+from .onnx_backend import load_classifier
+from .model_registry import ModelSpec, get_model_registry
 
 # Must match training folder order (alphabetical)
 SIZE_CLASSES = ['Large', 'Medium', 'Small']
 
-_size_model = None
-
 BASE_DIR = Path(__file__).parent.parent.parent
 MODELS_DIR = BASE_DIR / "models"
 DEFAULT_MODEL = MODELS_DIR / "durian_size_best.pth"
 
-def load_size_model(model_path: Optional[str] = None):
-    global _size_model
-
-    if _size_model is not None:
-        return _size_model
-
-    if model_path is None:
-        model_path = DEFAULT_MODEL
+DEFAULT_SPEC = ModelSpec("size", "1", DEFAULT_MODEL.name, "efficientnet_b0", SIZE_CLASSES, B0_INPUT_SIZE)
 
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Size model not found: {model_path}")
 
+def build_size_model(model_path, architecture: str = "efficientnet_b0", num_classes: int = len(SIZE_CLASSES)):
+    """Eager PyTorch size model from a .pth state dict"""
     # Create same architecture used in training
-    model = timm.create_model("efficientnet_b0", pretrained=False)
+    model = timm.create_model(architecture, pretrained=False)
     model.classifier = torch.nn.Linear(
         model.classifier.in_features,
-        len(SIZE_CLASSES)
+        num_classes
     )
 
     model.load_state_dict(
@@ -45,65 +39,102 @@ def load_size_model(model_path: Optional[str] = None):
     )
 
     model.eval()
-    _size_model = model
-    return _size_model
+    return model
+
+
+def _load_size(spec: ModelSpec) -> MicroBatcher:
+    if not spec.path.exists():
+        raise FileNotFoundError(f"Size model not found: {spec.path}")
+    build = lambda path: build_size_model(path, spec.architecture, len(spec.classes))
+    pool = ModelPool(lambda: load_classifier(spec.path, build), name=f"size@{spec.version}")
+    return MicroBatcher(pool, name="size")
+
+
+get_model_registry().register(DEFAULT_SPEC, _load_size, close=MicroBatcher.close)
 
 
-def preprocess_image(img_path: str, target_size=(224, 224)):
-    img = Image.open(img_path).convert('RGB')
+def get_size_batcher(model_path: Optional[str] = None) -> MicroBatcher:
+    """The micro-batcher in front of the serving size model version"""
+    return get_model_registry().get("size", model_path).handle
 
-    transform = transforms.Compose([
-        transforms.Resize(target_size),
-        transforms.ToTensor(),
-        transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
-        ),
-    ])
 
-    x = transform(img).unsqueeze(0)
-    return x
+def get_size_pool(model_path: Optional[str] = None) -> ModelPool:
+    """Replica pool serving the size model"""
+    return get_size_batcher(model_path).pool
 
 
-def get_durian_size(image_path: str, model_path: Optional[str] = None) -> Dict[str, Any]:
+def load_size_model(model_path: Optional[str] = None):
+    return get_size_pool(model_path).primary
+
+
+def preprocess_image(image: Union[str, ImageContext], target_size=B0_INPUT_SIZE):
+    # Shared 1x3xHxW tensor; decoded and normalized once per image
+    return as_image_context(image).tensor(target_size)
+
+
+def _size_result(probs, model) -> Dict[str, Any]:
+    classes = model.spec.classes
+    class_idx = int(np.argmax(probs))
+    confidence = float(np.max(probs))
+
+    size_class = (
+        classes[class_idx]
+        if class_idx < len(classes)
+        else str(class_idx)
+    )
+
+    return {
+        "success": True,
+        "size_class": size_class,
+        "confidence": round(confidence, 4),
+        "class_index": class_idx,
+        "raw": [float(x) for x in probs.tolist()]
+    }
+
+
+def get_durian_size(image: Union[str, ImageContext], model_path: Optional[str] = None) -> Dict[str, Any]:
     """
     Predict durian size class from image using EfficientNetB0 (PyTorch)
 
     Args:
-        image_path: Path to image file
+        image: Path to image file or an already decoded ImageContext
         model_path: Optional path to .pth model
 
     Returns:
         Dict with prediction result
     """
     try:
-        model = load_size_model(model_path)
-        img = preprocess_image(image_path)
-
-        with torch.no_grad():
-            outputs = model(img)
-            probs = torch.softmax(outputs, dim=1).cpu().numpy()[0]
-
-        class_idx = int(np.argmax(probs))
-        confidence = float(np.max(probs))
+        model = get_model_registry().get("size", model_path)
+        img = preprocess_image(image, model.spec.input_size)
 
-        size_class = (
-            SIZE_CLASSES[class_idx]
-            if class_idx < len(SIZE_CLASSES)
-            else str(class_idx)
-        )
+        # Batched with concurrent scans when SCANNER_MICROBATCH is on
+        return _size_result(model.handle.predict(img)[0], model)
 
+    except Exception as e:
         return {
-            "success": True,
-            "size_class": size_class,
-            "confidence": round(confidence, 4),
-            "class_index": class_idx,
-            "raw": [float(x) for x in probs.tolist()]
+            "success": False,
+            "error": str(type(e).__name__),
+            "message": str(e)
         }
 
+
+def get_durian_size_batch(images: List[ImageContext], model_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Predict the size of several images (e.g. per-fruit crops) in one batched forward
+
+    Returns:
+        One prediction dict per image, in order
+    """
+    if not images:
+        return []
+    try:
+        model = get_model_registry().get("size", model_path)
+        batch = torch.cat([preprocess_image(img, model.spec.input_size) for img in images])
+        return [_size_result(probs, model) for probs in model.handle.predict(batch)]
+
     except Exception as e:
-        return {
+        return [{
             "success": False,
             "error": str(type(e).__name__),
             "message": str(e)
-        }
\ No newline at end of file
+        } for _ in images]
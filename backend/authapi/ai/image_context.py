@@ -0,0 +1,144 @@
+"""
+Shared decoded image for the scanner pipeline
+Decodes an upload once and derives every model input from that single buffer
+
+torch / torchvision are imported on first tensor() call, so web workers
+that only decode and forward pixels to the inference service stay light
+"""
+
+import threading
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+if TYPE_CHECKING:
+    import torch
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+B0_INPUT_SIZE = (224, 224)  # color / size classifiers
+B3_INPUT_SIZE = (300, 300)  # shape classifier
+
+_transforms: Dict[Tuple[int, int], Any] = {}
+_transforms_lock = threading.Lock()
+
+
+def get_transform(target_size: Tuple[int, int]):
+    """Get the (cached) classifier preprocessing transform for a target size"""
+    target_size = tuple(target_size)
+    transform = _transforms.get(target_size)
+    if transform is None:
+        with _transforms_lock:
+            transform = _transforms.get(target_size)
+            if transform is None:
+                from torchvision import transforms
+                transform = transforms.Compose([
+                    transforms.Resize(target_size),
+                    transforms.ToTensor(),
+                    transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+                ])
+                _transforms[target_size] = transform
+    return transform
+
+
+class ImageContext:
+    """An uploaded image decoded once and shared by every model"""
+
+    def __init__(
+        self,
+        image: Image.Image,
+        source_path: Optional[str] = None,
+        original_size: Optional[Tuple[int, int]] = None
+    ):
+        """
+        Args:
+            image: Decoded PIL image
+            source_path: Original file path, if the image came from disk
+            original_size: Upload size before ingress downscaling, if any
+        """
+        self.image = image if image.mode == "RGB" else image.convert("RGB")
+        self.source_path = source_path
+        self.original_size = tuple(original_size) if original_size else self.image.size
+        self._array = None
+        self._bgr = None
+        self._tensors: Dict[Tuple[int, int], "torch.Tensor"] = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_path(cls, image_path: str) -> "ImageContext":
+        """Decode an image file"""
+        with Image.open(image_path) as img:
+            return cls(img.convert("RGB"), source_path=str(image_path))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ImageContext":
+        """Decode an in-memory upload"""
+        with Image.open(BytesIO(data)) as img:
+            return cls(img.convert("RGB"))
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(width, height) of the decoded image"""
+        return self.image.size
+
+    @property
+    def array(self) -> np.ndarray:
+        """HxWx3 uint8 RGB buffer"""
+        if self._array is None:
+            with self._lock:
+                if self._array is None:
+                    self._array = np.asarray(self.image)
+        return self._array
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """HxWx3 uint8 BGR buffer, the layout ultralytics expects for arrays"""
+        if self._bgr is None:
+            with self._lock:
+                if self._bgr is None:
+                    self._bgr = np.ascontiguousarray(self.array[:, :, ::-1])
+        return self._bgr
+
+    def crop(self, bbox: Dict[str, float], padding: float = 0.0) -> "ImageContext":
+        """
+        A new context for a pixel bbox ({"x1", "y1", "x2", "y2"}), grown by
+        padding (a fraction of the box size) on every side and clamped to
+        the image
+        """
+        width, height = self.size
+        pad_x = (bbox["x2"] - bbox["x1"]) * padding
+        pad_y = (bbox["y2"] - bbox["y1"]) * padding
+        left = max(0, int(bbox["x1"] - pad_x))
+        top = max(0, int(bbox["y1"] - pad_y))
+        right = min(width, int(round(bbox["x2"] + pad_x)))
+        bottom = min(height, int(round(bbox["y2"] + pad_y)))
+        if right <= left or bottom <= top:
+            raise ValueError(f"Empty crop for bbox {bbox}")
+        return ImageContext(self.image.crop((left, top, right, bottom)), source_path=self.source_path)
+
+    def tensor(self, target_size: Tuple[int, int]) -> "torch.Tensor":
+        """
+        Normalized 1x3xHxW classifier input at target_size
+
+        The tensor is computed once per size and shared, so callers must
+        not modify it in place.
+        """
+        target_size = tuple(target_size)
+        x = self._tensors.get(target_size)
+        if x is None:
+            with self._lock:
+                x = self._tensors.get(target_size)
+                if x is None:
+                    x = get_transform(target_size)(self.image).unsqueeze(0)
+                    self._tensors[target_size] = x
+        return x
+
+
+def as_image_context(image: Union[str, ImageContext]) -> ImageContext:
+    """Wrap a file path in an ImageContext, or pass an existing one through"""
+    if isinstance(image, ImageContext):
+        return image
+    return ImageContext.from_path(image)
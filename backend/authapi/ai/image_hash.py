@@ -0,0 +1,49 @@
+"""
+Perceptual image hashes (dHash / pHash) computed with numpy
+Near-duplicate photos of the same fruit hash to values a few bits apart
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 -> 64-bit hashes
+
+
+def _gray(image: Image.Image, size) -> np.ndarray:
+    """Grayscale float32 pixels after resizing to size=(width, height)"""
+    return np.asarray(image.convert("L").resize(size, Image.LANCZOS), dtype=np.float32)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: sign of the horizontal gradient on a tiny thumbnail"""
+    px = _gray(image, (hash_size + 1, hash_size))
+    return _pack(px[:, 1:] > px[:, :-1])
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so coeffs = D @ x @ D.T"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    d = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    d[0] /= np.sqrt(2.0)
+    return d.astype(np.float32)
+
+
+def phash(image: Image.Image, hash_size: int = HASH_SIZE, highfreq_factor: int = 4) -> int:
+    """DCT hash: low-frequency coefficients compared to their median"""
+    n = hash_size * highfreq_factor
+    d = _dct_matrix(n)
+    low = (d @ _gray(image, (n, n)) @ d.T)[:hash_size, :hash_size]
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+def hamming_distances(value: int, hashes: np.ndarray) -> np.ndarray:
+    """Bit distance from value to every 64-bit hash in a uint64 array"""
+    return np.bitwise_count(np.bitwise_xor(hashes, np.uint64(value)))
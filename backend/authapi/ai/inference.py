@@ -0,0 +1,223 @@
+"""
+Scanner inference entry points
+Routes call these instead of the model modules. With
+SCANNER_INFERENCE_MODE=local (default) the models run in this process;
+with "remote" every call goes to the inference service
+(python -m ai.inference_service) and this process never imports torch.
+"""
+
+import importlib
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from .image_context import ImageContext, as_image_context
+from .quality import QUALITY_GATE, assess_quality
+
+INFERENCE_MODE = os.getenv("SCANNER_INFERENCE_MODE", "local").lower()
+
+# Called as progress(stage, state); see ai.pipeline
+Progress = Callable[[str, str], None]
+
+CLASSIFIERS = ("color", "size", "shape", "disease")
+
+
+class LocalBackend:
+    """Runs the models in this process (the inference service uses this too)"""
+
+    mode = "local"
+
+    def scan(self, image_ctx: ImageContext, progress: Optional[Progress] = None) -> Dict[str, Any]:
+        from .pipeline import run_scan_pipeline
+        return run_scan_pipeline(image_ctx, progress=progress)
+
+    def detect(self, image_ctx: ImageContext, confidence: float = 0.25, tiled: Optional[bool] = None) -> Dict[str, Any]:
+        from .yolo_detector import get_yolo_detector
+        return get_yolo_detector().predict(image_ctx, confidence=confidence, tiled=tiled)
+
+    def classify(self, stage: str, image: ImageContext, model_path: Optional[str] = None) -> Dict[str, Any]:
+        return _classifier(stage)(image, model_path)
+
+    def classify_batch(self, stage: str, images: List[ImageContext], model_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        return _classifier(stage, batch=True)(images, model_path)
+
+    def classify_crops(self, crops: List[ImageContext], progress: Optional[Progress] = None) -> List[Dict[str, Dict[str, Any]]]:
+        from .pipeline import classify_crops
+        return classify_crops(crops, progress=progress)
+
+    def status(self) -> Dict[str, Any]:
+        from .warmup import get_model_status, all_models_ready
+        return {"ready": all_models_ready(), "models": get_model_status()}
+
+    def registry_status(self) -> Dict[str, Any]:
+        from .color_fast import get_color_fast_path
+        from .yolo_detector import cascade_stats
+        return {
+            **_registry().status(),
+            "detector_cascade": cascade_stats.status(),
+            "color_fast": get_color_fast_path().status()
+        }
+
+    def fingerprint(self) -> str:
+        return _registry().fingerprint()
+
+    def detector_info(self, load: bool = False) -> Dict[str, Any]:
+        """Detector file and availability; with load=False a cold detector is not loaded"""
+        registry = _registry()
+        loaded = registry.get("detector") if load else registry.peek("detector")
+        detector = loaded.handle if loaded else None
+        return {
+            "available": bool(detector and detector.available),
+            "model": detector.model_path.name if detector and detector.model_path else None,
+            "version": detector.version if detector else None,
+            "connection_test": detector.test_connection() if detector else {
+                "success": False, "model": None, "message": "Model not loaded yet"
+            }
+        }
+
+    def preload(self):
+        from .warmup import start_model_preload
+        start_model_preload()
+
+
+def _registry():
+    """The model registry with every scanner model registered"""
+    from .model_registry import get_model_registry
+    from . import warmup  # noqa: F401  (imports and so registers the models)
+    return get_model_registry()
+
+
+def _classifier(stage: str, batch: bool = False) -> Callable:
+    if stage not in CLASSIFIERS:
+        raise ValueError(f"Unknown classifier: {stage}")
+    module = {
+        "color": ".durian_color",
+        "size": ".durian_size",
+        "shape": ".durian_shape",
+        "disease": ".durian_desease",
+    }[stage]
+    mod = importlib.import_module(module, __package__)
+    return getattr(mod, f"get_durian_{stage}_batch" if batch else f"get_durian_{stage}")
+
+
+_backend = None
+
+
+def get_backend():
+    """The backend for SCANNER_INFERENCE_MODE, created on first use"""
+    global _backend
+    if _backend is None:
+        if INFERENCE_MODE == "remote":
+            from .inference_client import InferenceClient
+            _backend = InferenceClient()
+        else:
+            _backend = LocalBackend()
+    return _backend
+
+
+# -- same signatures as the in-process model functions --
+
+def check_quality(image_ctx: ImageContext, progress: Optional[Progress] = None) -> Dict[str, Any]:
+    """Quality assessment of a decoded upload, reported as the "quality" stage"""
+    if progress:
+        progress("quality", "running")
+    quality = assess_quality(image_ctx)
+    if progress:
+        progress("quality", "done" if quality["passed"] else "failed")
+        if not quality["passed"]:
+            for stage in ("detection",) + CLASSIFIERS:
+                progress(stage, "skipped")
+    return quality
+
+
+def quality_rejection(image_ctx: ImageContext, quality: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The scan result for a photo that failed the quality gate, or None if it passed"""
+    if quality["passed"]:
+        return None
+    width, height = image_ctx.size
+    return {
+        "success": False,
+        "rejected": True,
+        "error": "Image quality too low",
+        "message": quality["recommendation"],
+        "quality": quality,
+        "image": {
+            "width": width,
+            "height": height,
+            "original_width": image_ctx.original_size[0],
+            "original_height": image_ctx.original_size[1]
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+def run_scan_pipeline(
+    image_ctx: ImageContext,
+    progress: Optional[Progress] = None,
+    quality: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Quality gate, then the scan pipeline. Photos that fail the gate come back
+    with "rejected": True and a retake hint in "message" without any model
+    (or the inference service) being involved.
+
+    Args:
+        quality: An assessment already made by check_quality
+    """
+    if quality is None and QUALITY_GATE:
+        quality = check_quality(image_ctx, progress)
+    if quality is not None:
+        rejected = quality_rejection(image_ctx, quality)
+        if rejected is not None:
+            return rejected
+
+    result = get_backend().scan(image_ctx, progress=progress)
+    if quality is not None:
+        result["quality"] = quality
+    return result
+
+
+def classify_crops(crops: List[ImageContext], progress: Optional[Progress] = None) -> List[Dict[str, Dict[str, Any]]]:
+    if not crops:
+        return []
+    return get_backend().classify_crops(crops, progress=progress)
+
+
+def detect(image_ctx: ImageContext, confidence: float = 0.25, tiled: Optional[bool] = None) -> Dict[str, Any]:
+    return get_backend().detect(image_ctx, confidence=confidence, tiled=tiled)
+
+
+def _classify(stage: str, image: Union[str, ImageContext], model_path: Optional[str]) -> Dict[str, Any]:
+    try:
+        return get_backend().classify(stage, as_image_context(image), model_path)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(type(e).__name__),
+            "message": str(e)
+        }
+
+
+def get_durian_color(image: Union[str, ImageContext], model_path: Optional[str] = None) -> Dict[str, Any]:
+    return _classify("color", image, model_path)
+
+
+def get_durian_size(image: Union[str, ImageContext], model_path: Optional[str] = None) -> Dict[str, Any]:
+    return _classify("size", image, model_path)
+
+
+def get_durian_shape(image: Union[str, ImageContext], model_path: Optional[str] = None) -> Dict[str, Any]:
+    return _classify("shape", image, model_path)
+
+
+def get_durian_disease(image: Union[str, ImageContext], model_path: Optional[str] = None) -> Dict[str, Any]:
+    return _classify("disease", image, model_path)
+
+
+def model_status() -> Dict[str, Any]:
+    """{"ready": bool, "models": per-model preload state}"""
+    return get_backend().status()
+
+
+def models_fingerprint() -> str:
+    return get_backend().fingerprint()
@@ -0,0 +1,163 @@
+"""
+Client for the out-of-process inference service
+Same methods as ai.inference.LocalBackend; each call is one request on a
+per-thread unix socket connection, with image pixels in shared memory
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .image_context import ImageContext
+from .inference_protocol import SOCKET_PATH, send_message, recv_message, write_images
+
+# Seconds to wait for one request (a cold model load can take a while)
+INFERENCE_TIMEOUT = float(os.getenv("SCANNER_INFERENCE_TIMEOUT", "120"))
+# Model versions are re-read from the service at most this often
+FINGERPRINT_TTL_SECONDS = 2.0
+
+# Errors the service raises that callers handle by type
+_ERROR_TYPES = {"KeyError": KeyError, "ValueError": ValueError}
+
+
+class InferenceServiceError(RuntimeError):
+    """The inference service could not be reached or failed the request"""
+
+
+class InferenceClient:
+    """Thin client: forwards every backend call to the inference service"""
+
+    mode = "remote"
+
+    def __init__(self, socket_path: str = SOCKET_PATH, timeout: float = INFERENCE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._fingerprint = ("", 0.0)
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise InferenceServiceError(f"Inference service unavailable at {self.socket_path}: {e}") from e
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    @staticmethod
+    def _receive(sock: socket.socket) -> Dict[str, Any]:
+        try:
+            reply = recv_message(sock)
+        except OSError as e:
+            raise InferenceServiceError(f"Inference service connection failed: {e}") from e
+        if reply is None:
+            raise InferenceServiceError("Inference service closed the connection")
+        return reply
+
+    def call(self, op: str, images: Sequence[ImageContext] = (), progress=None, **params) -> Any:
+        """
+        Run one operation on the service
+
+        Args:
+            op: Operation name (see ai.inference_service.OPS)
+            images: Images passed through shared memory
+            progress: Receives progress(stage, state) messages while the call runs
+            params: JSON parameters of the operation
+        """
+        shm, specs = write_images(images)
+        try:
+            message = {"op": op, "params": params, "shm": shm.name if shm else None, "images": specs}
+            for attempt in (1, 2):
+                reused = getattr(self._local, "sock", None) is not None
+                sock = self._connect()
+                try:
+                    send_message(sock, message)
+                except OSError as e:
+                    self._drop()
+                    # A pooled connection may have been closed by a service
+                    # restart; nothing was delivered, so retry once on a fresh one
+                    if reused and attempt == 1:
+                        continue
+                    raise InferenceServiceError(f"Inference service connection failed: {e}") from e
+                break
+
+            # The request was delivered, so it is never sent again (the service
+            # would run it twice). Leaving before the final reply, whether on a
+            # timeout or a failing progress callback, strands the connection
+            # mid-reply, so it is dropped.
+            try:
+                reply = self._receive(sock)
+                while reply.get("type") == "progress":
+                    if progress is not None:
+                        progress(reply["stage"], reply["state"])
+                    reply = self._receive(sock)
+            except BaseException:
+                self._drop()
+                raise
+
+            if reply.get("type") == "error":
+                error = _ERROR_TYPES.get(reply.get("error"), InferenceServiceError)
+                raise error(reply.get("message"))
+            return reply.get("result")
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    # -- LocalBackend interface --
+
+    def scan(self, image_ctx: ImageContext, progress=None) -> Dict[str, Any]:
+        return self.call("scan", [image_ctx], progress=progress)
+
+    def detect(self, image_ctx: ImageContext, confidence: float = 0.25, tiled: Optional[bool] = None) -> Dict[str, Any]:
+        return self.call("detect", [image_ctx], confidence=confidence, tiled=tiled)
+
+    def classify(self, stage: str, image: ImageContext, model_path: Optional[str] = None) -> Dict[str, Any]:
+        return self.call("classify", [image], stage=stage, model_path=model_path)
+
+    def classify_batch(self, stage: str, images: List[ImageContext], model_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.call("classify_batch", images, stage=stage, model_path=model_path)
+
+    def classify_crops(self, crops: List[ImageContext], progress=None) -> List[Dict[str, Dict[str, Any]]]:
+        return self.call("classify_crops", crops, progress=progress)
+
+    def status(self) -> Dict[str, Any]:
+        try:
+            return self.call("status")
+        except InferenceServiceError as e:
+            return {"ready": False, "models": {}, "service_error": str(e)}
+
+    def registry_status(self) -> Dict[str, Any]:
+        return self.call("registry_status")
+
+    def fingerprint(self) -> str:
+        value, checked_at = self._fingerprint
+        if time.monotonic() - checked_at >= FINGERPRINT_TTL_SECONDS:
+            value = self.call("fingerprint")
+            self._fingerprint = (value, time.monotonic())
+        return value
+
+    def detector_info(self, load: bool = False) -> Dict[str, Any]:
+        try:
+            return self.call("detector_info", load=load)
+        except InferenceServiceError as e:
+            return {
+                "available": False, "model": None, "version": None,
+                "connection_test": {"success": False, "model": None, "message": str(e)}
+            }
+
+    def preload(self):
+        # The service preloads its own models at startup
+        pass
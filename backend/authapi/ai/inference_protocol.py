@@ -0,0 +1,95 @@
+"""
+Wire format between web workers and the inference service
+Messages are length-prefixed JSON over a unix socket; image pixels travel
+in one POSIX shared-memory segment per request, so only a small header
+crosses the socket
+"""
+
+import json
+import os
+import socket
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .image_context import ImageContext
+
+SOCKET_PATH = os.getenv("SCANNER_INFERENCE_SOCKET", "/tmp/durian-inference.sock")
+
+_HEADER = struct.Struct("!I")
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]):
+    payload = json.dumps(message, default=str).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """Next message, or None when the peer closed the connection"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise ValueError(f"Message of {size} bytes exceeds the {MAX_MESSAGE_BYTES} byte limit")
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        return None
+    return json.loads(payload.decode("utf-8"))
+
+
+def write_images(images: Sequence[ImageContext]) -> Tuple[Optional[shared_memory.SharedMemory], List[Dict[str, Any]]]:
+    """
+    Copy the RGB pixels of images into a new shared-memory segment
+
+    Returns:
+        (segment, per-image specs). The caller closes and unlinks the
+        segment once the service has answered.
+    """
+    arrays = [img.array for img in images]
+    if not arrays:
+        return None, []
+    total = sum(a.nbytes for a in arrays)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, total))
+    specs, offset = [], 0
+    for img, array in zip(images, arrays):
+        view = np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+        view[...] = array
+        del view
+        specs.append({"offset": offset, "shape": list(array.shape), "original_size": list(img.original_size)})
+        offset += array.nbytes
+    return shm, specs
+
+
+def read_images(name: Optional[str], specs: List[Dict[str, Any]]) -> List[ImageContext]:
+    """Rebuild the ImageContexts a client wrote with write_images"""
+    if not name or not specs:
+        return []
+    shm = shared_memory.SharedMemory(name=name)
+    # The client owns the segment; keep this process's resource tracker
+    # from unlinking it when the service exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    try:
+        images = []
+        for spec in specs:
+            view = np.ndarray(tuple(spec["shape"]), dtype=np.uint8, buffer=shm.buf, offset=spec["offset"])
+            images.append(ImageContext(Image.fromarray(view.copy()), original_size=spec.get("original_size")))
+            del view
+        return images
+    finally:
+        shm.close()
@@ -0,0 +1,126 @@
+"""
+Local inference service
+Hosts every scanner model in one process and serves web workers over a
+unix socket (see ai.inference_protocol). Concurrent requests share the
+models' replica pools and micro-batchers, so batching happens here rather
+than per web worker.
+
+Run from backend/authapi:
+    python -m ai.inference_service [--socket PATH]
+and start the web workers with SCANNER_INFERENCE_MODE=remote.
+"""
+
+import argparse
+import os
+import socket
+import socketserver
+import threading
+from typing import Any, Callable, Dict, List
+
+from .image_context import ImageContext
+from .inference import LocalBackend
+from .inference_protocol import SOCKET_PATH, send_message, recv_message, read_images
+
+Op = Callable[[LocalBackend, List[ImageContext], Dict[str, Any], Callable[[str, str], None]], Any]
+
+# op -> handler(backend, images, params, progress)
+OPS: Dict[str, Op] = {
+    "ping": lambda b, images, params, progress: "pong",
+    "scan": lambda b, images, params, progress: b.scan(images[0], progress=progress),
+    "detect": lambda b, images, params, progress: b.detect(images[0], params.get("confidence", 0.25), params.get("tiled")),
+    "classify": lambda b, images, params, progress: b.classify(params["stage"], images[0], params.get("model_path")),
+    "classify_batch": lambda b, images, params, progress: b.classify_batch(params["stage"], images, params.get("model_path")),
+    "classify_crops": lambda b, images, params, progress: b.classify_crops(images, progress=progress),
+    "status": lambda b, images, params, progress: b.status(),
+    "registry_status": lambda b, images, params, progress: b.registry_status(),
+    "fingerprint": lambda b, images, params, progress: b.fingerprint(),
+    "detector_info": lambda b, images, params, progress: b.detector_info(params.get("load", False)),
+}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """One web-worker connection; requests on it are handled in order"""
+
+    def handle(self):
+        backend: LocalBackend = self.server.backend
+        send_lock = threading.Lock()
+
+        def send(message):
+            # Stage threads report progress while the request thread waits
+            with send_lock:
+                send_message(self.request, message)
+
+        while True:
+            try:
+                message = recv_message(self.request)
+            except (OSError, ValueError) as e:
+                print(f"[INFERENCE] Dropping connection: {e}")
+                return
+            if message is None:
+                return
+
+            try:
+                op = OPS.get(message.get("op"))
+                if op is None:
+                    raise ValueError(f"Unknown operation: {message.get('op')}")
+                images = read_images(message.get("shm"), message.get("images", []))
+                progress = lambda stage, state: send({"type": "progress", "stage": stage, "state": state})
+                result = op(backend, images, message.get("params") or {}, progress)
+                reply = {"type": "result", "result": result}
+            except Exception as e:
+                reply = {"type": "error", "error": str(type(e).__name__), "message": str(e)}
+
+            try:
+                send(reply)
+            except OSError:
+                return
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = SOCKET_PATH, backend: LocalBackend = None):
+        self.backend = backend or LocalBackend()
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _Handler)
+        # Web workers run as the same user or group
+        os.chmod(socket_path, 0o660)
+
+
+def _remove_stale_socket(path: str):
+    """Delete a socket file left by a dead service; refuse if one is running"""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise RuntimeError(f"An inference service is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durian scanner inference service")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--no-preload", action="store_true", help="Load models on first use")
+    args = parser.parse_args()
+
+    server = InferenceServer(args.socket)
+    if not args.no_preload:
+        server.backend.preload()
+    print(f"🧠 Inference service listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Upload ingress normalization
+Checks an upload's dimensions from its header, decodes JPEGs at a reduced
+DCT scale, applies the EXIF orientation and produces the canonical
+working-resolution image the models see (the stored sizes are rendered
+from it, see handlers/derivative_handler.py)
+"""
+
+import os
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from .image_context import ImageContext
+from .tiling import TILE_THRESHOLD
+
+# Long side of the image the models see (detector runs at 640, classifiers at <=300)
+WORKING_MAX_SIDE = int(os.getenv("SCANNER_WORKING_MAX_SIDE", "1280"))
+# Photos above the tiling threshold keep more pixels so tiles still have detail
+TILED_WORKING_MAX_SIDE = int(os.getenv("SCANNER_TILED_MAX_SIDE", "2560"))
+# Header-level limits, checked before any pixel is decoded
+MAX_PIXELS = int(os.getenv("SCANNER_MAX_PIXELS", str(50_000_000)))
+MIN_SIDE = 32
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class IngestError(ValueError):
+    """The upload is not an image the scanner accepts"""
+
+
+def _open(data: bytes) -> Image.Image:
+    try:
+        # Lazy: only the header is parsed here
+        return Image.open(BytesIO(data))
+    except Exception as e:
+        # UnidentifiedImageError, or a format plugin failing on the header
+        raise IngestError("Upload is not a readable image") from e
+
+
+def _check_size(size: Tuple[int, int]):
+    width, height = size
+    if width * height > MAX_PIXELS:
+        raise IngestError(f"Image is {width}x{height}; at most {MAX_PIXELS // 1_000_000} megapixels are accepted")
+    if min(width, height) < MIN_SIDE:
+        raise IngestError(f"Image is {width}x{height}; both sides must be at least {MIN_SIDE}px")
+
+
+def probe(data: bytes) -> Tuple[str, Tuple[int, int]]:
+    """
+    Format and upright (width, height) of an upload, read from its header
+
+    Raises:
+        IngestError: Not an image, or outside the accepted dimensions
+    """
+    with _open(data) as img:
+        width, height = img.size
+        if img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        _check_size((width, height))
+        return img.format, (width, height)
+
+
+def _decode(data: bytes, max_side: int) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Upright RGB image no larger than max_side, and the original upright size"""
+    with _open(data) as img:
+        _check_size(img.size)
+        original = img.size
+        if img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+            original = original[::-1]
+        if max(img.size) > max_side:
+            scale = max_side / max(img.size)
+            # JPEG only: decode at the smallest DCT scale (1/2, 1/4, 1/8)
+            # that still covers the requested size
+            img.draft("RGB", (int(img.width * scale) + 1, int(img.height * scale) + 1))
+        upright = ImageOps.exif_transpose(img)
+        if upright.mode != "RGB":
+            upright = upright.convert("RGB")
+        # reducing_gap box-reduces first; the models resize again anyway
+        upright.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+        return upright, original
+
+
+def working_side_for(original_size: Tuple[int, int]) -> int:
+    """Working resolution for an upload of this size"""
+    return TILED_WORKING_MAX_SIDE if max(original_size) > TILE_THRESHOLD else WORKING_MAX_SIDE
+
+
+def decode_upload(data: bytes, max_side: Optional[int] = None) -> ImageContext:
+    """
+    Decode an upload into the canonical working-resolution ImageContext
+
+    Args:
+        data: Uploaded file bytes
+        max_side: Long-side limit; by default WORKING_MAX_SIDE, or
+            TILED_WORKING_MAX_SIDE for photos large enough to be tiled
+    """
+    if max_side is None:
+        _, size = probe(data)
+        max_side = working_side_for(size)
+    image, original = _decode(data, max_side)
+    return ImageContext(image, original_size=original)
@@ -0,0 +1,239 @@
+"""
+Live / video scanning
+Runs the detector on sampled frames of a camera stream or video, skips
+frames where nothing moved, tracks each durian across frames and classifies
+it once, on the sharpest crop seen while it was tracked
+"""
+
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .image_context import ImageContext
+from .inference import detect, classify_crops
+from .ingest import WORKING_MAX_SIDE
+from .tracking import IoUTracker, Track, frame_signature, motion_score, sharpness
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Mean pixel change (0-255) below which a frame reuses the previous detections
+LIVE_MOTION_THRESHOLD = float(os.getenv("SCANNER_LIVE_MOTION_THRESHOLD", "3.0"))
+# Run the detector at least every this many frames even without motion
+LIVE_MAX_SKIP = max(1, int(os.getenv("SCANNER_LIVE_MAX_SKIP", "10")))
+LIVE_DETECTION_CONFIDENCE = float(os.getenv("SCANNER_LIVE_CONFIDENCE", "0.4"))
+LIVE_IOU_THRESHOLD = float(os.getenv("SCANNER_LIVE_IOU", "0.3"))
+# Processed frames a durian may be missing before its track ends and is graded
+LIVE_MAX_AGE = max(0, int(os.getenv("SCANNER_LIVE_MAX_AGE", "5")))
+LIVE_MIN_HITS = max(1, int(os.getenv("SCANNER_LIVE_MIN_HITS", "2")))
+# Crop margin around each tracked durian (same setting as the scan pipeline)
+LIVE_ROI_PADDING = float(os.getenv("SCANNER_ROI_PADDING", "0.1"))
+# Frames per second sampled from uploaded videos
+VIDEO_SAMPLE_FPS = float(os.getenv("SCANNER_VIDEO_SAMPLE_FPS", "5"))
+
+
+class _TrackState:
+    """Sharpest crop seen so far for one track"""
+
+    __slots__ = ("crop", "sharpness", "frame", "timestamp", "detection")
+
+    def __init__(self):
+        self.crop: Optional[ImageContext] = None
+        self.sharpness = -1.0
+        self.frame = -1
+        self.timestamp: Optional[float] = None
+        self.detection: Optional[Dict[str, Any]] = None
+
+
+class LiveScanSession:
+    """
+    Per-client scan state for a frame stream
+
+    Frames are fed in order with feed(); each call returns what the
+    detector / tracker saw plus any durians graded on that frame. finish()
+    grades the durians still in view.
+    """
+
+    def __init__(
+        self,
+        confidence: float = LIVE_DETECTION_CONFIDENCE,
+        motion_threshold: float = LIVE_MOTION_THRESHOLD,
+        max_skip: int = LIVE_MAX_SKIP,
+        padding: float = LIVE_ROI_PADDING
+    ):
+        self.confidence = confidence
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+        self.padding = padding
+        self.tracker = IoUTracker(LIVE_IOU_THRESHOLD, LIVE_MAX_AGE, LIVE_MIN_HITS)
+        self.fruits: List[Dict[str, Any]] = []
+        self.frames = 0
+        self.detected_frames = 0
+        self.skipped_frames = 0
+        self.finished = False
+        self.created_at = time.time()
+        self.last_active = self.created_at
+        self._states: Dict[int, _TrackState] = {}
+        self._signature = None
+        self._since_detection = 0
+        self._lock = threading.Lock()
+
+    def feed(self, image_ctx: ImageContext, timestamp: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Process the next frame
+
+        Returns:
+            {"frame", "skipped", "motion", "tracks", "fruits"} where fruits
+            holds the durians whose tracks ended (and were graded) on this frame
+        """
+        with self._lock:
+            if self.finished:
+                raise RuntimeError("Live scan session already finished")
+            self.last_active = time.time()
+            frame_index = self.frames
+            self.frames += 1
+
+            signature = frame_signature(image_ctx)
+            motion = motion_score(self._signature, signature)
+            if motion < self.motion_threshold and self._since_detection < self.max_skip:
+                # Nothing moved: the previous detections still hold
+                self._since_detection += 1
+                self.skipped_frames += 1
+                return self._frame_result(frame_index, timestamp, True, motion, [])
+
+            self._signature = signature
+            self._since_detection = 0
+            # Frames are never tiled: a dozen tile passes per frame would undo the frame skipping
+            detection = detect(image_ctx, confidence=self.confidence, tiled=False)
+            if not detection.get("success"):
+                raise RuntimeError(detection.get("message") or detection.get("error") or "Detection failed")
+            self.detected_frames += 1
+
+            pairs, ended = self.tracker.update(detection["detection"]["objects"], frame_index)
+            for track, det in pairs:
+                self._keep_if_sharper(track, det, image_ctx, frame_index, timestamp)
+            fruits = self._grade(ended)
+            # Tracks dropped as noise leave their crops behind
+            alive = {t.track_id for t in self.tracker.tracks}
+            for track_id in [tid for tid in self._states if tid not in alive]:
+                del self._states[track_id]
+            return self._frame_result(frame_index, timestamp, False, motion, fruits)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Grade the durians still tracked; returns every graded durian of the session"""
+        with self._lock:
+            if not self.finished:
+                self.finished = True
+                self._grade(self.tracker.flush())
+                self._states.clear()
+            return list(self.fruits)
+
+    def _keep_if_sharper(self, track: Track, det: Dict[str, Any], image_ctx: ImageContext, frame_index: int, timestamp: Optional[float]):
+        try:
+            crop = image_ctx.crop(det["bbox"], self.padding)
+        except ValueError:
+            return
+        score = sharpness(crop)
+        state = self._states.setdefault(track.track_id, _TrackState())
+        if score > state.sharpness:
+            state.crop, state.sharpness, state.detection = crop, score, det
+            state.frame, state.timestamp = frame_index, timestamp
+
+    def _grade(self, tracks: List[Track]) -> List[Dict[str, Any]]:
+        """Classify each finished track on its sharpest crop, all crops as one batch"""
+        states = [(t, self._states.pop(t.track_id, None)) for t in tracks]
+        states = [(t, s) for t, s in states if s is not None and s.crop is not None]
+        if not states:
+            return []
+
+        classified = classify_crops([s.crop for _, s in states])
+        fruits = []
+        for (track, state), stage_results in zip(states, classified):
+            fruits.append({
+                "index": len(self.fruits) + len(fruits),
+                "track_id": track.track_id,
+                "frames_seen": track.hits,
+                "first_frame": track.first_frame,
+                "last_frame": track.last_frame,
+                "best_frame": state.frame,
+                "best_timestamp": state.timestamp,
+                "sharpness": round(state.sharpness, 1),
+                "bbox": state.detection["bbox"],
+                "bbox_normalized": state.detection.get("bbox_normalized"),
+                "confidence": state.detection["confidence"],
+                **stage_results
+            })
+        self.fruits.extend(fruits)
+        return fruits
+
+    def _frame_result(self, frame_index, timestamp, skipped, motion, fruits) -> Dict[str, Any]:
+        return {
+            "frame": frame_index,
+            "timestamp": timestamp,
+            "skipped": skipped,
+            "motion": round(motion, 2) if motion != float("inf") else None,
+            "tracks": [t.to_dict() for t in self.tracker.tracks if t.last_frame == frame_index or skipped],
+            "fruits": fruits
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "frames_received": self.frames,
+            "frames_detected": self.detected_frames,
+            "frames_skipped": self.skipped_frames,
+            "active_tracks": len(self.tracker.tracks),
+            "fruits_graded": len(self.fruits),
+            "finished": self.finished
+        }
+
+
+def iter_video_frames(
+    data: bytes,
+    sample_fps: float = VIDEO_SAMPLE_FPS,
+    max_side: int = WORKING_MAX_SIDE
+) -> Iterator[Tuple[float, ImageContext]]:
+    """
+    Decode a video upload, yielding (timestamp_seconds, frame) at about sample_fps
+
+    Frames are scaled down to max_side, like uploaded photos. OpenCV only
+    reads videos from a path, so the bytes go to a temp file for the
+    duration of the decode.
+    """
+    if cv2 is None:
+        raise RuntimeError("Video scanning needs opencv-python")
+
+    with tempfile.NamedTemporaryFile(suffix=".mp4") as tmp:
+        tmp.write(data)
+        tmp.flush()
+        capture = cv2.VideoCapture(tmp.name)
+        if not capture.isOpened():
+            raise ValueError("Could not decode video")
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+            step = max(1, int(round(fps / sample_fps))) if sample_fps > 0 else 1
+            index = 0
+            while True:
+                # grab() skips decoding the frames that are not sampled
+                if not capture.grab():
+                    break
+                if index % step == 0:
+                    ok, frame = capture.retrieve()
+                    if not ok:
+                        break
+                    height, width = frame.shape[:2]
+                    scale = max_side / max(width, height)
+                    if scale < 1:
+                        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    image = Image.fromarray(np.ascontiguousarray(frame[:, :, ::-1]))
+                    yield round(index / fps, 3), ImageContext(image, original_size=(width, height))
+                index += 1
+        finally:
+            capture.release()
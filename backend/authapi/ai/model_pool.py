@@ -0,0 +1,72 @@
+"""
+Thread-safe model replica pool
+Each replica is handed to one thread at a time, so model singletons can be
+shared safely between concurrent Flask request threads
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+# Replicas per model; each extra replica costs one more copy of the weights
+MODEL_REPLICAS = max(1, int(os.getenv("DURIAN_MODEL_REPLICAS", "1")))
+
+
+class ModelPool:
+    """Fixed-size pool of model replicas built lazily from a factory"""
+
+    def __init__(self, factory: Callable[[], Any], size: Optional[int] = None, name: str = "model"):
+        """
+        Args:
+            factory: Builds one ready-to-use replica
+            size: Maximum number of replicas (defaults to DURIAN_MODEL_REPLICAS)
+            name: Label used in log messages
+        """
+        self.factory = factory
+        self.size = max(1, size or MODEL_REPLICAS)
+        self.name = name
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # The first replica is built eagerly so load errors surface to the caller
+        self.primary = factory()
+        self._created = 1
+        self._idle.put(self.primary)
+
+    @property
+    def created(self) -> int:
+        """Number of replicas built so far"""
+        return self._created
+
+    def _checkout(self, timeout: Optional[float]) -> Any:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            grow = self._created < self.size
+            if grow:
+                self._created += 1
+        if grow:
+            try:
+                replica = self.factory()
+                print(f"[POOL] {self.name}: replica {self._created}/{self.size} ready")
+                return replica
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Borrow a replica for the duration of the with-block"""
+        replica = self._checkout(timeout)
+        try:
+            yield replica
+        finally:
+            self._idle.put(replica)
@@ -0,0 +1,564 @@
+"""
+Versioned model registry over backend/models
+Every scanner model is served through one registry that knows which version
+is active, loads it on first use, swaps in a new version without a restart
+and keeps the loaded weights within a memory budget
+
+Each model module registers a default spec (file, architecture, classes and
+input size). backend/models/manifest.json, when present, overrides them:
+
+    {
+      "detector": {
+        "active": "20260301",
+        "pinned": true,
+        "versions": {
+          "20260212_220446": {"file": "durian_detector_durian_detection_20260212_220446.pt"},
+          "20260301": {
+            "file": "durian_detector_20260301.pt",
+            "architecture": "yolov8n",
+            "classes": ["durian"],
+            "input_size": [640, 640]
+          }
+        }
+      }
+    }
+
+Fields a version leaves out are taken from the registered default. The
+manifest is re-read when its mtime changes; a loaded model whose active
+version changed is rebuilt (and warmed) in the background while the old
+version keeps serving, then swapped in atomically.
+
+Switching versions is an operator task, not an API: edit the manifest, or
+
+    python -m ai.model_registry list
+    python -m ai.model_registry activate detector 20260301
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .model_pool import ModelPool
+
+BASE_DIR = Path(__file__).parent.parent.parent
+MODELS_DIR = BASE_DIR / "models"
+MANIFEST_PATH = MODELS_DIR / "manifest.json"
+
+# Budget for loaded weights per worker process; 0 disables unloading
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("DURIAN_MODEL_MEMORY_MB", "0"))
+# How often the manifest's mtime is checked for a new active version
+MANIFEST_POLL_SECONDS = float(os.getenv("DURIAN_MANIFEST_POLL_SECONDS", "10"))
+
+
+class ModelSpec:
+    """One version of a model as described by the manifest"""
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        file: Union[str, Path],
+        architecture: str,
+        classes: List[str],
+        input_size: Tuple[int, int],
+        pinned: bool = False
+    ):
+        self.name = name
+        self.version = str(version)
+        self.file = str(file)
+        self.architecture = architecture
+        self.classes = list(classes)
+        self.input_size = tuple(int(x) for x in input_size)
+        self.pinned = pinned
+
+    @property
+    def path(self) -> Path:
+        """Weights file; relative names resolve inside backend/models"""
+        path = Path(self.file)
+        return path if path.is_absolute() else MODELS_DIR / path
+
+    def merged(self, version: str, fields: Dict[str, Any], pinned: Optional[bool] = None) -> "ModelSpec":
+        """A new spec for version, with fields overriding this one"""
+        input_size = fields.get("input_size", self.input_size)
+        if isinstance(input_size, int):
+            input_size = (input_size, input_size)
+        return ModelSpec(
+            self.name,
+            version,
+            fields.get("file", self.file),
+            fields.get("architecture", self.architecture),
+            fields.get("classes", self.classes),
+            input_size,
+            self.pinned if pinned is None else pinned
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "file": self.file,
+            "architecture": self.architecture,
+            "classes": self.classes,
+            "input_size": list(self.input_size),
+            "pinned": self.pinned
+        }
+
+
+class LoadedModel:
+    """A loaded model version and its usage bookkeeping"""
+
+    def __init__(self, spec: ModelSpec, handle: Any, load_ms: Optional[float] = None, warmup_ms: Optional[float] = None):
+        self.spec = spec
+        self.handle = handle
+        # How long building the handle and its warmup forward took
+        self.load_ms = load_ms
+        self.warmup_ms = warmup_ms
+        self.loaded_at = datetime.utcnow()
+        self.last_used = time.monotonic()
+        self.uses = 0
+        try:
+            self._weights_bytes = spec.path.stat().st_size
+        except OSError:
+            self._weights_bytes = 0
+
+    @property
+    def replicas(self) -> int:
+        pool = self.handle if isinstance(self.handle, ModelPool) else getattr(self.handle, "pool", None)
+        return pool.created if pool is not None else 1
+
+    @property
+    def size_bytes(self) -> int:
+        """Estimated resident size: weights file size times replicas built"""
+        return self._weights_bytes * self.replicas
+
+    def touch(self):
+        self.last_used = time.monotonic()
+        self.uses += 1
+
+
+Loader = Callable[[ModelSpec], Any]
+Warmup = Callable[[Any, ModelSpec], Any]
+
+
+class ModelRegistry:
+    """Active versions, loaded models and the memory budget for one process"""
+
+    def __init__(
+        self,
+        manifest_path: Union[str, Path] = MANIFEST_PATH,
+        budget_mb: float = MODEL_MEMORY_BUDGET_MB,
+        poll_seconds: float = MANIFEST_POLL_SECONDS
+    ):
+        self.manifest_path = Path(manifest_path)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.poll_seconds = poll_seconds
+        self._defaults: Dict[str, ModelSpec] = {}
+        self._loaders: Dict[str, Loader] = {}
+        self._closers: Dict[str, Callable[[Any], Any]] = {}
+        self._warmups: Dict[str, Warmup] = {}
+        self._manifest: Dict[str, Any] = {}
+        self._manifest_mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._loaded: Dict[str, LoadedModel] = {}
+        # Explicit model_path overrides; kept outside versioning and the budget
+        self._overrides: Dict[Tuple[str, str], LoadedModel] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._swapping: Dict[str, threading.Thread] = {}
+        self._lock = threading.RLock()
+
+    # -- registration --
+
+    def register(
+        self,
+        default: ModelSpec,
+        loader: Loader,
+        close: Optional[Callable[[Any], Any]] = None
+    ):
+        """
+        Register a model
+
+        Args:
+            default: Spec used when the manifest does not describe the model
+            loader: Builds a ready-to-serve handle (pool, batcher...) from a spec
+            close: Releases a handle once it has been swapped out or unloaded
+        """
+        with self._lock:
+            self._defaults[default.name] = default
+            self._loaders[default.name] = loader
+            if close is not None:
+                self._closers[default.name] = close
+            self._load_locks.setdefault(default.name, threading.Lock())
+
+    def set_warmup(self, name: str, warm: Warmup):
+        """Forward run on every newly loaded version before it starts serving"""
+        with self._lock:
+            self._warmups[name] = warm
+
+    @property
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._defaults)
+
+    # -- manifest --
+
+    def _read_manifest(self) -> Tuple[Dict[str, Any], Optional[int]]:
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except OSError:
+            return {}, None
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f), mtime
+
+    def _spec_from(self, manifest: Dict[str, Any], name: str) -> ModelSpec:
+        default = self._defaults[name]
+        entry = manifest.get(name)
+        if not entry:
+            return default
+        version = str(entry.get("active", default.version))
+        fields = entry.get("versions", {}).get(version)
+        if fields is None and version != default.version:
+            raise ValueError(f"{name}: active version {version} is not listed in versions")
+        return default.merged(version, fields or {}, entry.get("pinned"))
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.poll_seconds:
+            return
+        self._checked_at = now
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._manifest_mtime:
+            self.reload()
+
+    def reload(self, wait: bool = False) -> Dict[str, str]:
+        """
+        Re-read the manifest and swap in any changed active version
+
+        Args:
+            wait: Block until the swaps have finished
+
+        Returns:
+            Model name -> version now active in the manifest
+        """
+        try:
+            manifest, mtime = self._read_manifest()
+            specs = {name: self._spec_from(manifest, name) for name in self.names}
+            missing = [s for s in specs.values() if not s.path.exists()]
+            if missing:
+                raise FileNotFoundError(", ".join(f"{s.name}: {s.path}" for s in missing))
+        except Exception as e:
+            # A half-written or broken manifest must not take the scanner down
+            print(f"❌ Model manifest not applied: {e}")
+            with self._lock:
+                return {name: self._spec_from(self._manifest, name).version for name in self.names}
+
+        with self._lock:
+            self._manifest = manifest
+            self._manifest_mtime = mtime
+            changed = [
+                name for name, loaded in self._loaded.items()
+                if loaded.spec.version != specs[name].version or loaded.spec.path != specs[name].path
+            ]
+
+        threads = [self._start_swap(specs[name]) for name in changed]
+        if wait:
+            for thread in threads:
+                thread.join()
+        return {name: spec.version for name, spec in specs.items()}
+
+    def spec(self, name: str) -> ModelSpec:
+        """Active spec for a model (from the manifest, else the default)"""
+        self._maybe_reload()
+        with self._lock:
+            return self._spec_from(self._manifest, name)
+
+    def versions(self, name: str) -> List[str]:
+        """Versions of a model listed in the manifest"""
+        with self._lock:
+            listed = list(self._manifest.get(name, {}).get("versions", {}))
+            default = self._defaults[name].version
+        return listed if listed else [default]
+
+    # -- loading --
+
+    def _build(self, spec: ModelSpec) -> LoadedModel:
+        self._make_room(spec)
+        start = time.perf_counter()
+        handle = self._loaders[spec.name](spec)
+        load_ms = round((time.perf_counter() - start) * 1000, 1)
+        warmup_ms = None
+        warm = self._warmups.get(spec.name)
+        if warm is not None:
+            start = time.perf_counter()
+            warm(handle, spec)
+            warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+        print(f"✅ Loaded {spec.name} {spec.version} in {load_ms / 1000:.1f}s"
+              + (f" (warmup {warmup_ms / 1000:.1f}s)" if warmup_ms is not None else ""))
+        return LoadedModel(spec, handle, load_ms, warmup_ms)
+
+    def _close(self, loaded: LoadedModel):
+        close = self._closers.get(loaded.spec.name)
+        if close is None:
+            return
+        try:
+            close(loaded.handle)
+        except Exception as e:
+            print(f"⚠️ Closing {loaded.spec.name} {loaded.spec.version} failed: {e}")
+
+    def _start_swap(self, spec: ModelSpec) -> threading.Thread:
+        with self._lock:
+            thread = self._swapping.get(spec.name)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(
+                target=self._swap, args=(spec,),
+                name=f"model-swap-{spec.name}", daemon=True
+            )
+            self._swapping[spec.name] = thread
+            thread.start()
+            return thread
+
+    def _swap(self, spec: ModelSpec):
+        with self._load_locks[spec.name]:
+            # The manifest may have moved on while this swap was queued
+            spec = self.spec(spec.name)
+            current = self._loaded.get(spec.name)
+            if current is not None and current.spec.version == spec.version and current.spec.path == spec.path:
+                return
+            try:
+                loaded = self._build(spec)
+            except Exception as e:
+                print(f"❌ Swap to {spec.name} {spec.version} failed, keeping the current version: {e}")
+                return
+            with self._lock:
+                old = self._loaded.get(spec.name)
+                self._loaded[spec.name] = loaded
+        if old is not None:
+            print(f"🔁 {spec.name}: {old.spec.version} → {spec.version}")
+            self._close(old)
+        self._enforce_budget(keep=spec.name)
+
+    def _get_override(self, name: str, model_path: Union[str, Path]) -> LoadedModel:
+        key = (name, str(Path(model_path).resolve()))
+        loaded = self._overrides.get(key)
+        if loaded is None:
+            with self._load_locks[name]:
+                loaded = self._overrides.get(key)
+                if loaded is None:
+                    spec = self.spec(name)
+                    spec = spec.merged(Path(model_path).stem, {"file": key[1]}, pinned=True)
+                    loaded = self._build(spec)
+                    with self._lock:
+                        self._overrides[key] = loaded
+        return loaded
+
+    def get(self, name: str, model_path: Optional[Union[str, Path]] = None) -> LoadedModel:
+        """
+        The serving version of a model, loading it on first use
+
+        While a new version is being swapped in, the old one keeps serving.
+
+        Args:
+            name: Registered model name
+            model_path: Serve this weights file instead of the manifest's
+        """
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+        if model_path is not None:
+            return self._get_override(name, model_path)
+
+        self._maybe_reload()
+        loaded = self._loaded.get(name)
+        if loaded is None:
+            with self._load_locks[name]:
+                loaded = self._loaded.get(name)
+                if loaded is None:
+                    loaded = self._build(self.spec(name))
+                    with self._lock:
+                        self._loaded[name] = loaded
+            self._enforce_budget(keep=name)
+        loaded.touch()
+        return loaded
+
+    def peek(self, name: str) -> Optional[LoadedModel]:
+        """The loaded version of a model, without loading it"""
+        return self._loaded.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def unload(self, name: str) -> bool:
+        """Drop a loaded model; the next request loads it again"""
+        with self._lock:
+            loaded = self._loaded.pop(name, None)
+        if loaded is None:
+            return False
+        print(f"📤 Unloaded {name} {loaded.spec.version} ({loaded.size_bytes / 1e6:.0f} MB)")
+        self._close(loaded)
+        return True
+
+    # -- memory budget --
+
+    def loaded_bytes(self) -> int:
+        with self._lock:
+            return sum(loaded.size_bytes for loaded in self._loaded.values())
+
+    def _victims(self, needed: int, keep: str) -> List[str]:
+        """Least recently used unpinned models to unload to free needed bytes"""
+        with self._lock:
+            candidates = sorted(
+                (loaded for name, loaded in self._loaded.items() if name != keep and not loaded.spec.pinned),
+                key=lambda loaded: loaded.last_used
+            )
+            victims, freed = [], 0
+            for loaded in candidates:
+                if freed >= needed:
+                    break
+                victims.append(loaded.spec.name)
+                freed += loaded.size_bytes
+            return victims
+
+    def _make_room(self, spec: ModelSpec):
+        if self.budget_bytes <= 0:
+            return
+        try:
+            incoming = spec.path.stat().st_size
+        except OSError:
+            incoming = 0
+        current = self._loaded.get(spec.name)
+        # A swap briefly holds both versions; only the new one counts here
+        used = self.loaded_bytes() - (current.size_bytes if current else 0)
+        for name in self._victims(used + incoming - self.budget_bytes, keep=spec.name):
+            self.unload(name)
+
+    def _enforce_budget(self, keep: str):
+        if self.budget_bytes <= 0:
+            return
+        for name in self._victims(self.loaded_bytes() - self.budget_bytes, keep=keep):
+            self.unload(name)
+
+    # -- introspection --
+
+    def served_versions(self) -> Dict[str, str]:
+        """Model name -> version serving the next request (loaded, else active)"""
+        with self._lock:
+            versions = {}
+            for name in sorted(self._defaults):
+                loaded = self._loaded.get(name)
+                spec = loaded.spec if loaded is not None else self._spec_from(self._manifest, name)
+                versions[name] = spec.version
+        return versions
+
+    def fingerprint(self) -> str:
+        """Versions that serve the next request, for cache invalidation"""
+        return ";".join(f"{name}={version}" for name, version in self.served_versions().items())
+
+    def status(self) -> Dict[str, Any]:
+        """Active and loaded version, size and usage of every model"""
+        models = {}
+        with self._lock:
+            for name in self._defaults:
+                try:
+                    active = self._spec_from(self._manifest, name)
+                except ValueError:
+                    active = self._defaults[name]
+                loaded = self._loaded.get(name)
+                models[name] = {
+                    "active": active.to_dict(),
+                    "versions": self.versions(name),
+                    "loaded": loaded is not None,
+                    "loaded_version": loaded.spec.version if loaded else None,
+                    "loaded_at": loaded.loaded_at.isoformat() if loaded else None,
+                    "load_ms": loaded.load_ms if loaded else None,
+                    "warmup_ms": loaded.warmup_ms if loaded else None,
+                    "replicas": loaded.replicas if loaded else 0,
+                    "size_mb": round(loaded.size_bytes / (1024 * 1024), 1) if loaded else 0.0,
+                    "uses": loaded.uses if loaded else 0,
+                    "idle_seconds": round(time.monotonic() - loaded.last_used, 1) if loaded else None,
+                    "swapping": bool(self._swapping.get(name) and self._swapping[name].is_alive())
+                }
+        return {
+            "manifest": str(self.manifest_path) if self._manifest_mtime is not None else None,
+            "budget_mb": round(self.budget_bytes / (1024 * 1024), 1) if self.budget_bytes else None,
+            "loaded_mb": round(self.loaded_bytes() / (1024 * 1024), 1),
+            "models": models
+        }
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Get or create the process-wide model registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+
+def activate_version(name: str, version: str, manifest_path: Union[str, Path] = MANIFEST_PATH):
+    """
+    Make version the active one in the manifest
+
+    The manifest is rewritten atomically; running workers swap the new
+    version in on their next poll (DURIAN_MANIFEST_POLL_SECONDS).
+    """
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    entry = manifest.get(name)
+    if entry is None:
+        raise KeyError(f"{name} is not in {manifest_path}")
+    if version not in entry.get("versions", {}):
+        raise ValueError(f"{name}: version {version} is not listed in the manifest")
+    entry["active"] = version
+
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or switch the scanner model versions")
+    parser.add_argument("--manifest", default=str(MANIFEST_PATH), help="Manifest path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Versions listed in the manifest")
+    activate = commands.add_parser("activate", help="Make a listed version the active one")
+    activate.add_argument("name")
+    activate.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "activate":
+        try:
+            activate_version(args.name, args.version, args.manifest)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ {args.name} {args.version} is active; workers swap it in within {MANIFEST_POLL_SECONDS:.0f}s")
+        return
+
+    try:
+        with open(args.manifest, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except OSError:
+        print(f"No manifest at {args.manifest}; every model runs its registered default")
+        return
+    for name, entry in manifest.items():
+        for version in entry.get("versions", {}):
+            marker = "*" if version == str(entry.get("active")) else " "
+            print(f"{marker} {name} {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+ONNX Runtime backend for the EfficientNet classifiers
+Serves an exported .onnx graph through onnxruntime's CPU provider and falls
+back to eager PyTorch when no exported graph is available
+
+Exports record the SHA-256 of the .pth they came from in the graph's
+metadata (INT8 graphs inherit it); a graph whose .pth has changed since,
+e.g. retrained in place without re-exporting, is not served.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Callable, Optional, Tuple, Union
+
+import numpy as np
+import torch
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# "auto" uses an exported .onnx next to the .pth when present,
+# "torch" always runs eager PyTorch, "onnx" requires the exported graph
+CLASSIFIER_BACKEND = os.getenv("DURIAN_CLASSIFIER_BACKEND", "auto").lower()
+# Intra-op threads per ORT session; 0 lets onnxruntime decide
+ORT_THREADS = int(os.getenv("DURIAN_ORT_THREADS", "0"))
+# Opt-in INT8 mode: serve <model>.int8.onnx artifacts when they exist
+QUANTIZED_MODE = os.getenv("DURIAN_QUANTIZED", "false").lower() == "true"
+
+ONNX_OPSET = 17
+# Graph metadata key holding the SHA-256 of the source .pth
+SOURCE_DIGEST_KEY = "source_sha256"
+
+
+def weights_digest(model_path: Union[str, Path]) -> str:
+    """SHA-256 of a weights file"""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def onnx_path_for(model_path: Union[str, Path]) -> Path:
+    """The exported graph that sits next to a .pth state dict"""
+    return Path(model_path).with_suffix(".onnx")
+
+
+def quantized_path_for(model_path: Union[str, Path]) -> Path:
+    """The INT8 graph that sits next to a .pth / .pt model"""
+    return Path(model_path).with_suffix(".int8.onnx")
+
+
+def resolve_yolo_weights(model_path: Union[str, Path]) -> Path:
+    """
+    Weights file a YOLO model should be loaded from: the INT8 graph in
+    quantized mode (when it exists and onnxruntime is available), else model_path
+    """
+    quantized = quantized_path_for(model_path)
+    if QUANTIZED_MODE and ort is not None and quantized.exists():
+        print(f"[ONNX] Serving INT8 {quantized.name}")
+        return quantized
+    return Path(model_path)
+
+
+class OnnxClassifier:
+    """
+    onnxruntime session with the calling convention of the torch models:
+    takes an NxCxHxW tensor and returns a tensor of logits
+    """
+
+    backend = "onnx"
+
+    def __init__(self, onnx_path: Union[str, Path]):
+        if ort is None:
+            raise ImportError("onnxruntime not installed. Run: pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ORT_THREADS > 0:
+            options.intra_op_num_threads = ORT_THREADS
+
+        self.onnx_path = Path(onnx_path)
+        self.session = ort.InferenceSession(
+            str(self.onnx_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        # SHA-256 of the .pth the graph was exported from, when recorded
+        self.source_digest = self.session.get_modelmeta().custom_metadata_map.get(SOURCE_DIGEST_KEY)
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        inputs = np.ascontiguousarray(x.detach().cpu().numpy(), dtype=np.float32)
+        logits = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(logits)
+
+    def eval(self) -> "OnnxClassifier":
+        return self
+
+
+def load_classifier(model_path: Union[str, Path], build_torch: Callable[[Any], Any]) -> Any:
+    """
+    Load a classifier on the configured backend
+
+    Args:
+        model_path: Path to the .pth state dict
+        build_torch: Builds the eager PyTorch model from model_path
+
+    Returns:
+        An OnnxClassifier when an exported (or, with DURIAN_QUANTIZED, INT8)
+        graph is usable, else the torch model
+    """
+    onnx_path = onnx_path_for(model_path)
+    quantized = quantized_path_for(model_path)
+
+    if QUANTIZED_MODE and CLASSIFIER_BACKEND != "torch" and ort is not None and quantized.exists():
+        classifier = OnnxClassifier(quantized)
+        if _exported_from(classifier, model_path):
+            print(f"[ONNX] Serving INT8 {quantized.name} with onnxruntime")
+            return classifier
+
+    if CLASSIFIER_BACKEND != "torch" and onnx_path.exists():
+        if ort is not None:
+            classifier = OnnxClassifier(onnx_path)
+            if _exported_from(classifier, model_path):
+                print(f"[ONNX] Serving {onnx_path.name} with onnxruntime")
+                return classifier
+            if CLASSIFIER_BACKEND == "onnx":
+                raise ValueError(f"{onnx_path.name} was not exported from the current {Path(model_path).name}; re-run export_onnx.py")
+            return build_torch(model_path)
+        if CLASSIFIER_BACKEND == "onnx":
+            raise ImportError("onnxruntime not installed. Run: pip install onnxruntime")
+        print(f"[ONNX] onnxruntime not installed, using torch for {Path(model_path).name}")
+    elif CLASSIFIER_BACKEND == "onnx":
+        raise FileNotFoundError(f"ONNX model not found: {onnx_path}")
+
+    return build_torch(model_path)
+
+
+def _exported_from(classifier: OnnxClassifier, model_path: Union[str, Path]) -> bool:
+    """Whether a graph was exported from the .pth as it is now (warns when not)"""
+    if classifier.source_digest is not None and classifier.source_digest == weights_digest(model_path):
+        return True
+    reason = "records no source weights" if classifier.source_digest is None else "was exported from other weights"
+    print(f"⚠️ [ONNX] {classifier.onnx_path.name} {reason}; using torch for {Path(model_path).name} (re-run export_onnx.py)")
+    return False
+
+
+def export_classifier(
+    model: torch.nn.Module,
+    onnx_path: Union[str, Path],
+    input_size: Tuple[int, int],
+    source: Optional[Union[str, Path]] = None
+) -> Path:
+    """
+    Export an eager classifier to ONNX with a dynamic batch axis
+
+    Args:
+        model: Classifier in eval mode
+        onnx_path: Destination .onnx file
+        input_size: (height, width) the model was trained on
+        source: The .pth the model was built from; its SHA-256 is recorded
+            in the graph so load_classifier can tell when it goes stale
+
+    Returns:
+        Path of the written graph
+    """
+    onnx_path = Path(onnx_path)
+    dummy = torch.zeros(1, 3, *input_size)
+    torch.onnx.export(
+        model,
+        dummy,
+        str(onnx_path),
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=ONNX_OPSET,
+        dynamo=False
+    )
+    if source is not None:
+        import onnx
+        graph = onnx.load(str(onnx_path))
+        onnx.helper.set_model_props(graph, {SOURCE_DIGEST_KEY: weights_digest(source)})
+        onnx.save(graph, str(onnx_path))
+    return onnx_path
@@ -0,0 +1,301 @@
+"""
+Scanner pipeline executor
+Runs the independent model stages of a scan concurrently on a bounded
+thread pool, so per-scan latency tracks the slowest model instead of the sum
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import torch
+
+from .image_context import ImageContext
+from .model_registry import get_model_registry
+from .yolo_detector import get_yolo_detector
+from .durian_color import get_durian_color, get_durian_color_batch
+from .durian_shape import get_durian_shape, get_durian_shape_batch
+from .durian_size import get_durian_size, get_durian_size_batch
+from .durian_desease import get_durian_disease, get_durian_disease_batch
+
+# Stage threads shared by every request in this worker process
+PIPELINE_WORKERS = max(1, int(os.getenv("SCANNER_PIPELINE_WORKERS", "4")))
+
+# Intra-op threads per stage; by default the cores are split between workers
+STAGE_THREADS = max(1, int(os.getenv(
+    "SCANNER_STAGE_THREADS",
+    str(max(1, (os.cpu_count() or 1) // PIPELINE_WORKERS))
+)))
+
+# Primary detection confidence below which the classifier stages are skipped
+MIN_DETECTION_CONFIDENCE = float(os.getenv("SCANNER_MIN_DETECTION_CONFIDENCE", "0.0"))
+
+# Classify each detected durian on its own crop instead of the whole frame
+ROI_MODE = os.getenv("SCANNER_ROI_MODE", "true").lower() in ("1", "true", "yes")
+# Crop margin around each detection, as a fraction of the box size
+ROI_PADDING = float(os.getenv("SCANNER_ROI_PADDING", "0.1"))
+# Detections beyond this many (by confidence) are not classified
+MAX_FRUITS = max(1, int(os.getenv("SCANNER_MAX_FRUITS", "20")))
+
+CLASSIFIER_STAGES = ("color", "shape", "size", "disease")
+
+StageInput = Union[ImageContext, List[ImageContext]]
+# A stage takes one image, or a list of crops for the batched ROI stages
+Stage = Callable[[Any], Any]
+# Called as progress(stage, state) with state "running", "done", "failed" or "skipped"
+Progress = Callable[[str, str], None]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get or create the process-wide stage thread pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=PIPELINE_WORKERS,
+                    thread_name_prefix="scan-stage"
+                )
+    return _executor
+
+
+def _error(e: Exception) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": str(type(e).__name__),
+        "message": str(e)
+    }
+
+
+def _report(progress: Optional[Progress], stage: str, state: str):
+    if progress is None:
+        return
+    try:
+        progress(stage, state)
+    except Exception as e:
+        # Progress reporting must never fail a scan
+        print(f"⚠️ Progress callback failed for {stage}: {e}")
+
+
+def _run_stage(
+    name: str,
+    stage: Stage,
+    image_ctx: StageInput,
+    num_threads: int,
+    progress: Optional[Progress] = None
+) -> Any:
+    # With torch's default OpenMP backend the thread count is per calling
+    # thread, so each stage worker gets its own intra-op budget
+    if torch.get_num_threads() != num_threads:
+        torch.set_num_threads(num_threads)
+    _report(progress, name, "running")
+    try:
+        result = stage(image_ctx)
+    except Exception:
+        _report(progress, name, "failed")
+        raise
+    # Batched stages return one result per crop
+    results = result if isinstance(result, list) else [result]
+    ok = all(r.get("success", True) for r in results)
+    _report(progress, name, "done" if ok else "failed")
+    return result
+
+
+def run_stages(
+    image_ctx: StageInput,
+    stages: Dict[str, Stage],
+    num_threads: int = STAGE_THREADS,
+    progress: Optional[Progress] = None
+) -> Dict[str, Any]:
+    """
+    Run independent stages concurrently and wait for all of them
+
+    Args:
+        image_ctx: Decoded image (or list of crops) shared by every stage
+        stages: Stage name -> callable taking image_ctx
+        num_threads: Intra-op thread budget for each stage
+        progress: Optional callback told when each stage starts and ends
+
+    Returns:
+        Stage name -> stage result. A stage that raises is reported as an
+        error dict instead of failing the whole scan.
+    """
+    executor = get_executor()
+    futures = {
+        name: executor.submit(_run_stage, name, stage, image_ctx, num_threads, progress)
+        for name, stage in stages.items()
+    }
+
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            results[name] = _error(e)
+    return results
+
+
+def passes_detection_gate(
+    detection_result: Dict[str, Any],
+    min_confidence: float = MIN_DETECTION_CONFIDENCE
+) -> bool:
+    """True when the detector found a durian confident enough to analyze"""
+    if not detection_result.get("success"):
+        return False
+    detection = detection_result.get("detection", {})
+    primary = detection.get("primary") or {}
+    return detection.get("count", 0) > 0 and primary.get("confidence", 0) >= min_confidence
+
+
+def classify_crops(
+    crops: List[ImageContext],
+    progress: Optional[Progress] = None
+) -> List[Dict[str, Dict[str, Any]]]:
+    """
+    Run color, shape, size and disease on a list of crops, each stage as
+    one batch
+
+    Returns:
+        Per crop, stage name -> stage result
+    """
+    results = run_stages(crops, {
+        "color": get_durian_color_batch,
+        "shape": get_durian_shape_batch,
+        "size": get_durian_size_batch,
+        "disease": get_durian_disease_batch,
+    }, progress=progress)
+
+    classified = [{} for _ in crops]
+    for stage, stage_results in results.items():
+        if isinstance(stage_results, dict):
+            # The whole stage raised; every crop shares the error
+            stage_results = [stage_results] * len(crops)
+        for entry, stage_result in zip(classified, stage_results):
+            entry[stage] = stage_result
+    return classified
+
+
+def run_roi_stages(
+    image_ctx: ImageContext,
+    detections: List[Dict[str, Any]],
+    padding: float = ROI_PADDING,
+    progress: Optional[Progress] = None
+) -> List[Dict[str, Any]]:
+    """
+    Classify every detected durian on its own crop
+
+    Each classifier sees all crops as a single batch, and the disease model
+    runs on the crops only.
+
+    Args:
+        image_ctx: Decoded upload
+        detections: Detector objects with pixel "bbox" entries
+        padding: Crop margin as a fraction of the box size
+        progress: Optional callback told when each stage starts and ends
+
+    Returns:
+        One entry per detection with its bbox and color, shape, size and
+        disease results
+    """
+    fruits = []
+    crops = []
+    for index, detection in enumerate(detections):
+        fruit = {
+            "index": index,
+            "bbox": detection["bbox"],
+            "bbox_normalized": detection.get("bbox_normalized"),
+            "confidence": detection["confidence"],
+        }
+        try:
+            crops.append(image_ctx.crop(detection["bbox"], padding))
+        except ValueError as e:
+            # Degenerate box: report it without classifying
+            for stage in CLASSIFIER_STAGES:
+                fruit[stage] = _error(e)
+            crops.append(None)
+        fruits.append(fruit)
+
+    valid = [i for i, crop in enumerate(crops) if crop is not None]
+    classified = classify_crops([crops[i] for i in valid], progress=progress)
+    for i, stage_results in zip(valid, classified):
+        fruits[i].update(stage_results)
+    return fruits
+
+
+def run_scan_pipeline(
+    image_ctx: ImageContext,
+    min_confidence: float = MIN_DETECTION_CONFIDENCE,
+    progress: Optional[Progress] = None,
+    roi: bool = ROI_MODE
+) -> Dict[str, Any]:
+    """
+    Run detection, then color, shape, size and disease analysis on one image
+
+    Detection runs first. When it finds no durian, or the primary detection
+    is below min_confidence, the classifier stages are skipped and the
+    result is flagged with "gated": True.
+
+    In ROI mode every detection (up to MAX_FRUITS) is classified on its own
+    crop and listed under "fruits"; the top-level color, shape, size and
+    disease entries are those of the primary detection.
+
+    Args:
+        image_ctx: Decoded upload
+        min_confidence: Detection confidence needed to run the classifiers
+        progress: Optional callback told when each stage starts and ends
+        roi: Classify per-detection crops instead of the whole frame
+
+    Returns:
+        The detector result with "color", "shape", "size" and "disease"
+        entries added, as returned by /scanner/detect, and the versions of
+        the models that served it under "model_versions" (the stage
+        results themselves keep their documented keys)
+    """
+    detector = get_yolo_detector()
+    result = run_stages(image_ctx, {"detection": detector.predict}, progress=progress)["detection"]
+    # Boxes are in working-copy pixels; the upload may have been larger
+    width, height = image_ctx.size
+    result["image"] = {
+        "width": width,
+        "height": height,
+        "original_width": image_ctx.original_size[0],
+        "original_height": image_ctx.original_size[1]
+    }
+
+    if not passes_detection_gate(result, min_confidence):
+        result["gated"] = True
+        result["skipped_stages"] = list(CLASSIFIER_STAGES)
+        for stage in CLASSIFIER_STAGES:
+            _report(progress, stage, "skipped")
+        return _served(result)
+
+    if not roi:
+        result.update(run_stages(image_ctx, {
+            "color": get_durian_color,
+            "shape": get_durian_shape,
+            "size": get_durian_size,
+            "disease": get_durian_disease,
+        }, progress=progress))
+        return _served(result)
+
+    # Objects are sorted by confidence, so the first one is the primary
+    objects = result["detection"]["objects"]
+    fruits = run_roi_stages(image_ctx, objects[:MAX_FRUITS], progress=progress)
+    result["roi"] = True
+    result["fruit_count"] = len(fruits)
+    if len(objects) > MAX_FRUITS:
+        result["fruits_truncated"] = len(objects) - MAX_FRUITS
+    result["fruits"] = fruits
+    for stage in CLASSIFIER_STAGES:
+        result[stage] = fruits[0][stage]
+    return _served(result)
+
+
+def _served(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Pipeline metadata: which model versions answered this scan"""
+    result["model_versions"] = get_model_registry().served_versions()
+    return result
@@ -0,0 +1,103 @@
+"""
+Image-quality gate
+Scores sharpness (Laplacian variance), exposure (mean brightness and
+clipped shadows/highlights) and resolution on one downscaled grayscale copy,
+in a few milliseconds, so dark, blurry or overexposed photos are turned
+away with a hint before any model runs
+"""
+
+import os
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from PIL import Image
+
+from .image_context import ImageContext
+from .tracking import laplacian_variance
+
+QUALITY_GATE = os.getenv("SCANNER_QUALITY_GATE", "true").lower() == "true"
+# Grayscale copy the checks run on
+QUALITY_MAX_SIDE = int(os.getenv("SCANNER_QUALITY_MAX_SIDE", "512"))
+
+MIN_SHARPNESS = float(os.getenv("SCANNER_QUALITY_MIN_SHARPNESS", "15"))
+MIN_BRIGHTNESS = float(os.getenv("SCANNER_QUALITY_MIN_BRIGHTNESS", "35"))
+MAX_BRIGHTNESS = float(os.getenv("SCANNER_QUALITY_MAX_BRIGHTNESS", "225"))
+# Largest fraction of pixels allowed at black (<= 5) or white (>= 250)
+MAX_SHADOW_CLIP = float(os.getenv("SCANNER_QUALITY_MAX_SHADOW_CLIP", "0.5"))
+MAX_HIGHLIGHT_CLIP = float(os.getenv("SCANNER_QUALITY_MAX_HIGHLIGHT_CLIP", "0.35"))
+# Shortest side of the original upload
+MIN_SIDE = int(os.getenv("SCANNER_QUALITY_MIN_SIDE", "240"))
+
+SHADOW_LEVEL = 5
+HIGHLIGHT_LEVEL = 250
+
+
+def _gray(image_ctx: ImageContext, max_side: int = QUALITY_MAX_SIDE) -> np.ndarray:
+    gray = image_ctx.image.convert("L")
+    scale = max_side / max(gray.size)
+    if scale < 1:
+        gray = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))), Image.BILINEAR)
+    return np.asarray(gray)
+
+
+def quality_scores(image_ctx: ImageContext) -> Dict[str, float]:
+    """Sharpness, brightness, clipped fractions and original resolution"""
+    px = _gray(image_ctx)
+    histogram = np.bincount(px.ravel(), minlength=256)
+    total = max(1, px.size)
+    width, height = image_ctx.original_size
+    return {
+        "sharpness": round(laplacian_variance(px.astype(np.float32)), 1),
+        "brightness": round(float(histogram @ np.arange(256) / total), 1),
+        "shadow_clip": round(float(histogram[:SHADOW_LEVEL + 1].sum() / total), 4),
+        "highlight_clip": round(float(histogram[HIGHLIGHT_LEVEL:].sum() / total), 4),
+        "width": int(width),
+        "height": int(height),
+    }
+
+
+def _issues(scores: Dict[str, float]) -> List[Dict[str, str]]:
+    """Failed checks with a retake hint each, most actionable first"""
+    issues = []
+    if min(scores["width"], scores["height"]) < MIN_SIDE:
+        issues.append({
+            "check": "resolution",
+            "message": f"Image is too small ({scores['width']}x{scores['height']}). Use a higher camera resolution or move closer."
+        })
+    if scores["brightness"] < MIN_BRIGHTNESS or scores["shadow_clip"] > MAX_SHADOW_CLIP:
+        issues.append({
+            "check": "underexposed",
+            "message": "Image is too dark. Try better lighting or move closer to a light source."
+        })
+    if scores["brightness"] > MAX_BRIGHTNESS or scores["highlight_clip"] > MAX_HIGHLIGHT_CLIP:
+        issues.append({
+            "check": "overexposed",
+            "message": "Image is overexposed. Avoid direct sunlight or flash glare on the durian."
+        })
+    if scores["sharpness"] < MIN_SHARPNESS:
+        issues.append({
+            "check": "blur",
+            "message": "Image is blurry. Hold the camera steady and tap to focus on the durian."
+        })
+    return issues
+
+
+def assess_quality(image_ctx: ImageContext) -> Dict[str, Any]:
+    """
+    Run every quality check on a decoded upload
+
+    Returns:
+        {"passed", "scores", "issues", "recommendation", "elapsed_ms"}; the
+        recommendation is the first issue's hint
+    """
+    start = time.perf_counter()
+    scores = quality_scores(image_ctx)
+    issues = _issues(scores)
+    return {
+        "passed": not issues,
+        "scores": scores,
+        "issues": issues,
+        "recommendation": issues[0]["message"] if issues else "Image quality is good.",
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
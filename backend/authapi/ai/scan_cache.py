@@ -0,0 +1,281 @@
+"""
+Content-addressed cache in front of the scanner pipeline
+
+Two tiers:
+  - exact: SHA-256 of the uploaded bytes (in-process LRU, optionally Mongo)
+  - perceptual: dHash/pHash of the decoded image within a Hamming distance
+Entries expire after a TTL and are ignored once any file in backend/models
+changes or the registry swaps in another model version. Identical concurrent
+uploads share one in-flight inference.
+"""
+
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .image_context import ImageContext
+from .image_hash import dhash, phash, hamming_distances
+from .inference import models_fingerprint
+
+BASE_DIR = Path(__file__).parent.parent.parent
+MODELS_DIR = BASE_DIR / "models"
+
+SCAN_CACHE_ENABLED = os.getenv("SCAN_CACHE_ENABLED", "true").lower() == "true"
+SCAN_CACHE_MAX_ENTRIES = int(os.getenv("SCAN_CACHE_MAX_ENTRIES", "512"))
+SCAN_CACHE_TTL_SECONDS = int(os.getenv("SCAN_CACHE_TTL_SECONDS", "3600"))
+# Max differing bits for a perceptual hit; 0 disables the perceptual tier
+SCAN_CACHE_MAX_DISTANCE = int(os.getenv("SCAN_CACHE_MAX_DISTANCE", "4"))
+SCAN_CACHE_HASH = os.getenv("SCAN_CACHE_HASH", "dhash").lower()  # dhash | phash
+SCAN_CACHE_MONGO = os.getenv("SCAN_CACHE_MONGO", "false").lower() == "true"
+
+# How often the model files are re-checked for changes
+FINGERPRINT_INTERVAL_SECONDS = 30
+MODEL_SUFFIXES = {".pt", ".pth", ".onnx", ".json"}
+
+Compute = Callable[[ImageContext], Dict[str, Any]]
+
+
+class ModelFingerprint:
+    """
+    Digest of the model files' names, sizes and mtimes (refreshed
+    periodically) combined with the versions the registry is serving
+    """
+
+    def __init__(self, models_dir: Path = MODELS_DIR, interval: float = FINGERPRINT_INTERVAL_SECONDS):
+        self.models_dir = Path(models_dir)
+        self.interval = interval
+        self._value = ""
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _compute(self) -> str:
+        digest = hashlib.sha256()
+        if self.models_dir.exists():
+            for path in sorted(self.models_dir.iterdir()):
+                if path.suffix in MODEL_SUFFIXES and path.is_file():
+                    stat = path.stat()
+                    digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        return digest.hexdigest()[:16]
+
+    @property
+    def value(self) -> str:
+        now = time.monotonic()
+        if now - self._checked_at >= self.interval:
+            with self._lock:
+                if now - self._checked_at >= self.interval:
+                    self._value = self._compute()
+                    self._checked_at = now
+        versions = hashlib.sha256(models_fingerprint().encode()).hexdigest()[:8]
+        return f"{self._value}-{versions}"
+
+
+class MongoCacheStore:
+    """Exact-tier entries shared across workers through a TTL-indexed collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        try:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            print(f"[CACHE] Could not create TTL index: {e}")
+
+    def get(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        try:
+            doc = self.collection.find_one({
+                "_id": key,
+                "fingerprint": fingerprint,
+                "expires_at": {"$gt": datetime.utcnow()}
+            })
+            return doc.get("result") if doc else None
+        except Exception as e:
+            print(f"[CACHE] Mongo lookup failed: {e}")
+            return None
+
+    def put(self, key: str, fingerprint: str, result: Dict[str, Any], ttl: int):
+        try:
+            self.collection.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "fingerprint": fingerprint,
+                    "result": result,
+                    "created_at": datetime.utcnow(),
+                    "expires_at": datetime.utcnow() + timedelta(seconds=ttl)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            print(f"[CACHE] Mongo write failed: {e}")
+
+
+class ScanCache:
+    """LRU + TTL cache of pipeline results keyed by upload content"""
+
+    def __init__(
+        self,
+        max_entries: int = SCAN_CACHE_MAX_ENTRIES,
+        ttl: int = SCAN_CACHE_TTL_SECONDS,
+        max_distance: int = SCAN_CACHE_MAX_DISTANCE,
+        hash_method: str = SCAN_CACHE_HASH,
+        store: Optional[MongoCacheStore] = None,
+        enabled: bool = SCAN_CACHE_ENABLED,
+        fingerprint: Optional[ModelFingerprint] = None
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_fn = phash if hash_method == "phash" else dhash
+        self.store = store
+        self.enabled = enabled
+        self.fingerprint = fingerprint or ModelFingerprint()
+        # sha256 -> (result, perceptual hash, expires_at, model fingerprint)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], Optional[int], float, str]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "perceptual_hits": 0, "shared": 0, "misses": 0}
+
+    # -- in-process tier --
+
+    def _get_exact(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            result, _, expires_at, entry_fp = entry
+            if expires_at < time.monotonic() or entry_fp != fingerprint:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def _get_perceptual(self, value: int, fingerprint: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                (key, entry[1]) for key, entry in self._entries.items()
+                if entry[1] is not None and entry[2] >= now and entry[3] == fingerprint
+            ]
+            if not candidates:
+                return None
+            hashes = np.fromiter((h for _, h in candidates), dtype=np.uint64, count=len(candidates))
+            distances = hamming_distances(value, hashes)
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                return None
+            key = candidates[best][0]
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def _put(self, key: str, result: Dict[str, Any], value: Optional[int], fingerprint: str):
+        with self._lock:
+            self._entries[key] = (result, value, time.monotonic() + self.ttl, fingerprint)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": self.enabled, "entries": len(self._entries), **self.stats}
+
+    # -- public API --
+
+    def get_or_compute(
+        self,
+        data: bytes,
+        decode: Callable[[], ImageContext],
+        compute: Compute,
+        gate: Optional[Callable[[ImageContext], Optional[Dict[str, Any]]]] = None
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Return the pipeline result for an upload, computing it at most once
+
+        Args:
+            data: Raw upload bytes (the exact-tier key)
+            decode: Decodes the upload; only called on an exact-tier miss
+            compute: Runs the pipeline on the decoded image
+            gate: Runs on the decoded image before the perceptual lookup; a
+                result it returns is answered as is and never cached
+
+        Returns:
+            (result, status) where status is "exact", "perceptual", "shared",
+            "miss", "rejected" or "disabled". The result is a private copy.
+        """
+        if not self.enabled:
+            image_ctx = decode()
+            rejected = gate(image_ctx) if gate is not None else None
+            if rejected is not None:
+                return rejected, "rejected"
+            return compute(image_ctx), "disabled"
+
+        key = hashlib.sha256(data).hexdigest()
+        fingerprint = self.fingerprint.value
+
+        cached = self._get_exact(key, fingerprint)
+        if cached is None and self.store is not None:
+            cached = self.store.get(key, fingerprint)
+            if cached is not None:
+                self._put(key, cached, None, fingerprint)
+        if cached is not None:
+            self._count("exact_hits")
+            return copy.deepcopy(cached), "exact"
+
+        # Singleflight: identical uploads in flight wait for the leader
+        with self._lock:
+            leader = key not in self._inflight
+            if leader:
+                self._inflight[key] = Future()
+            pending = self._inflight[key]
+            if not leader:
+                self.stats["shared"] += 1
+
+        if not leader:
+            return copy.deepcopy(pending.result()), "shared"
+
+        try:
+            image_ctx = decode()
+            rejected = gate(image_ctx) if gate is not None else None
+            if rejected is not None:
+                pending.set_result(rejected)
+                return copy.deepcopy(rejected), "rejected"
+            value = self.hash_fn(image_ctx.image) if self.max_distance > 0 else None
+
+            status = "miss"
+            result = self._get_perceptual(value, fingerprint) if value is not None else None
+            if result is not None:
+                status = "perceptual"
+                self._count("perceptual_hits")
+            else:
+                self._count("misses")
+                result = compute(image_ctx)
+
+            if result.get("success"):
+                stored = copy.deepcopy(result)
+                self._put(key, stored, value, fingerprint)
+                if self.store is not None and status == "miss":
+                    self.store.put(key, fingerprint, stored, self.ttl)
+
+            pending.set_result(result)
+            return copy.deepcopy(result), status
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
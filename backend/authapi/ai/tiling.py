@@ -0,0 +1,137 @@
+"""
+Sliced inference helpers
+Splits a large frame into overlapping tiles for the detector and merges the
+per-tile boxes back with vectorized non-maximum suppression
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Decoded images whose long side exceeds this are detected tile by tile
+TILE_THRESHOLD = int(os.getenv("SCANNER_TILE_THRESHOLD", "1920"))
+# Tile side in source pixels (each tile is still run at the model's imgsz)
+TILE_SIZE = int(os.getenv("SCANNER_TILE_SIZE", "960"))
+TILE_OVERLAP = float(os.getenv("SCANNER_TILE_OVERLAP", "0.2"))
+# Boxes from neighbouring tiles overlapping more than this are merged
+TILE_NMS_IOU = float(os.getenv("SCANNER_TILE_NMS_IOU", "0.5"))
+# ...as are boxes mostly inside another one (a partial view of a fruit the
+# full-frame view or a neighbouring tile saw whole), by intersection over
+# the smaller box
+TILE_NMS_IOS = float(os.getenv("SCANNER_TILE_NMS_IOS", "0.7"))
+# A tile box this close (pixels) to a tile edge inside the frame is cut off
+TILE_EDGE_MARGIN = 2.0
+
+
+def _starts(length: int, tile: int, stride: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    # Last tile is flush with the edge instead of running past it
+    starts.append(length - tile)
+    return starts
+
+
+def tile_windows(width: int, height: int, tile_size: int, overlap: float = 0.2) -> List[Tuple[int, int, int, int]]:
+    """
+    Overlapping (x1, y1, x2, y2) windows covering a width x height frame
+
+    Args:
+        width, height: Frame size in pixels
+        tile_size: Side of each square tile (clipped to the frame)
+        overlap: Fraction of a tile shared with its neighbour
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _starts(height, tile_size, stride)
+        for x in _starts(width, tile_size, stride)
+    ]
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU of one xyxy box against an Nx4 array of xyxy boxes"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def box_ios(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """Intersection of one xyxy box with each of Nx4 boxes over the smaller of the two areas"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(np.minimum(area, areas), 1e-9)
+
+
+def cut_by_tile(boxes: np.ndarray, window: Tuple[int, int, int, int], width: int, height: int) -> np.ndarray:
+    """
+    Mask of the Nx4 xyxy boxes (frame pixels) that touch an edge of window
+    lying inside the frame: the tile only saw part of those fruits
+    """
+    x1, y1, x2, y2 = window
+    margin = TILE_EDGE_MARGIN
+    cut = np.zeros(len(boxes), dtype=bool)
+    if x1 > 0:
+        cut |= boxes[:, 0] <= x1 + margin
+    if y1 > 0:
+        cut |= boxes[:, 1] <= y1 + margin
+    if x2 < width:
+        cut |= boxes[:, 2] >= x2 - margin
+    if y2 < height:
+        cut |= boxes[:, 3] >= y2 - margin
+    return cut
+
+
+def nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float = 0.5,
+    classes: Optional[np.ndarray] = None,
+    ios_threshold: Optional[float] = None
+) -> np.ndarray:
+    """
+    Greedy non-maximum suppression
+
+    Args:
+        boxes: Nx4 xyxy boxes
+        scores: N confidences
+        iou_threshold: Boxes overlapping a kept box by more than this are dropped
+        classes: Optional N class ids; boxes of different classes never suppress
+            each other
+        ios_threshold: Also drop boxes whose intersection with a kept box
+            covers more than this of the smaller one
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    boxes = boxes.astype(np.float32)
+    if classes is not None:
+        # Shift each class into its own coordinate range so they cannot overlap
+        boxes = boxes + (classes.astype(np.float32) * (boxes.max() + 1))[:, None]
+
+    order = np.argsort(-scores)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        rest = order[1:]
+        keep_rest = box_iou(boxes[i], boxes[rest]) <= iou_threshold
+        if ios_threshold is not None:
+            keep_rest &= box_ios(boxes[i], boxes[rest]) <= ios_threshold
+        order = rest[keep_rest]
+    return np.array(keep, dtype=np.int64)
@@ -0,0 +1,167 @@
+"""
+Frame-to-frame helpers for live / video scanning
+A cheap motion score decides which frames are worth running the detector on,
+and a greedy IoU tracker follows each durian across the frames that are
+"""
+
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .image_context import ImageContext
+
+MOTION_SIZE = (64, 48)  # thumbnail compared between frames
+SHARPNESS_MAX_SIDE = 256  # crops are downscaled to this before measuring focus
+
+
+def frame_signature(image_ctx: ImageContext, size: Tuple[int, int] = MOTION_SIZE) -> np.ndarray:
+    """Grayscale float32 thumbnail used to compare consecutive frames"""
+    return np.asarray(image_ctx.image.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def motion_score(previous: Optional[np.ndarray], current: np.ndarray) -> float:
+    """Mean absolute pixel change (0-255) between two frame signatures"""
+    if previous is None:
+        return float("inf")
+    return float(np.mean(np.abs(current - previous)))
+
+
+def sharpness(image_ctx: ImageContext, max_side: int = SHARPNESS_MAX_SIDE) -> float:
+    """Variance of the Laplacian on a downscaled grayscale copy; higher is sharper"""
+    gray = image_ctx.image.convert("L")
+    scale = max_side / max(gray.size)
+    if scale < 1:
+        gray = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))), Image.BILINEAR)
+    return laplacian_variance(np.asarray(gray, dtype=np.float32))
+
+
+def laplacian_variance(px: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian of a float32 grayscale array"""
+    if px.shape[0] < 3 or px.shape[1] < 3:
+        return 0.0
+    lap = (
+        px[:-2, 1:-1] + px[2:, 1:-1] + px[1:-1, :-2] + px[1:-1, 2:]
+        - 4 * px[1:-1, 1:-1]
+    )
+    return float(lap.var())
+
+
+def iou_matrix(boxes_a: List[Dict[str, float]], boxes_b: List[Dict[str, float]]) -> np.ndarray:
+    """Pairwise IoU between two lists of pixel bboxes ({"x1", "y1", "x2", "y2"})"""
+    if not boxes_a or not boxes_b:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    a = np.array([[b["x1"], b["y1"], b["x2"], b["y2"]] for b in boxes_a], dtype=np.float32)
+    b = np.array([[b["x1"], b["y1"], b["x2"], b["y2"]] for b in boxes_b], dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    """One durian followed across frames"""
+
+    def __init__(self, track_id: int, detection: Dict[str, Any], frame_index: int):
+        self.track_id = track_id
+        self.detection = detection
+        self.hits = 1
+        self.misses = 0
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+
+    @property
+    def bbox(self) -> Dict[str, float]:
+        return self.detection["bbox"]
+
+    def update(self, detection: Dict[str, Any], frame_index: int):
+        self.detection = detection
+        self.hits += 1
+        self.misses = 0
+        self.last_frame = frame_index
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "track_id": self.track_id,
+            "bbox": self.bbox,
+            "confidence": self.detection.get("confidence"),
+            "hits": self.hits,
+            "first_frame": self.first_frame,
+            "last_frame": self.last_frame
+        }
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker: each detection extends the overlapping track it
+    matches best, or starts a new one. A track not matched for more than
+    max_age processed frames is finished.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 5, min_hits: int = 2):
+        """
+        Args:
+            iou_threshold: Minimum overlap for a detection to extend a track
+            max_age: Processed frames a track may go unmatched before it ends
+            min_hits: Detections a track needs to count as a durian; shorter
+                tracks are dropped as noise when they end
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.tracks: List[Track] = []
+        self._ids = itertools.count(1)
+
+    def update(self, detections: List[Dict[str, Any]], frame_index: int) -> Tuple[List[Tuple[Track, Dict[str, Any]]], List[Track]]:
+        """
+        Match one frame's detections to the live tracks
+
+        Returns:
+            ((track, detection) for every detection in this frame,
+             tracks that ended with at least min_hits detections)
+        """
+        ious = iou_matrix([t.bbox for t in self.tracks], [d["bbox"] for d in detections])
+        matched_tracks, matched_dets = set(), set()
+        pairs = []
+        # Best overlaps first
+        for flat in np.argsort(-ious, axis=None):
+            ti, di = np.unravel_index(flat, ious.shape)
+            if ious[ti, di] < self.iou_threshold:
+                break
+            if ti in matched_tracks or di in matched_dets:
+                continue
+            matched_tracks.add(ti)
+            matched_dets.add(di)
+            self.tracks[ti].update(detections[di], frame_index)
+            pairs.append((self.tracks[ti], detections[di]))
+
+        finished, alive = [], []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+            if track.misses > self.max_age:
+                if track.hits >= self.min_hits:
+                    finished.append(track)
+            else:
+                alive.append(track)
+
+        for di, detection in enumerate(detections):
+            if di not in matched_dets:
+                track = Track(next(self._ids), detection, frame_index)
+                alive.append(track)
+                pairs.append((track, detection))
+
+        self.tracks = alive
+        return pairs, finished
+
+    def flush(self) -> List[Track]:
+        """End every live track (end of stream); returns those with enough hits"""
+        finished = [t for t in self.tracks if t.hits >= self.min_hits]
+        self.tracks = []
+        return finished
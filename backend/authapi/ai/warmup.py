@@ -0,0 +1,117 @@
+"""
+Model preloading, warmup and readiness state
+Loads every scanner model at startup and runs one synthetic forward at the
+real input resolution, so the first user request after a deploy is not the
+one paying for model construction and first-forward overhead
+"""
+
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+import numpy as np
+import torch
+
+from .model_registry import get_model_registry
+# Imported for their registry registrations
+from . import yolo_detector, durian_color, durian_size, durian_shape, durian_desease  # noqa: F401
+
+_status: Dict[str, Dict[str, Any]] = {}
+_status_lock = threading.Lock()
+_preload_thread = None
+
+
+def _set_status(name: str, **fields):
+    with _status_lock:
+        _status.setdefault(name, {"state": "pending"}).update(fields)
+
+
+def _load(name: str):
+    loaded = get_model_registry().get(name)
+    if name == "detector" and not loaded.handle.available:
+        raise RuntimeError(f"Detector not available: {loaded.handle.model_path}")
+    return loaded
+
+
+def _warm_classifier(batcher, spec):
+    batcher.predict(torch.zeros(1, 3, *spec.input_size))
+
+
+def _warm_yolo(pool, spec):
+    height, width = spec.input_size
+    frame = np.full((height, width, 3), 114, dtype=np.uint8)
+    with pool.acquire() as model:
+        model.predict(source=frame, imgsz=height, save=False, verbose=False)
+
+
+# name -> warmup taking the loaded handle and its spec
+MODELS: Dict[str, Callable[[Any, Any], Any]] = {
+    "detector": lambda detector, spec: detector.warmup(spec.input_size[0]),
+    "color": _warm_classifier,
+    "size": _warm_classifier,
+    "shape": _warm_classifier,
+    "disease": _warm_yolo,
+}
+
+# Versions swapped in later by the registry are warmed the same way
+for _name, _warm in MODELS.items():
+    get_model_registry().set_warmup(_name, _warm)
+
+
+def _preload_one(name: str):
+    _set_status(name, state="loading", started_at=datetime.utcnow().isoformat())
+    try:
+        # Loading through the registry also runs the registered warmup; it
+        # times the two separately
+        loaded = _load(name)
+        _set_status(name, state="ready", version=loaded.spec.version, load_ms=loaded.load_ms, warmup_ms=loaded.warmup_ms)
+    except Exception as e:
+        print(f"❌ Preload failed for {name}: {e}")
+        _set_status(name, state="failed", error=f"{type(e).__name__}: {e}")
+
+
+def preload_models() -> Dict[str, Dict[str, Any]]:
+    """Load and warm up every scanner model, one after another"""
+    for name in MODELS:
+        _set_status(name, state="pending")
+    for name in MODELS:
+        _preload_one(name)
+    print(f"✅ Scanner models preloaded: {', '.join(n for n in MODELS if is_model_ready(n))}")
+    return get_model_status()
+
+
+def start_model_preload() -> threading.Thread:
+    """Preload in a background thread so the web worker can start serving probes"""
+    global _preload_thread
+    with _status_lock:
+        if _preload_thread is None:
+            _preload_thread = threading.Thread(
+                target=preload_models,
+                name="model-preload", daemon=True
+            )
+            _preload_thread.start()
+    return _preload_thread
+
+
+def get_model_status() -> Dict[str, Dict[str, Any]]:
+    """Per-model preload state (pending/loading/ready/failed), load time and warmup latency"""
+    registry = get_model_registry()
+    with _status_lock:
+        status = {name: dict(fields) for name, fields in _status.items()}
+    for name in MODELS:
+        status.setdefault(name, {"state": "not_started"})
+        # A ready model may since have been unloaded by the memory budget
+        loaded = registry.peek(name)
+        status[name]["loaded"] = loaded is not None
+        if loaded is not None:
+            status[name]["version"] = loaded.spec.version
+    return status
+
+
+def is_model_ready(name: str) -> bool:
+    with _status_lock:
+        return _status.get(name, {}).get("state") == "ready"
+
+
+def all_models_ready() -> bool:
+    return all(is_model_ready(name) for name in MODELS)
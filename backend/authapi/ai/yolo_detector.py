@@ -5,31 +5,94 @@ Uses the custom-trained YOLOv8 model for durian detection
 """
 
 import os
+import threading
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
 
+import numpy as np
+
+from .image_context import ImageContext, as_image_context
+from .tiling import tile_windows, cut_by_tile, nms, TILE_THRESHOLD, TILE_SIZE, TILE_OVERLAP, TILE_NMS_IOU, TILE_NMS_IOS
+from .model_pool import ModelPool
+from .onnx_backend import resolve_yolo_weights
+from .model_registry import ModelSpec, get_model_registry
+
 # Get the base directory
 BASE_DIR = Path(__file__).parent.parent.parent
 MODELS_DIR = BASE_DIR / "models"
 
-# Default model path - update this if you train a new model
+# Default model when backend/models/manifest.json does not name one;
+# roll out a retrained detector through the manifest instead of editing this
 DEFAULT_MODEL = "durian_detector_durian_detection_20260212_220446.pt"
+DEFAULT_VERSION = "20260212_220446"
+
+# Detection cascade: try the cheaper resolutions first and only run the full
+# input size when their primary detection is not convincing. Tiled images
+# skip it: one large confident fruit would hide the small ones tiling finds
+DETECT_CASCADE = os.getenv("SCANNER_DETECT_CASCADE", "true").lower() == "true"
+CASCADE_SIZES = [int(s) for s in os.getenv("SCANNER_DETECT_CASCADE_SIZES", "320").split(",") if s.strip()]
+# A low-resolution result is accepted when its primary detection has at
+# least this confidence and covers at least this fraction of the image
+CASCADE_MIN_CONFIDENCE = float(os.getenv("SCANNER_DETECT_CASCADE_CONFIDENCE", "0.6"))
+CASCADE_MIN_AREA = float(os.getenv("SCANNER_DETECT_CASCADE_MIN_AREA", "0.02"))
+
+
+class CascadeStats:
+    """How often each cascade level produced the final answer"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs: Dict[str, int] = {}
+        self.accepted: Dict[str, int] = {}
+
+    def record(self, levels_run: List[str], accepted: str):
+        with self._lock:
+            for level in levels_run:
+                self.runs[level] = self.runs.get(level, 0) + 1
+            self.accepted[accepted] = self.accepted.get(accepted, 0) + 1
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            levels = {
+                level: {
+                    "runs": runs,
+                    "accepted": self.accepted.get(level, 0),
+                    "hit_rate": round(self.accepted.get(level, 0) / runs, 4) if runs else None
+                }
+                for level, runs in self.runs.items()
+            }
+        return {
+            "enabled": DETECT_CASCADE,
+            "sizes": CASCADE_SIZES,
+            "min_confidence": CASCADE_MIN_CONFIDENCE,
+            "min_area": CASCADE_MIN_AREA,
+            "levels": levels
+        }
+
+
+cascade_stats = CascadeStats()
 
 
 class YOLODetector:
     """Local YOLO-based durian detector using trained model"""
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, image_size: int = 640, version: Optional[str] = None):
         """
         Initialize YOLO detector with local model
         
         Args:
             model_path: Path to .pt model file. If None, uses default model.
+            image_size: Inference resolution (the manifest's input_size)
+            version: Model version label reported with results
         """
         self.model = None
         self.available = False
         self.model_path = None
+        self.image_size = image_size
+        self.version = version
+        self.cascade_sizes: List[int] = []
+        self._pool = None
         
         # Determine model path
         if model_path:
@@ -49,22 +112,43 @@ class YOLODetector:
         # Load the model
         try:
             from ultralytics import YOLO
-            self.model = YOLO(str(self.model_path))
+            # ultralytics predictors are not thread-safe; one YOLO per replica
+            weights = resolve_yolo_weights(self.model_path)
+            self._pool = ModelPool(lambda: YOLO(str(weights), task="detect"), name="detector")
+            self.model = self._pool.primary
             self.available = True
+            # Exported graphs have a fixed input size, so only .pt weights cascade
+            if weights.suffix == ".pt":
+                self.cascade_sizes = sorted(s for s in CASCADE_SIZES if s < image_size)
             print(f"✅ YOLO Detector initialized")
-            print(f"   Model: {self.model_path.name}")
+            print(f"   Model: {self.model_path.name} ({self.version or 'unversioned'})")
         except ImportError:
             print("❌ ultralytics not installed. Run: pip install ultralytics")
         except Exception as e:
             print(f"❌ Failed to load model: {e}")
     
-    def predict(self, image_path: str, confidence: float = 0.25) -> Dict[str, Any]:
+    @property
+    def pool(self) -> Optional[ModelPool]:
+        """Replica pool behind this detector (None when unavailable)"""
+        return self._pool
+    
+    def predict(
+        self,
+        image: Union[str, ImageContext],
+        confidence: float = 0.25,
+        tiled: Optional[bool] = None,
+        cascade: Optional[bool] = None
+    ) -> Dict[str, Any]:
         """
         Run detection on an image
         
         Args:
-            image_path: Path to image file
+            image: Path to image file or an already decoded ImageContext
             confidence: Minimum confidence threshold (0-1)
+            tiled: Slice the image into overlapping tiles; by default only
+                decoded images larger than SCANNER_TILE_THRESHOLD are tiled
+            cascade: Try the SCANNER_DETECT_CASCADE_SIZES resolutions first
+                (default SCANNER_DETECT_CASCADE); never used on tiled images
         
         Returns:
             Dictionary with detection results
@@ -76,45 +160,45 @@ class YOLODetector:
                 "message": "YOLO model is not loaded"
             }
         
-        if not os.path.exists(image_path):
+        if isinstance(image, ImageContext):
+            image_path = image.source_path
+            source = image.bgr
+        else:
+            image_path = source = image
+        
+        if not isinstance(image, ImageContext) and not os.path.exists(image_path):
             return {
                 "success": False,
                 "error": "File not found",
                 "message": f"Image not found: {image_path}"
             }
         
+        if tiled is None:
+            tiled = isinstance(image, ImageContext) and max(image.size) > TILE_THRESHOLD
+        if cascade is None:
+            cascade = DETECT_CASCADE
+        cascade = cascade and not tiled
+        
         try:
-            # Run inference
-            results = self.model.predict(
-                source=image_path,
-                conf=confidence,
-                save=False,
-                verbose=False
-            )
+            tiling = None
+            detections = None
+            levels_run = []
             
-            # Process results
-            detections = []
-            result = results[0]  # Get first result
+            # Cheap resolutions first; most photos are close-ups
+            for size in (self.cascade_sizes if cascade else []):
+                levels_run.append(str(size))
+                candidates = self._predict_full(source, confidence, size)
+                if self._cascade_accepts(candidates):
+                    detections = candidates
+                    break
             
-            for box in result.boxes:
-                detection = {
-                    "class_id": int(box.cls[0]),
-                    "class_name": result.names[int(box.cls[0])],
-                    "confidence": float(box.conf[0]),
-                    "bbox": {
-                        "x1": float(box.xyxy[0][0]),
-                        "y1": float(box.xyxy[0][1]),
-                        "x2": float(box.xyxy[0][2]),
-                        "y2": float(box.xyxy[0][3]),
-                    },
-                    "bbox_normalized": {
-                        "x": float(box.xywhn[0][0]),
-                        "y": float(box.xywhn[0][1]),
-                        "width": float(box.xywhn[0][2]),
-                        "height": float(box.xywhn[0][3]),
-                    }
-                }
-                detections.append(detection)
+            if detections is None:
+                levels_run.append("tiled" if tiled else str(self.image_size))
+                if tiled:
+                    detections, tiling = self._predict_tiled(as_image_context(image), confidence)
+                else:
+                    detections = self._predict_full(source, confidence, self.image_size)
+            cascade_stats.record(levels_run, levels_run[-1])
             
             # Sort by confidence
             detections.sort(key=lambda x: x["confidence"], reverse=True)
@@ -124,9 +208,10 @@ class YOLODetector:
             if detections:
                 primary = detections[0]
             
-            return {
+            response = {
                 "success": True,
                 "model": self.model_path.name,
+                "model_version": self.version,
                 "image_path": image_path,
                 "timestamp": datetime.utcnow().isoformat(),
                 "detection": {
@@ -136,6 +221,11 @@ class YOLODetector:
                 },
                 "analysis": self._analyze_detections(detections)
             }
+            if tiling:
+                response["tiling"] = tiling
+            if len(levels_run) > 1 or levels_run[0] != str(self.image_size):
+                response["cascade"] = {"level": levels_run[-1], "levels_run": levels_run}
+            return response
             
         except Exception as e:
             return {
@@ -144,6 +234,114 @@ class YOLODetector:
                 "message": str(e)
             }
     
+    def _predict_full(self, source, confidence: float, image_size: int) -> List[Dict[str, Any]]:
+        """Detections (sorted by confidence) on the whole frame at one resolution"""
+        with self._pool.acquire() as model:
+            results = model.predict(
+                source=source,
+                conf=confidence,
+                imgsz=image_size,
+                save=False,
+                verbose=False
+            )
+        
+        # Process results
+        detections = []
+        result = results[0]  # Get first result
+        
+        for box in result.boxes:
+            detection = {
+                "class_id": int(box.cls[0]),
+                "class_name": result.names[int(box.cls[0])],
+                "confidence": float(box.conf[0]),
+                "bbox": {
+                    "x1": float(box.xyxy[0][0]),
+                    "y1": float(box.xyxy[0][1]),
+                    "x2": float(box.xyxy[0][2]),
+                    "y2": float(box.xyxy[0][3]),
+                },
+                "bbox_normalized": {
+                    "x": float(box.xywhn[0][0]),
+                    "y": float(box.xywhn[0][1]),
+                    "width": float(box.xywhn[0][2]),
+                    "height": float(box.xywhn[0][3]),
+                }
+            }
+            detections.append(detection)
+        
+        detections.sort(key=lambda x: x["confidence"], reverse=True)
+        return detections
+    
+    @staticmethod
+    def _cascade_accepts(detections: List[Dict[str, Any]]) -> bool:
+        """A low-resolution pass is final when its primary fruit is confident and not tiny"""
+        if not detections:
+            return False
+        primary = detections[0]
+        area = primary["bbox_normalized"]["width"] * primary["bbox_normalized"]["height"]
+        return primary["confidence"] >= CASCADE_MIN_CONFIDENCE and area >= CASCADE_MIN_AREA
+    
+    def _predict_tiled(self, image: ImageContext, confidence: float):
+        """
+        Detect on overlapping tiles plus one full-frame view (for fruits
+        larger than a tile) in a single batch, then merge with NMS
+        
+        Returns:
+            (detections in full-image pixels, tiling info)
+        """
+        width, height = image.size
+        frame = image.bgr
+        windows = tile_windows(width, height, TILE_SIZE, TILE_OVERLAP)
+        views = [(0, 0, width, height)] + windows
+        sources = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for x1, y1, x2, y2 in views]
+        
+        with self._pool.acquire() as model:
+            results = model.predict(
+                source=sources,
+                conf=confidence,
+                imgsz=self.image_size,
+                save=False,
+                verbose=False
+            )
+        
+        boxes, scores, classes = [], [], []
+        names = results[0].names if results else {}
+        for view, result in zip(views, results):
+            if result.boxes is None or len(result.boxes) == 0:
+                continue
+            x1, y1 = view[:2]
+            view_boxes = result.boxes.xyxy.cpu().numpy() + np.array([x1, y1, x1, y1], dtype=np.float32)
+            # Fruits cut by a tile edge are seen whole by a neighbour or the full frame
+            whole = ~cut_by_tile(view_boxes, view, width, height)
+            boxes.append(view_boxes[whole])
+            scores.append(result.boxes.conf.cpu().numpy()[whole])
+            classes.append(result.boxes.cls.cpu().numpy().astype(np.int64)[whole])
+        
+        detections = []
+        if boxes:
+            boxes, scores, classes = np.concatenate(boxes), np.concatenate(scores), np.concatenate(classes)
+            for i in nms(boxes, scores, TILE_NMS_IOU, classes, TILE_NMS_IOS):
+                bx1, by1, bx2, by2 = (float(v) for v in boxes[i])
+                detections.append({
+                    "class_id": int(classes[i]),
+                    "class_name": names[int(classes[i])],
+                    "confidence": float(scores[i]),
+                    "bbox": {"x1": bx1, "y1": by1, "x2": bx2, "y2": by2},
+                    "bbox_normalized": {
+                        "x": (bx1 + bx2) / 2 / width,
+                        "y": (by1 + by2) / 2 / height,
+                        "width": (bx2 - bx1) / width,
+                        "height": (by2 - by1) / height,
+                    }
+                })
+        
+        return detections, {
+            "tiles": len(windows),
+            "tile_size": TILE_SIZE,
+            "overlap": TILE_OVERLAP,
+            "raw_detections": len(scores)
+        }
+    
     def predict_from_bytes(self, image_bytes: bytes, confidence: float = 0.25) -> Dict[str, Any]:
         """
         Run detection on image bytes
@@ -155,19 +353,17 @@ class YOLODetector:
         Returns:
             Dictionary with detection results
         """
-        import tempfile
-        
-        # Save to temp file and process
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            tmp.write(image_bytes)
-            tmp_path = tmp.name
-        
+        # Decode in memory and hand the array to ultralytics
         try:
-            result = self.predict(tmp_path, confidence)
-        finally:
-            os.unlink(tmp_path)
+            image = ImageContext.from_bytes(image_bytes)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(type(e).__name__),
+                "message": str(e)
+            }
         
-        return result
+        return self.predict(image, confidence)
     
     def _analyze_detections(self, detections: List[Dict]) -> Dict[str, Any]:
         """
@@ -227,6 +423,16 @@ class YOLODetector:
         else:
             return "Low confidence. Try better lighting or closer shot."
     
+    def warmup(self, image_size: Optional[int] = None) -> None:
+        """Run one forward on a blank frame so the first real request is fast"""
+        if not self.available:
+            return
+        image_size = image_size or self.image_size
+        frame = np.full((image_size, image_size, 3), 114, dtype=np.uint8)
+        with self._pool.acquire() as model:
+            for size in self.cascade_sizes + [self.image_size]:
+                model.predict(source=frame, imgsz=size, save=False, verbose=False)
+    
     def test_connection(self) -> Dict[str, Any]:
         """Test if the model is loaded and ready"""
         return {
@@ -242,16 +448,21 @@ def create_yolo_detector(model_path: Optional[str] = None) -> YOLODetector:
     return YOLODetector(model_path)
 
 
-# Global instance for common use
-yolo_detector = None
+DEFAULT_SPEC = ModelSpec(
+    "detector", DEFAULT_VERSION, DEFAULT_MODEL, "yolov8", ["durian"], (640, 640), pinned=True
+)
+
+
+def _load_detector(spec: ModelSpec) -> YOLODetector:
+    return YOLODetector(spec.path, image_size=spec.input_size[0], version=spec.version)
+
+
+get_model_registry().register(DEFAULT_SPEC, _load_detector)
 
 
 def get_yolo_detector() -> YOLODetector:
-    """Get or create the global YOLO detector instance"""
-    global yolo_detector
-    if yolo_detector is None:
-        yolo_detector = create_yolo_detector()
-    return yolo_detector
+    """Get the detector for the version active in the model manifest"""
+    return get_model_registry().get("detector").handle
 
 
 # Test function
@@ -12,6 +12,10 @@ load_dotenv()
 
 app = Flask(__name__)
 
+# Bodies larger than this are refused with 413 before werkzeug buffers them;
+# /scanner/bulk and /scanner/video raise it for their own requests
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_UPLOAD_MB", "12")) * 1024 * 1024
+
 # ✅ PINALAKAS NA CORS SETUP
 # Tinanggal natin ang wildcard "*" sa origins at pinalitan ng supports_credentials para sa mas stable na connection
 CORS(app, resources={r"/*": {
@@ -45,6 +49,7 @@ from routes.admin.admin_routes import admin_bp
 from routes.scanner_routes import scanner_bp
 from routes.chatbot_routes import chatbot_bp
 from routes.shop_routes import shop_bp
+from routes.media_routes import media_bp
 from routes.transaction_routes import bp as transaction_bp
 
 # Register Blueprints
@@ -55,8 +60,22 @@ app.register_blueprint(admin_bp, url_prefix='/admin')
 app.register_blueprint(scanner_bp, url_prefix='/scanner')
 app.register_blueprint(chatbot_bp, url_prefix='/chatbot')
 app.register_blueprint(shop_bp, url_prefix='/shop')
+app.register_blueprint(media_bp, url_prefix='/media')
 app.register_blueprint(transaction_bp, url_prefix='/api')   
 
+# Load and warm every scanner model in the background; /scanner/ready
+# reports 503 until they are all ready
+if os.getenv("SCANNER_PRELOAD", "true").lower() == "true":
+    # No-op when the models live in the inference service
+    from ai.inference import get_backend
+    get_backend().preload()
+
+# Resume scan image uploads left pending by the previous run
+from handlers.upload_queue_handler import SCAN_UPLOAD_QUEUE
+if SCAN_UPLOAD_QUEUE:
+    from routes.scanner_routes import scan_uploads
+    scan_uploads.start()
+
 # ---------------------------
 # Core App Routes
 # ---------------------------
@@ -111,6 +130,12 @@ def status():
 def not_found(error):
     return jsonify({"success": False, "error": "Endpoint not found"}), 404
 
+@app.errorhandler(413)
+def payload_too_large(error):
+    limit = request.max_content_length
+    message = f"Upload is larger than {limit // (1024 * 1024)}MB" if limit else "Upload is too large"
+    return jsonify({"success": False, "error": "File too large", "message": message}), 413
+
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({"success": False, "error": "Internal server error"}), 500
@@ -246,7 +246,9 @@ def signup_user_with_pfp(name, email, password, confirm_password, photo_file=Non
 
                     "photoThumbnail": upload_result.get("photoThumbnail") or upload_result.get("thumbnail"),
 
-                    "photoPublicId": upload_result.get("photoPublicId") or upload_result.get("public_id")
+                    "photoPublicId": upload_result.get("photoPublicId") or upload_result.get("public_id"),
+
+                    "photoBlurhash": upload_result.get("photoBlurhash")
 
                 }
 
@@ -338,6 +340,7 @@ def signup_user_with_pfp(name, email, password, confirm_password, photo_file=Non
             "photoProfile": user.get("photoProfile"),
             "photoThumbnail": user.get("photoThumbnail"),
             "photoPublicId": user.get("photoPublicId"),
+            "photoBlurhash": user.get("photoBlurhash"),
             "createdAt": user["createdAt"]
         }
     }
\ No newline at end of file
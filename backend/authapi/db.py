@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 import os
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 from datetime import datetime
 import cloudinary
 import cloudinary.uploader
@@ -10,6 +11,8 @@ import uuid
 from typing import Optional, Dict, Any, List
 from bson import ObjectId
 
+from handlers.storage_handler import PROFILE_VARIANTS, USER_PFP_VARIANTS, delete_image, get_image_storage
+
 # Load .env
 load_dotenv()
 
@@ -36,6 +39,10 @@ cloudinary.config(
 
 print(f"[DB] Cloudinary configured: cloud_name={os.getenv('CLOUDINARY_CLOUD_NAME')}")
 
+# Sizes a user photo may have been stored with: PROFILE_VARIANTS at signup,
+# USER_PFP_VARIANTS when changed later
+USER_PHOTO_SIZES = sorted(set(PROFILE_VARIANTS) | set(USER_PFP_VARIANTS))
+
 # ---------------------------
 # JWT config
 # ---------------------------
@@ -246,6 +253,7 @@ def create_post(user_id: str, title: str, content: str, category: str) -> Option
             "user_id": user_oid,
             "username": user.get("name", "Anonymous"),
             "user_avatar": user.get("photoProfile", ""),
+            "user_avatar_blurhash": user.get("photoBlurhash"),
             "title": title,
             "content": content,
             "category": category,
@@ -351,13 +359,13 @@ def upload_user_pfp(
     delete_old: bool = True
 ) -> Dict[str, Any]:
     """
-    Upload user profile picture to Cloudinary and update MongoDB
+    Upload user profile picture (Cloudinary or the local store) and update MongoDB
     
     Args:
         image_data: Image bytes
         user_id: MongoDB user ID
         username: Username for naming
-        delete_old: Delete old PFP from Cloudinary
+        delete_old: Delete the old PFP from its storage
     
     Returns:
         Dictionary with upload result
@@ -373,51 +381,22 @@ def upload_user_pfp(
         
         # Delete old PFP if exists and delete_old is True
         if delete_old and user and "photoPublicId" in user:
-            try:
-                cloudinary.uploader.destroy(user["photoPublicId"])
-            except:
-                pass  # Ignore deletion errors
+            delete_image(user["photoPublicId"], USER_PHOTO_SIZES)  # Errors are logged and ignored
         
         # Generate unique public ID
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
         public_id = f"users/{user_id}/pfp_{username}_{timestamp}"
         
-        # Upload to Cloudinary with face detection and auto-crop
-        print(f"[DB] Uploading image to Cloudinary: {len(image_data)} bytes")
+        # 500px avatar and 150px thumbnail rendered here; only they are uploaded
+        print(f"[DB] Uploading image to {get_image_storage().name}: {len(image_data)} bytes")
         print(f"[DB] Public ID: {public_id}")
         
-        upload_result = cloudinary.uploader.upload(
-            BytesIO(image_data),
-            public_id=public_id,
-            folder=f"users/{user_id}",
-            overwrite=True,
-            transformation=[
-                {"width": 500, "height": 500, "crop": "fill", "gravity": "face"},
-                {"quality": "auto:good"},
-                {"fetch_format": "auto"}
-            ]
-        )
-        
-        print(f"[DB] Cloudinary response: {upload_result}")
-        
-        # Extract URLs (original and thumbnail)
-        secure_url = upload_result.get("secure_url")
-        public_id = upload_result.get("public_id")
+        stored = get_image_storage().put(image_data, f"users/{user_id}", public_id, USER_PFP_VARIANTS)
+        secure_url = stored["url"]
+        thumbnail_url = stored["urls"]["thumbnail"]
+        public_id = stored["public_id"]
         
         print(f"[DB] Secure URL: {secure_url}")
-        print(f"[DB] Public ID from response: {public_id}")
-        
-        # Create thumbnail URL
-        thumbnail_url = cloudinary.utils.cloudinary_url(
-            public_id,
-            width=150,
-            height=150,
-            crop="fill",
-            gravity="face",
-            quality="auto:good",
-            fetch_format="auto"
-        )[0]
-        
         print(f"[DB] Thumbnail URL: {thumbnail_url}")
         
         # Update MongoDB with both URLs
@@ -427,6 +406,7 @@ def upload_user_pfp(
                 "photoProfile": secure_url,
                 "photoThumbnail": thumbnail_url,
                 "photoPublicId": public_id,
+                "photoBlurhash": stored["blurhash"],
                 "photoUpdatedAt": datetime.utcnow()
             }},
             upsert=False
@@ -439,11 +419,12 @@ def upload_user_pfp(
             "photoProfile": secure_url,
             "photoThumbnail": thumbnail_url,
             "photoPublicId": public_id,
+            "photoBlurhash": stored["blurhash"],
             "url": secure_url,
             "thumbnail": thumbnail_url,
             "public_id": public_id,
-            "format": upload_result.get("format"),
-            "size": upload_result.get("bytes")
+            "format": stored["format"],
+            "size": stored["size"]
         }
         
     except Exception as e:
@@ -455,7 +436,8 @@ def upload_user_pfp(
             "error": str(e),
             "photoProfile": None,
             "photoThumbnail": None,
-            "photoPublicId": None
+            "photoPublicId": None,
+            "photoBlurhash": None
         }
 
 def delete_user_pfp(user_id: str) -> bool:
@@ -468,10 +450,8 @@ def delete_user_pfp(user_id: str) -> bool:
         if not user or "photoPublicId" not in user:
             return False
         
-        # Delete from Cloudinary
-        result = cloudinary.uploader.destroy(user["photoPublicId"])
-        
-        if result.get("result") == "ok":
+        # Delete from the storage that holds it
+        if delete_image(user["photoPublicId"], USER_PHOTO_SIZES):
             # Remove PFP data from MongoDB
             users_collection.update_one(
                 {"_id": user_id},
@@ -479,6 +459,7 @@ def delete_user_pfp(user_id: str) -> bool:
                     "photoProfile": "",
                     "photoThumbnail": "",
                     "photoPublicId": "",
+                    "photoBlurhash": "",
                     "photoUpdatedAt": ""
                 }},
                 upsert=False
@@ -529,6 +510,14 @@ initialize_roles()
 # Scans collection for scan history
 # ---------------------------
 scans_collection = db["scans"]
+# Scanner result cache shared by workers (see ai/scan_cache.py)
+scan_cache_collection = db["scan_cache"]
+# Background scan jobs and their progress (see handlers/scan_job_handler.py)
+scan_jobs_collection = db["scan_jobs"]
+# Reference counts of the local content-addressed image store (see handlers/storage_handler.py)
+stored_images_collection = db["stored_images"]
+# Pending Cloudinary uploads of saved scans (see handlers/upload_queue_handler.py)
+scan_uploads_collection = db["scan_uploads"]
 
 def save_scan(
     user_id: str,
@@ -963,64 +952,99 @@ def get_all_scans_data():
     except Exception as e:
         return {"success": False, "error": str(e)}
     
-def save_scan(user_id, image_url, thumbnail_url, cloudinary_public_id, detection_result, analysis_result):
+def grade_scan(analysis_result):
+    """Market status and quality score from the model outputs of one scan"""
+    # 1. Kunin ang raw model outputs
+    disease_data = analysis_result.get("disease", {})
+    disease_name = disease_data.get("disease", "healthy").lower() if isinstance(disease_data, dict) else str(disease_data).lower()
+    disease_conf = disease_data.get("confidence", 0.5) if isinstance(disease_data, dict) else 0.5
+
+    color_data = analysis_result.get("color", {})
+    shape_data = analysis_result.get("shape", {})
+    size_data = analysis_result.get("size", {})
+
+    color_cls = color_data.get("color_class", "").lower()
+    shape_cls = shape_data.get("shape_class", "").lower()
+    size_cls = size_data.get("size_class", "").lower()
+
+    # Calculate Average Confidence for scaling
+    avg_f_conf = (color_data.get("confidence", 0.5) + shape_data.get("confidence", 0.5) + size_data.get("confidence", 0.5)) / 3
+
+    if disease_name in ['rot', 'mold']:
+        status = "Rejected"
+        quality_score = max(5, 50 * (1 - disease_conf))
+    elif color_cls == 'greenish' and shape_cls == 'round' and size_cls == 'large':
+        status = "Export Ready"
+        quality_score = 90 + (10 * avg_f_conf)
+    elif color_cls == 'brownish' and shape_cls == 'round' and size_cls == 'medium':
+        status = "Local Market"
+        quality_score = 70 + (19 * avg_f_conf)
+    else:
+        status = "Local Sale"
+        # ✅ DYNAMIC AVERAGE: 51-69 range base sa AI confidence
+        quality_score = 51 + (18 * avg_f_conf)
+
+    return {
+        "status": status,
+        "quality_score": round(quality_score, 1),
+        "color_classification": color_cls.capitalize(),
+        "size_classification": size_cls.capitalize(),
+        "shape_classification": shape_cls.capitalize(),
+        "disease_type": disease_name.capitalize(),
+    }
+
+def grade_fruits(fruits):
+    """Per-fruit results (ROI mode) with each fruit's status and quality score added"""
+    return [{**fruit, **grade_scan(fruit)} for fruit in fruits or []]
+
+def build_scan_document(user, image_url, thumbnail_url, cloudinary_public_id, detection_result, analysis_result, image_state="uploaded", blurhash=None):
+    """
+    Scan document for a user document, ready to insert
+
+    image_state is "uploaded" once the image is on Cloudinary, or "pending"
+    while the scanner still serves its local copy; blurhash is the image's
+    placeholder for list views
+    """
+    display_name = user.get("name") or user.get("username") or user.get("email") or "Anonymous"
+    conf = analysis_result.get("primary_confidence", 0.5)
+    grade = grade_scan(analysis_result)
+
+    return {
+        "user_id": user["_id"],
+        "username": display_name,
+        "image_url": image_url,
+        "thumbnail_url": thumbnail_url,
+        "cloudinary_public_id": cloudinary_public_id,
+        "image_state": image_state,
+        "blurhash": blurhash,
+        "variety": analysis_result.get("primary_class", "Durian"),
+        "quality_score": grade["quality_score"],
+        "confidence": round(conf * 100, 1),
+        "status": grade["status"],
+        "durian_count": analysis_result.get("total_count", 0),
+        "detection": detection_result,
+        "analysis": analysis_result,
+        "created_at": datetime.utcnow(),
+        "color_classification": grade["color_classification"],
+        "size_classification": grade["size_classification"],
+        "shape_classification": grade["shape_classification"],
+        "disease_type": grade["disease_type"],
+        # One grade per detected durian when the scan was classified per crop
+        "fruits": [
+            {"index": fruit.get("index"), "bbox": fruit.get("bbox"), **grade_scan(fruit)}
+            for fruit in analysis_result.get("fruits", [])
+        ],
+    }
+
+def save_scan(user_id, image_url, thumbnail_url, cloudinary_public_id, detection_result, analysis_result, scan_id=None, image_state="uploaded", blurhash=None):
     try:
         user_oid = ObjectId(user_id) if not isinstance(user_id, ObjectId) else user_id
         user = users_collection.find_one({"_id": user_oid})
         if not user: return None
-        
-        display_name = user.get("name") or user.get("username") or user.get("email") or "Anonymous"
-
-        # 1. Kunin ang raw model outputs
-        disease_data = analysis_result.get("disease", {})
-        disease_name = disease_data.get("disease", "healthy").lower() if isinstance(disease_data, dict) else str(disease_data).lower()
-        disease_conf = disease_data.get("confidence", 0.5) if isinstance(disease_data, dict) else 0.5
-
-        color_data = analysis_result.get("color", {})
-        shape_data = analysis_result.get("shape", {})
-        size_data = analysis_result.get("size", {})
-
-        color_cls = color_data.get("color_class", "").lower()
-        shape_cls = shape_data.get("shape_class", "").lower()
-        size_cls = size_data.get("size_class", "").lower()
-        conf = analysis_result.get("primary_confidence", 0.5)
-
-        # Calculate Average Confidence for scaling
-        avg_f_conf = (color_data.get("confidence", 0.5) + shape_data.get("confidence", 0.5) + size_data.get("confidence", 0.5)) / 3
-
-        if disease_name in ['rot', 'mold']:
-            status = "Rejected"
-            quality_score = max(5, 50 * (1 - disease_conf))
-        elif color_cls == 'greenish' and shape_cls == 'round' and size_cls == 'large':
-            status = "Export Ready"
-            quality_score = 90 + (10 * avg_f_conf)
-        elif color_cls == 'brownish' and shape_cls == 'round' and size_cls == 'medium':
-            status = "Local Market"
-            quality_score = 70 + (19 * avg_f_conf)
-        else:
-            status = "Local Sale"
-            # ✅ DYNAMIC AVERAGE: 51-69 range base sa AI confidence
-            quality_score = 51 + (18 * avg_f_conf)
 
-        scan_data = {
-            "user_id": user_oid,
-            "username": display_name,
-            "image_url": image_url,
-            "thumbnail_url": thumbnail_url,
-            "cloudinary_public_id": cloudinary_public_id,
-            "variety": analysis_result.get("primary_class", "Durian"),
-            "quality_score": round(quality_score, 1),
-            "confidence": round(conf * 100, 1),
-            "status": status,
-            "durian_count": analysis_result.get("total_count", 0),
-            "detection": detection_result,
-            "analysis": analysis_result,
-            "created_at": datetime.utcnow(),
-            "color_classification": color_cls.capitalize(),
-            "size_classification": size_cls.capitalize(),
-            "shape_classification": shape_cls.capitalize(),
-            "disease_type": disease_name.capitalize(),
-        }        
+        scan_data = build_scan_document(user, image_url, thumbnail_url, cloudinary_public_id, detection_result, analysis_result, image_state, blurhash)
+        if scan_id is not None:
+            scan_data["_id"] = scan_id
         
         result = scans_collection.insert_one(scan_data)
         if result.inserted_id:
@@ -1029,6 +1053,56 @@ def save_scan(user_id, image_url, thumbnail_url, cloudinary_public_id, detection
         return None
     except Exception as e:
         print(f"[DB] CRITICAL ERROR: {e}"); return None
+
+def save_scans_bulk(user_id, scans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Save many scans of one user with a single insert_many
+
+    Args:
+        user_id: Owner of every scan
+        scans: Dicts with the save_scan keyword arguments (minus user_id),
+            optionally with a pre-assigned "_id", an image_state and a blurhash
+
+    Returns:
+        Dict with success, inserted count and the inserted ids (also when
+        some of the scans could not be inserted)
+    """
+    docs = []
+    try:
+        if not scans:
+            return {"success": True, "inserted": 0, "ids": []}
+        user_oid = ObjectId(user_id) if not isinstance(user_id, ObjectId) else user_id
+        user = users_collection.find_one({"_id": user_oid})
+        if not user:
+            return {"success": False, "error": "User not found", "inserted": 0, "ids": []}
+
+        for scan in scans:
+            doc = build_scan_document(
+                user,
+                scan.get("image_url"),
+                scan.get("thumbnail_url"),
+                scan.get("cloudinary_public_id"),
+                scan.get("detection_result", {}),
+                scan.get("analysis_result", {}),
+                scan.get("image_state", "uploaded"),
+                scan.get("blurhash")
+            )
+            if scan.get("_id") is not None:
+                doc["_id"] = scan["_id"]
+            docs.append(doc)
+
+        result = scans_collection.insert_many(docs, ordered=False)
+        ids = [str(i) for i in result.inserted_ids]
+        return {"success": True, "inserted": len(ids), "ids": ids}
+    except BulkWriteError as e:
+        # Unordered: every document without a write error was still inserted
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        ids = [str(doc["_id"]) for index, doc in enumerate(docs) if index not in failed]
+        print(f"[DB] Bulk scan insert saved {e.details.get('nInserted', len(ids))}/{len(docs)} scans: {e}")
+        return {"success": False, "error": str(e), "inserted": e.details.get("nInserted", len(ids)), "ids": ids}
+    except Exception as e:
+        print(f"[DB] Bulk scan insert failed: {e}")
+        return {"success": False, "error": str(e), "inserted": 0, "ids": []}
         
 def get_all_posts_admin():
     """Admin helper to get all forum posts sorted by newest"""
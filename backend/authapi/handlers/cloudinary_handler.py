@@ -1,13 +1,13 @@
-import cloudinary
-import cloudinary.uploader
-import cloudinary.utils
-from io import BytesIO
-import os
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Union
+
+from PIL import Image
+
+from .derivative_handler import Derivative
+from .storage_handler import PROFILE_VARIANTS, SCAN_VARIANTS, delete_image, get_image_storage
 
 class CloudinaryPFP:
-    """Profile Picture handler for Cloudinary"""
+    """Profile Picture handler (stored through handlers/storage_handler.py)"""
     
     @staticmethod
     async def upload_profile_picture(
@@ -36,54 +36,17 @@ class CloudinaryPFP:
             timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
             public_id = f"users/{user_id}/pfp_{safe_username}_{timestamp}"
             
-            # Upload to Cloudinary with optimizations
-            upload_result = cloudinary.uploader.upload(
-                BytesIO(image_data),
-                public_id=public_id,
-                folder=f"users/{user_id}",
-                overwrite=True,
-                transformation=[
-                    {"width": 400, "height": 400, "crop": "fill", "gravity": "face"},
-                    {"quality": "auto:good"},
-                    {"fetch_format": "auto"}
-                ],
-                # Generate additional sizes
-                eager=[
-                    {"width": 150, "height": 150, "crop": "fill", "gravity": "face"},
-                    {"width": 80, "height": 80, "crop": "fill", "gravity": "face"}
-                ]
-            )
-            
-            # Get URLs
-            secure_url = upload_result.get("secure_url")
-            public_id = upload_result.get("public_id")
-            
-            # Get thumbnail URL (150x150)
-            thumbnail_url = None
-            eager_transformations = upload_result.get("eager", [])
-            for transformation in eager_transformations:
-                if transformation.get("width") == 150:
-                    thumbnail_url = transformation.get("secure_url")
-                    break
-            
-            if not thumbnail_url:
-                # Generate thumbnail URL if not in eager
-                thumbnail_url = cloudinary.utils.cloudinary_url(
-                    public_id,
-                    width=150,
-                    height=150,
-                    crop="fill",
-                    gravity="face",
-                    quality="auto:good"
-                )[0]
+            # 400px avatar plus 150px and 80px sizes
+            stored = get_image_storage().put(image_data, f"users/{user_id}", public_id, PROFILE_VARIANTS)
             
             return {
                 "success": True,
-                "photoProfile": secure_url,
-                "photoThumbnail": thumbnail_url,
-                "photoPublicId": public_id,
-                "format": upload_result.get("format"),
-                "size": upload_result.get("bytes")
+                "photoProfile": stored["url"],
+                "photoThumbnail": stored["urls"]["thumbnail"],
+                "photoPublicId": stored["public_id"],
+                "photoBlurhash": stored["blurhash"],
+                "format": stored["format"],
+                "size": stored["size"]
             }
             
         except Exception as e:
@@ -108,6 +71,7 @@ class CloudinaryPFP:
             "photoProfile": pfp_data.get("photoProfile"),
             "photoThumbnail": pfp_data.get("photoThumbnail"),
             "photoPublicId": pfp_data.get("photoPublicId"),
+            "photoBlurhash": pfp_data.get("photoBlurhash"),
             "photoUpdatedAt": datetime.utcnow()
         }
         
@@ -132,7 +96,7 @@ class CloudinaryPFP:
 
 
 class CloudinaryScan:
-    """Scan image handler for Cloudinary"""
+    """Scan image handler (stored through handlers/storage_handler.py)"""
     
     @staticmethod
     async def upload_scan_image(
@@ -156,52 +120,17 @@ class CloudinaryScan:
             timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
             public_id = f"scans/{user_id}/{scan_id}_{timestamp}"
             
-            # Upload to Cloudinary with optimizations
-            upload_result = cloudinary.uploader.upload(
-                BytesIO(image_data),
-                public_id=public_id,
-                folder=f"scans/{user_id}",
-                overwrite=True,
-                transformation=[
-                    {"width": 800, "height": 800, "crop": "limit"},
-                    {"quality": "auto:good"},
-                    {"fetch_format": "auto"}
-                ],
-                # Generate thumbnail
-                eager=[
-                    {"width": 200, "height": 200, "crop": "fill", "gravity": "center"}
-                ]
-            )
-            
-            # Get URLs
-            secure_url = upload_result.get("secure_url")
-            public_id = upload_result.get("public_id")
-            
-            # Get thumbnail URL
-            thumbnail_url = None
-            eager_transformations = upload_result.get("eager", [])
-            for transformation in eager_transformations:
-                if transformation.get("width") == 200:
-                    thumbnail_url = transformation.get("secure_url")
-                    break
-            
-            if not thumbnail_url:
-                thumbnail_url = cloudinary.utils.cloudinary_url(
-                    public_id,
-                    width=200,
-                    height=200,
-                    crop="fill",
-                    gravity="center",
-                    quality="auto:good"
-                )[0]
+            # 800px image plus 200px thumbnail
+            stored = get_image_storage().put(image_data, f"scans/{user_id}", public_id, SCAN_VARIANTS)
             
             return {
                 "success": True,
-                "image_url": secure_url,
-                "thumbnail_url": thumbnail_url,
-                "public_id": public_id,
-                "format": upload_result.get("format"),
-                "size": upload_result.get("bytes")
+                "image_url": stored["url"],
+                "thumbnail_url": stored["urls"]["thumbnail"],
+                "public_id": stored["public_id"],
+                "blurhash": stored["blurhash"],
+                "format": stored["format"],
+                "size": stored["size"]
             }
             
         except Exception as e:
@@ -215,61 +144,55 @@ class CloudinaryScan:
     
     @staticmethod
     def upload_scan_image_sync(
-        image_path: str,
+        image: Union[str, bytes],
         user_id: str,
-        scan_id: str
+        scan_id: str,
+        base_url: Optional[str] = None,
+        decoded: Optional[Image.Image] = None
     ) -> Dict[str, Any]:
         """
-        Synchronous version for uploading scan image from file path
+        Synchronous version for uploading scan image from file path or bytes
+
+        decoded is the upload already decoded upright (the scanner's working
+        image); the sizes are rendered from it instead of decoding again
         """
         try:
             timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
             public_id = f"scans/{user_id}/{scan_id}_{timestamp}"
             
-            upload_result = cloudinary.uploader.upload(
-                image_path,
-                public_id=public_id,
-                folder=f"scans/{user_id}",
-                overwrite=True,
-                transformation=[
-                    {"width": 800, "height": 800, "crop": "limit"},
-                    {"quality": "auto:good"},
-                    {"fetch_format": "auto"}
-                ],
-                eager=[
-                    {"width": 200, "height": 200, "crop": "fill", "gravity": "center"}
-                ]
-            )
-            
-            secure_url = upload_result.get("secure_url")
-            public_id = upload_result.get("public_id")
-            
-            thumbnail_url = None
-            eager_transformations = upload_result.get("eager", [])
-            for transformation in eager_transformations:
-                if transformation.get("width") == 200:
-                    thumbnail_url = transformation.get("secure_url")
-                    break
+            if not isinstance(image, (bytes, bytearray, memoryview)):
+                with open(image, "rb") as f:
+                    image = f.read()
             
-            if not thumbnail_url:
-                thumbnail_url = cloudinary.utils.cloudinary_url(
-                    public_id,
-                    width=200,
-                    height=200,
-                    crop="fill",
-                    gravity="center",
-                    quality="auto:good"
-                )[0]
+            stored = get_image_storage().put(
+                bytes(image), f"scans/{user_id}", public_id, SCAN_VARIANTS, base_url=base_url, image=decoded
+            )
+            return CloudinaryScan._scan_upload(stored)
             
+        except Exception as e:
+            print(f"Cloudinary scan upload error: {str(e)}")
             return {
-                "success": True,
-                "image_url": secure_url,
-                "thumbnail_url": thumbnail_url,
-                "public_id": public_id,
-                "format": upload_result.get("format"),
-                "size": upload_result.get("bytes")
+                "success": False,
+                "error": str(e),
+                "image_url": None,
+                "thumbnail_url": None
             }
-            
+    
+    @staticmethod
+    def upload_scan_derivatives(
+        rendered: Dict[str, Derivative],
+        user_id: str,
+        scan_id: str
+    ) -> Dict[str, Any]:
+        """
+        Upload the sizes of a scan image rendered at ingest (see
+        upload_queue_handler); same result as upload_scan_image_sync
+        """
+        try:
+            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+            public_id = f"scans/{user_id}/{scan_id}_{timestamp}"
+            stored = get_image_storage().put_rendered(rendered, f"scans/{user_id}", public_id)
+            return CloudinaryScan._scan_upload(stored)
         except Exception as e:
             print(f"Cloudinary scan upload error: {str(e)}")
             return {
@@ -279,12 +202,20 @@ class CloudinaryScan:
                 "thumbnail_url": None
             }
     
+    @staticmethod
+    def _scan_upload(stored: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "image_url": stored["url"],
+            "thumbnail_url": stored["urls"]["thumbnail"],
+            "public_id": stored["public_id"],
+            "blurhash": stored.get("blurhash"),
+            "format": stored["format"],
+            "size": stored["size"],
+            "deduplicated": stored["deduplicated"]
+        }
+    
     @staticmethod
     def delete_scan_image(public_id: str) -> bool:
-        """Delete a scan image from Cloudinary"""
-        try:
-            result = cloudinary.uploader.destroy(public_id)
-            return result.get("result") == "ok"
-        except Exception as e:
-            print(f"Error deleting scan image: {e}")
-            return False
+        """Delete a scan image from the storage that holds it"""
+        return delete_image(public_id, SCAN_VARIANTS)
@@ -0,0 +1,217 @@
+"""
+Image derivatives
+Renders the stored sizes of an upload (800px scan image, 200px thumbnail,
+400/150/80 avatars) locally with Pillow, so only these compact files are
+uploaded instead of the full photo plus remote eager transformations.
+Sizes are rendered concurrently on a small thread pool; Pillow releases the
+GIL while resizing and encoding. Avatar fill crops are anchored on the
+largest face (OpenCV's frontal face cascade), or on the most detailed part
+of the photo when there is no face, like Cloudinary's gravity "face".
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps, features
+
+from ai.ingest import decode_upload
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+IMAGE_WORKERS = max(1, int(os.getenv("IMAGE_WORKERS", "4")))
+# WebP when this Pillow build has it, JPEG otherwise
+DERIVATIVE_FORMAT = "WEBP" if features.check("webp") and os.getenv("IMAGE_DERIVATIVE_FORMAT", "webp").lower() == "webp" else "JPEG"
+DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
+
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg", "MPO": "jpg", "PNG": "png", "GIF": "gif"}
+MIMETYPES = {"webp": "image/webp", "jpg": "image/jpeg", "png": "image/png", "gif": "image/gif"}
+
+
+class Variant(NamedTuple):
+    """One stored size of an image"""
+    width: int
+    height: int
+    # "limit": fit inside width x height, never upscaled; "fill": crop to exactly width x height
+    crop: str = "limit"
+    # Anchor of a fill crop: "center", or "face" (largest face, else the most detailed region)
+    gravity: str = "center"
+
+    @property
+    def key(self) -> str:
+        return f"{self.width}x{self.height}_{self.crop}"
+
+
+class Derivative(NamedTuple):
+    """An encoded size, ready to store"""
+    key: str
+    ext: str
+    data: bytes
+
+    @property
+    def filename(self) -> str:
+        return f"{self.key}.{self.ext}"
+
+    @property
+    def mimetype(self) -> str:
+        return MIMETYPES.get(self.ext, "application/octet-stream")
+
+
+# Faces are looked for on a copy this size (long side)
+FACE_SEARCH_SIDE = 512
+# The attention fallback only needs a coarse map
+ATTENTION_SIDE = 64
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool() -> ThreadPoolExecutor:
+    """Shared pool for rendering derivatives and uploading them"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+    return _pool
+
+
+def source_image(data: bytes, variants: Dict[str, Variant]) -> Image.Image:
+    """Upright decode of an upload, only as large as the biggest variant needs"""
+    max_side = max((max(v.width, v.height) for v in variants.values()), default=None)
+    # A fill crop of a non-square photo needs more than max_side on the long edge
+    return decode_upload(data, max_side=max_side * 2 if max_side else None).image
+
+
+def derivative_filename(variant: Variant) -> str:
+    """File name render() gives this size"""
+    return f"{variant.key}.{EXTENSIONS[DERIVATIVE_FORMAT]}"
+
+
+_face_cascade = None
+_face_cascade_lock = threading.Lock()
+
+
+def _get_face_cascade():
+    """OpenCV's frontal face detector, or False when this cv2 build has none"""
+    global _face_cascade
+    if _face_cascade is None:
+        with _face_cascade_lock:
+            if _face_cascade is None:
+                _face_cascade = False
+                if cv2 is not None and hasattr(cv2, "CascadeClassifier"):
+                    cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+                    if not cascade.empty():
+                        _face_cascade = cascade
+    return _face_cascade
+
+
+def _gray(image: Image.Image, side: int) -> np.ndarray:
+    small = image.convert("L")
+    small.thumbnail((side, side), Image.BILINEAR)
+    return np.asarray(small)
+
+
+def _face_center(image: Image.Image) -> Optional[Tuple[float, float]]:
+    """Center of the largest face as fractions of the image size, or None"""
+    cascade = _get_face_cascade()
+    if not cascade:
+        return None
+    gray = _gray(image, FACE_SEARCH_SIDE)
+    min_side = max(24, min(gray.shape) // 10)
+    faces = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_side, min_side))
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+    return (x + w / 2) / gray.shape[1], (y + h / 2) / gray.shape[0]
+
+
+def _attention_center(image: Image.Image) -> Tuple[float, float]:
+    """Centroid of the gradient energy: where the detail (subject) of the photo is"""
+    gray = _gray(image, ATTENTION_SIDE).astype(np.float32)
+    energy = np.zeros_like(gray)
+    energy[:, 1:] += np.abs(np.diff(gray, axis=1))
+    energy[1:, :] += np.abs(np.diff(gray, axis=0))
+    total = energy.sum()
+    if total <= 0:
+        return 0.5, 0.5
+    rows, cols = np.indices(energy.shape)
+    return (
+        float((cols * energy).sum() / total + 0.5) / energy.shape[1],
+        float((rows * energy).sum() / total + 0.5) / energy.shape[0]
+    )
+
+
+def focus_point(image: Image.Image, gravity: str) -> Tuple[float, float]:
+    """Point a fill crop is centered on, as fractions of the image size"""
+    if gravity == "face":
+        return _face_center(image) or _attention_center(image)
+    return 0.5, 0.5
+
+
+def _centering(size: Tuple[int, int], target: Tuple[int, int], focus: Tuple[float, float]) -> Tuple[float, float]:
+    """ImageOps.fit centering that puts focus as close to the crop's middle as the frame allows"""
+    width, height = size
+    ratio = target[0] / target[1]
+    crop = (min(width, height * ratio), min(height, width / ratio))
+    return tuple(
+        min(1.0, max(0.0, (f * side - c / 2) / (side - c))) if side - c >= 1 else 0.5
+        for f, side, c in zip(focus, (width, height), crop)
+    )
+
+
+def render(image: Image.Image, variant: Variant, focus: Optional[Tuple[float, float]] = None) -> Derivative:
+    """
+    One size of an upright, decoded image
+
+    focus is the fill crop's anchor (see focus_point); computed from the
+    variant's gravity when not given
+    """
+    if variant.crop == "fill":
+        if focus is None:
+            focus = focus_point(image, variant.gravity)
+        centering = _centering(image.size, (variant.width, variant.height), focus)
+        resized = ImageOps.fit(image, (variant.width, variant.height), Image.LANCZOS, centering=centering)
+    else:
+        resized = image.copy()
+        resized.thumbnail((variant.width, variant.height), Image.LANCZOS)
+    if resized.mode not in ("RGB", "RGBA"):
+        resized = resized.convert("RGB")
+    out = BytesIO()
+    if DERIVATIVE_FORMAT == "WEBP":
+        resized.save(out, "WEBP", quality=DERIVATIVE_QUALITY, method=4)
+    else:
+        resized.convert("RGB").save(out, "JPEG", quality=DERIVATIVE_QUALITY, optimize=True, progressive=True)
+    key, ext = derivative_filename(variant).rsplit(".", 1)
+    return Derivative(key, ext, out.getvalue())
+
+
+def render_derivatives(image: Image.Image, variants: Dict[str, Variant]) -> Dict[str, Derivative]:
+    """Every requested size, rendered in parallel on the image pool"""
+    # One anchor per gravity, shared by all the sizes cropped around it
+    focus = {
+        gravity: focus_point(image, gravity)
+        for gravity in {variant.gravity for variant in variants.values() if variant.crop == "fill"}
+    }
+    if len(variants) <= 1:
+        return {name: render(image, variant, focus.get(variant.gravity)) for name, variant in variants.items()}
+    futures = {
+        name: get_image_pool().submit(render, image, variant, focus.get(variant.gravity))
+        for name, variant in variants.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def original(data: bytes) -> Derivative:
+    """The upload itself as the stored image (no size requested)"""
+    with Image.open(BytesIO(data)) as probe:
+        image_format = probe.format
+    if image_format not in EXTENSIONS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    return Derivative("original", EXTENSIONS[image_format], data)
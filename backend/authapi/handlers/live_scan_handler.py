@@ -0,0 +1,63 @@
+"""
+Live scan sessions
+Keeps the per-client tracker state of /scanner/live between frame uploads.
+Sessions hold decoded crops, so they live in this worker's memory; clients
+must keep a session on one worker (sticky routing) for its whole lifetime.
+"""
+
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from ai.live_scan import LiveScanSession
+
+# Sessions without a frame for this long are dropped
+LIVE_SESSION_IDLE_SECONDS = int(os.getenv("SCANNER_LIVE_IDLE_SECONDS", "120"))
+LIVE_MAX_SESSIONS = max(1, int(os.getenv("SCANNER_LIVE_MAX_SESSIONS", "16")))
+
+
+class LiveSessionStore:
+    """In-memory live scan sessions with an idle timeout"""
+
+    def __init__(
+        self,
+        factory: Callable[..., LiveScanSession] = LiveScanSession,
+        idle_seconds: int = LIVE_SESSION_IDLE_SECONDS,
+        max_sessions: int = LIVE_MAX_SESSIONS
+    ):
+        self.factory = factory
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, LiveScanSession] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.idle_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_active < cutoff]:
+            print(f"[LIVE] Session {session_id} expired")
+            del self._sessions[session_id]
+
+    def create(self, **options) -> Optional[str]:
+        """Start a session; returns its id, or None when this worker is full"""
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                return None
+            session_id = uuid.uuid4().hex
+            self._sessions[session_id] = self.factory(**options)
+            return session_id
+
+    def get(self, session_id: str) -> Optional[LiveScanSession]:
+        with self._lock:
+            self._expire()
+            return self._sessions.get(session_id)
+
+    def close(self, session_id: str) -> Optional[LiveScanSession]:
+        """Remove a session and return it (to read its final results)"""
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
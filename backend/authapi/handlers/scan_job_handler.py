@@ -0,0 +1,225 @@
+"""
+Background scan jobs
+Uploads are queued and processed by a small worker pool so the HTTP request
+returns immediately. Job state and per-stage progress live in a TTL-indexed
+Mongo collection; clients poll the job or stream its events over SSE.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, Optional
+
+SCAN_JOB_WORKERS = max(1, int(os.getenv("SCAN_JOB_WORKERS", "2")))
+SCAN_JOB_TTL_SECONDS = int(os.getenv("SCAN_JOB_TTL_SECONDS", "3600"))
+# Jobs queued or running in this process before new ones are refused
+SCAN_JOB_MAX_PENDING = max(1, int(os.getenv("SCAN_JOB_MAX_PENDING", "64")))
+
+# SSE streams re-read the job at least this often (jobs may run in another worker)
+STREAM_POLL_SECONDS = 1.0
+STREAM_HEARTBEAT_SECONDS = 15.0
+
+FINAL_STATES = ("done", "failed")
+
+# runner(payload, progress) -> result; progress(stage, state)
+Runner = Callable[[Dict[str, Any], Callable[[str, str], None]], Dict[str, Any]]
+
+
+def _iso(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class ScanJobQueue:
+    """Runs scan jobs on a worker pool and records their progress in Mongo"""
+
+    def __init__(
+        self,
+        collection,
+        runner: Runner,
+        workers: int = SCAN_JOB_WORKERS,
+        ttl: int = SCAN_JOB_TTL_SECONDS,
+        max_pending: int = SCAN_JOB_MAX_PENDING
+    ):
+        """
+        Args:
+            collection: Mongo collection holding job documents
+            runner: Processes one job payload and returns the scan result
+            workers: Jobs processed concurrently by this process
+            ttl: Seconds a job document is kept after creation
+            max_pending: Queued + running jobs accepted before refusing more
+        """
+        self.collection = collection
+        self.runner = runner
+        self.workers = workers
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._seq: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Notified on every local update so streams in this process wake early
+        self._changed = threading.Condition()
+        try:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            print(f"[JOBS] Could not create TTL index: {e}")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="scan-job"
+                    )
+        return self._executor
+
+    # -- state --
+
+    def _record(self, job_id: str, fields: Dict[str, Any], event: Optional[Dict[str, Any]] = None):
+        update: Dict[str, Any] = {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        if event is not None:
+            with self._lock:
+                seq = self._seq.get(job_id, 0) + 1
+                self._seq[job_id] = seq
+            update["$push"] = {"events": {"seq": seq, "at": datetime.utcnow(), **event}}
+        try:
+            self.collection.update_one({"_id": job_id}, update)
+        except Exception as e:
+            print(f"[JOBS] Could not update job {job_id}: {e}")
+        with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, payload: Dict[str, Any], user_id: Optional[str] = None, info: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Queue a job
+
+        Args:
+            payload: Passed to the runner as-is (kept in memory, not stored)
+            user_id: Owner recorded on the job document
+            info: Extra request details stored on the job document
+
+        Returns:
+            The job id, or None when this worker already has max_pending jobs
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        try:
+            self.collection.insert_one({
+                "_id": job_id,
+                "user_id": user_id,
+                "status": "queued",
+                "stages": {},
+                "events": [{"seq": 0, "at": now, "type": "status", "status": "queued"}],
+                "request_info": info or {},
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl)
+            })
+            self._get_executor().submit(self._run, job_id, payload)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id: str, payload: Dict[str, Any]):
+        start = time.perf_counter()
+        self._record(job_id, {"status": "running"}, {"type": "status", "status": "running"})
+
+        def progress(stage: str, state: str):
+            self._record(job_id, {f"stages.{stage}": state}, {"type": "stage", "stage": stage, "state": state})
+
+        try:
+            result = self.runner(payload, progress)
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+            status = "done" if result.get("success") else "failed"
+            self._record(
+                job_id,
+                {"status": status, "result": result, "elapsed_ms": elapsed_ms},
+                {"type": "status", "status": status}
+            )
+        except Exception as e:
+            print(f"❌ Scan job {job_id} failed: {e}")
+            self._record(
+                job_id,
+                {"status": "failed", "error": {"error": str(type(e).__name__), "message": str(e)}},
+                {"type": "status", "status": "failed"}
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._seq.pop(job_id, None)
+
+    # -- reading --
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job document with JSON-friendly fields, or None"""
+        doc = self.collection.find_one({"_id": job_id})
+        if doc is None:
+            return None
+        events = sorted(doc.get("events", []), key=lambda ev: ev.get("seq", 0))
+        return {
+            "job_id": doc["_id"],
+            "user_id": doc.get("user_id"),
+            "status": doc.get("status"),
+            "stages": doc.get("stages", {}),
+            "events": [{k: _iso(v) for k, v in ev.items()} for ev in events],
+            "request_info": doc.get("request_info", {}),
+            "result": doc.get("result"),
+            "error": doc.get("error"),
+            "elapsed_ms": doc.get("elapsed_ms"),
+            "created_at": _iso(doc.get("created_at")),
+            "updated_at": _iso(doc.get("updated_at")),
+            "expires_at": _iso(doc.get("expires_at"))
+        }
+
+    def stream(self, job_id: str, last_seq: int = -1) -> Iterator[str]:
+        """
+        Server-Sent Events for a job: one "status" or "stage" event per
+        recorded progress entry, then a final "result" event
+
+        Args:
+            job_id: Job to follow
+            last_seq: Resume after this event (the Last-Event-ID header)
+        """
+        last_beat = time.monotonic()
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+                return
+
+            for ev in job["events"]:
+                if ev["seq"] > last_seq:
+                    last_seq = ev["seq"]
+                    yield f"id: {ev['seq']}\nevent: {ev['type']}\ndata: {json.dumps(ev, default=str)}\n\n"
+                    last_beat = time.monotonic()
+
+            if job["status"] in FINAL_STATES:
+                final = {"job_id": job_id, "status": job["status"], "result": job["result"], "error": job["error"]}
+                yield f"event: result\ndata: {json.dumps(final, default=str)}\n\n"
+                return
+
+            if time.monotonic() - last_beat >= STREAM_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                last_beat = time.monotonic()
+
+            with self._changed:
+                self._changed.wait(STREAM_POLL_SECONDS)
+
+    @property
+    def pending(self) -> int:
+        """Jobs queued or running in this process"""
+        return self._pending
@@ -0,0 +1,319 @@
+"""
+Image storage backends
+Every image the app keeps (scan photos, profile pictures, shop images) goes
+through get_image_storage(), selected by IMAGE_STORAGE:
+
+- "cloudinary" (default): uploads to Cloudinary
+- "local": a content-addressed store on disk. Images are keyed by the
+  SHA-256 of their bytes, so repeat uploads are stored once (reference
+  counted in Mongo). Files are served by routes/media_routes.py.
+
+Either way the sizes are rendered here (handlers/derivative_handler.py) and
+only they are stored; each size is its own file or Cloudinary asset. Sized
+images also get a BlurHash placeholder (ai/blurhash.py) for list views.
+
+Public ids of local images start with "local/", so delete_image() removes
+an image from whichever backend holds it, whatever IMAGE_STORAGE is now.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import cloudinary
+import cloudinary.uploader
+from flask import has_request_context, request
+from PIL import Image
+
+from ai.blurhash import blurhash
+from .derivative_handler import (
+    Derivative, Variant, derivative_filename, get_image_pool, original, render_derivatives, source_image
+)
+
+BASE_DIR = Path(__file__).parent.parent
+
+IMAGE_STORAGE = os.getenv("IMAGE_STORAGE", "cloudinary").lower()
+STORAGE_LOCAL_DIR = Path(os.getenv("STORAGE_LOCAL_DIR", str(BASE_DIR / "uploads" / "media")))
+# Base URL local images are served from; the request's host when unset
+STORAGE_PUBLIC_URL = os.getenv("STORAGE_PUBLIC_URL", "")
+
+LOCAL_PREFIX = "local/"
+MEDIA_PATH = "/media"
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+FILE_PATTERN = re.compile(r"^[0-9a-z_]+\.(jpg|png|gif|webp)$")
+
+
+# "image" is the main size; the rest are derivatives
+SCAN_VARIANTS = {
+    "image": Variant(800, 800, "limit"),
+    "thumbnail": Variant(200, 200, "fill"),
+}
+PROFILE_VARIANTS = {
+    "image": Variant(400, 400, "fill", "face"),
+    "thumbnail": Variant(150, 150, "fill", "face"),
+    "small": Variant(80, 80, "fill", "face"),
+}
+USER_PFP_VARIANTS = {
+    "image": Variant(500, 500, "fill", "face"),
+    "thumbnail": Variant(150, 150, "fill", "face"),
+}
+
+
+class ImageStorage(ABC):
+    """
+    put() and put_rendered() store an image and return
+    {"url", "urls": {variant: url}, "public_id", "format", "size", "deduplicated"},
+    plus "blurhash" from put() (None when no sizes were requested);
+    they raise on failure. delete() returns True when the image was removed.
+    """
+
+    name = ""
+    # True when storing goes over the network (worth queueing, see upload_queue_handler)
+    remote = False
+
+    def put(
+        self,
+        data: bytes,
+        folder: Optional[str],
+        public_id: Optional[str],
+        variants: Dict[str, Variant],
+        base_url: Optional[str] = None,
+        image: Optional[Image.Image] = None
+    ) -> Dict[str, Any]:
+        """
+        Render the requested sizes and store them
+
+        Args:
+            data: Encoded image as uploaded
+            folder: Grouping of the image (Cloudinary folder)
+            public_id: Name to store it under; the local store names by content
+            variants: Sizes to keep; without any, the upload is kept unchanged
+            base_url: Host the local store's URLs point at
+            image: The upload already decoded upright, to render from
+        """
+        if not variants:
+            return {**self.put_rendered({"image": original(data)}, folder, public_id, base_url), "blurhash": None}
+        source = image if image is not None else source_image(data, variants)
+        stored = self.put_rendered(render_derivatives(source, variants), folder, public_id, base_url)
+        return {**stored, "blurhash": blurhash(source)}
+
+    @abstractmethod
+    def put_rendered(
+        self,
+        rendered: Dict[str, Derivative],
+        folder: Optional[str],
+        public_id: Optional[str],
+        base_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Store sizes rendered earlier (see put for the arguments)"""
+
+    @abstractmethod
+    def delete(self, public_id: str, variants: Iterable[str] = ()) -> bool:
+        """
+        Remove a stored image and its sizes
+
+        Args:
+            public_id: The stored image
+            variants: Names of the sizes it was stored with (e.g. the keys
+                of SCAN_VARIANTS); none for images kept unchanged
+        """
+
+
+class CloudinaryStorage(ImageStorage):
+    """One Cloudinary asset per rendered size, uploaded in parallel"""
+
+    name = "cloudinary"
+    remote = True
+
+    @staticmethod
+    def _upload(derivative: Derivative, folder: Optional[str], public_id: Optional[str]) -> Dict[str, Any]:
+        options: Dict[str, Any] = {}
+        if public_id:
+            options.update({"public_id": public_id, "folder": folder, "overwrite": True})
+        return cloudinary.uploader.upload(BytesIO(derivative.data), **options)
+
+    def put_rendered(self, rendered, folder, public_id, base_url=None):
+        asset_ids = {name: public_id if name == "image" or not public_id else f"{public_id}_{name}" for name in rendered}
+        futures = {
+            name: get_image_pool().submit(self._upload, derivative, folder, asset_ids[name])
+            for name, derivative in rendered.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
+        main = results["image"]
+        return {
+            "url": main.get("secure_url"),
+            "urls": {name: result.get("secure_url") for name, result in results.items()},
+            "public_id": main.get("public_id"),
+            "format": main.get("format"),
+            "size": sum(result.get("bytes") or 0 for result in results.values()),
+            "deduplicated": False
+        }
+
+    def delete(self, public_id, variants=()):
+        deleted = cloudinary.uploader.destroy(public_id).get("result") == "ok"
+        # Sizes other than "image" are their own <public_id>_<name> assets
+        for name in variants:
+            if name != "image":
+                cloudinary.uploader.destroy(f"{public_id}_{name}")
+        return deleted
+
+
+class LocalStorage(ImageStorage):
+    """
+    Content-addressed store: <root>/<digest[:2]>/<digest>/<size>.<ext>
+    with one reference per stored image in the refs collection
+    """
+
+    name = "local"
+
+    def __init__(self, root: Path, refs):
+        """
+        Args:
+            root: Directory the images are written under
+            refs: Mongo collection counting the references to each digest
+        """
+        self.root = Path(root)
+        self.refs = refs
+
+    def directory(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def path(self, digest: str, filename: str) -> Optional[Path]:
+        """File of a stored image, or None for names outside the store"""
+        if not DIGEST_PATTERN.match(digest) or not FILE_PATTERN.match(filename):
+            return None
+        return self.directory(digest) / filename
+
+    @staticmethod
+    def _url(digest: str, filename: str, base_url: Optional[str]) -> str:
+        if not base_url:
+            base_url = STORAGE_PUBLIC_URL or (request.host_url if has_request_context() else "")
+        return f"{base_url.rstrip('/')}{MEDIA_PATH}/{digest}/{filename}"
+
+    def put(self, data, folder, public_id, variants, base_url=None, image=None):
+        # Keyed by the upload, so a repeat upload skips the rendering too
+        digest = hashlib.sha256(data).hexdigest()
+        if not variants:
+            return {**self._store(digest, folder, {"image": original(data)}, {}, base_url), "blurhash": None}
+        directory = self.directory(digest)
+        filenames = {name: derivative_filename(variant) for name, variant in variants.items()}
+        missing = {name: v for name, v in variants.items() if not (directory / filenames[name]).exists()}
+        rendered = {}
+        if missing and image is None:
+            image = source_image(data, missing)
+        if missing:
+            rendered = render_derivatives(image, missing)
+        existing = {name: filename for name, filename in filenames.items() if name not in missing}
+        if image is not None:
+            placeholder = blurhash(image)
+        else:
+            # Everything was stored already, placeholder included (or else the smallest size will do)
+            placeholder = (self.refs.find_one({"_id": digest}, {"blurhash": 1}) or {}).get("blurhash")
+            if not placeholder:
+                smallest = min(filenames.values(), key=lambda filename: (directory / filename).stat().st_size)
+                with Image.open(directory / smallest) as stored_image:
+                    placeholder = blurhash(stored_image)
+        stored = self._store(digest, folder, rendered, existing, base_url, placeholder)
+        return {**stored, "blurhash": placeholder}
+
+    def put_rendered(self, rendered, folder, public_id, base_url=None):
+        return self._store(hashlib.sha256(rendered["image"].data).hexdigest(), folder, rendered, {}, base_url)
+
+    def _store(
+        self,
+        digest: str,
+        folder: Optional[str],
+        rendered: Dict[str, Derivative],
+        existing: Dict[str, str],
+        base_url: Optional[str],
+        placeholder: Optional[str] = None
+    ) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        fields = {"updated_at": now, **({"blurhash": placeholder} if placeholder else {})}
+        self.refs.update_one(
+            {"_id": digest},
+            {"$inc": {"refs": 1}, "$set": fields, "$setOnInsert": {"created_at": now, "folder": folder}},
+            upsert=True
+        )
+
+        directory = self.directory(digest)
+        directory.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for derivative in rendered.values():
+            path = directory / derivative.filename
+            if path.exists():
+                continue
+            # Unique per writer: the same image may be stored by two requests at once
+            partial = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.part")
+            partial.write_bytes(derivative.data)
+            os.replace(partial, path)
+            written += 1
+
+        files = {**existing, **{name: derivative.filename for name, derivative in rendered.items()}}
+        urls = {name: self._url(digest, filename, base_url) for name, filename in files.items()}
+        return {
+            "url": urls["image"],
+            "urls": urls,
+            "public_id": LOCAL_PREFIX + digest,
+            "format": files["image"].rsplit(".", 1)[-1],
+            "size": sum((directory / filename).stat().st_size for filename in files.values()),
+            "deduplicated": written == 0
+        }
+
+    def delete(self, public_id, variants=()):
+        # Every size lives in the image's own directory
+        digest = public_id[len(LOCAL_PREFIX):] if public_id.startswith(LOCAL_PREFIX) else public_id
+        if not DIGEST_PATTERN.match(digest):
+            return False
+        # Last reference: drop the record and the files; otherwise just count down
+        if self.refs.find_one_and_delete({"_id": digest, "refs": {"$lte": 1}}) is None:
+            result = self.refs.update_one({"_id": digest, "refs": {"$gt": 1}}, {"$inc": {"refs": -1}})
+            return result.modified_count > 0
+        shutil.rmtree(self.directory(digest), ignore_errors=True)
+        return True
+
+
+_cloudinary_storage: Optional[CloudinaryStorage] = None
+_local_storage: Optional[LocalStorage] = None
+
+
+def get_cloudinary_storage() -> CloudinaryStorage:
+    global _cloudinary_storage
+    if _cloudinary_storage is None:
+        _cloudinary_storage = CloudinaryStorage()
+    return _cloudinary_storage
+
+
+def get_local_storage() -> LocalStorage:
+    global _local_storage
+    if _local_storage is None:
+        from db import stored_images_collection
+        _local_storage = LocalStorage(STORAGE_LOCAL_DIR, stored_images_collection)
+    return _local_storage
+
+
+def get_image_storage() -> ImageStorage:
+    """The backend new images are written to (IMAGE_STORAGE)"""
+    if IMAGE_STORAGE == "local":
+        return get_local_storage()
+    return get_cloudinary_storage()
+
+
+def delete_image(public_id: Optional[str], variants: Iterable[str] = ()) -> bool:
+    """Delete an image, and the sizes it was stored with, from the backend that holds it"""
+    if not public_id:
+        return False
+    try:
+        if public_id.startswith(LOCAL_PREFIX):
+            return get_local_storage().delete(public_id, variants)
+        return get_cloudinary_storage().delete(public_id, variants)
+    except Exception as e:
+        print(f"Error deleting image {public_id}: {e}")
+        return False
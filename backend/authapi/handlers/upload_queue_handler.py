@@ -0,0 +1,356 @@
+"""
+Durable scan upload queue
+Scans are saved right away with image_state "pending" and local copies of
+the image sizes rendered at ingest, served by the scanner until Cloudinary
+has them. A small pool of worker threads uploads the copies with retries
+and exponential backoff, then patches the scan's image and thumbnail URLs. Upload tasks live in
+Mongo, so uploads interrupted by a restart or a Cloudinary outage resume
+once a worker claims them again.
+"""
+
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from .derivative_handler import Derivative, render_derivatives, source_image
+from .storage_handler import SCAN_VARIANTS
+
+BASE_DIR = Path(__file__).parent.parent
+
+SCAN_UPLOAD_QUEUE = os.getenv("SCAN_UPLOAD_QUEUE", "true").lower() == "true"
+SCAN_UPLOAD_DIR = Path(os.getenv("SCAN_UPLOAD_DIR", str(BASE_DIR / "uploads" / "scans")))
+SCAN_UPLOAD_WORKERS = max(1, int(os.getenv("SCAN_UPLOAD_WORKERS", "2")))
+SCAN_UPLOAD_MAX_ATTEMPTS = max(1, int(os.getenv("SCAN_UPLOAD_MAX_ATTEMPTS", "8")))
+SCAN_UPLOAD_BACKOFF_SECONDS = float(os.getenv("SCAN_UPLOAD_BACKOFF_SECONDS", "5"))
+SCAN_UPLOAD_MAX_BACKOFF_SECONDS = float(os.getenv("SCAN_UPLOAD_MAX_BACKOFF_SECONDS", "900"))
+# An "uploading" task whose lease ran out belongs to a worker that died; it is retried
+SCAN_UPLOAD_LEASE_SECONDS = int(os.getenv("SCAN_UPLOAD_LEASE_SECONDS", "120"))
+# Finished tasks are kept this long for inspection
+SCAN_UPLOAD_TTL_SECONDS = int(os.getenv("SCAN_UPLOAD_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Idle workers look for due retries at least this often
+POLL_SECONDS = 5.0
+
+STATES = ("pending", "uploading", "done", "failed", "cancelled")
+
+# uploader(sizes, user_id, scan_key) -> CloudinaryScan.upload_scan_derivatives result
+Uploader = Callable[[Dict[str, Derivative], str, str], Dict[str, Any]]
+# deleter(public_id) -> bool, for uploads whose scan was deleted meanwhile
+Deleter = Callable[[str], bool]
+
+
+class ScanUploadQueue:
+    """Uploads local scan images to Cloudinary in the background"""
+
+    def __init__(
+        self,
+        collection,
+        scans,
+        uploader: Uploader,
+        deleter: Deleter,
+        directory: Path = SCAN_UPLOAD_DIR,
+        workers: int = SCAN_UPLOAD_WORKERS,
+        max_attempts: int = SCAN_UPLOAD_MAX_ATTEMPTS,
+        backoff: float = SCAN_UPLOAD_BACKOFF_SECONDS,
+        max_backoff: float = SCAN_UPLOAD_MAX_BACKOFF_SECONDS,
+        lease: int = SCAN_UPLOAD_LEASE_SECONDS,
+        ttl: int = SCAN_UPLOAD_TTL_SECONDS
+    ):
+        """
+        Args:
+            collection: Mongo collection holding upload tasks
+            scans: The scans collection the results are written to
+            uploader: Uploads the sizes of one image; returns a dict with
+                success, image_url, thumbnail_url and public_id
+            deleter: Removes an uploaded image by public id
+            directory: Where the local copies are kept until uploaded
+            workers: Uploads running concurrently in this process
+            max_attempts: Attempts before a task is marked failed
+            backoff: Delay before the first retry, doubled on every attempt
+            max_backoff: Upper bound of the retry delay
+            lease: Seconds a claimed task stays with its worker
+            ttl: Seconds finished tasks are kept
+        """
+        self.collection = collection
+        self.scans = scans
+        self.uploader = uploader
+        self.deleter = deleter
+        self.directory = Path(directory)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.ttl = ttl
+        # Local copies only exist on this machine, so only its workers claim them
+        self.host = socket.gethostname()
+        self._threads: list = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition()
+        try:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self.collection.create_index([("host", 1), ("status", 1), ("next_attempt_at", 1)])
+        except Exception as e:
+            print(f"[UPLOADS] Could not create indexes: {e}")
+
+    # -- local copies --
+
+    def local_path(self, scan_id, name: str = "image") -> Optional[Path]:
+        """Local copy of one size of a scan image (SCAN_VARIANTS), or None"""
+        return next(iter(sorted(self.directory.glob(f"{scan_id}.{name}.*"))), None)
+
+    def store(self, scan_id, rendered: Dict[str, Derivative]):
+        """Write the local copies of a scan image (before the scan is saved)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name, derivative in rendered.items():
+            path = self.directory / f"{scan_id}.{name}.{derivative.filename}"
+            partial = path.with_suffix(".part")
+            partial.write_bytes(derivative.data)
+            os.replace(partial, path)
+
+    def load(self, scan_id) -> Dict[str, Derivative]:
+        """The stored sizes of a scan image, keyed by SCAN_VARIANTS name"""
+        rendered = {}
+        for path in self.directory.glob(f"{scan_id}.*.*.*"):
+            _, name, key, ext = path.name.split(".")
+            if ext != "part":
+                rendered[name] = Derivative(key, ext, path.read_bytes())
+        legacy = self.directory / f"{scan_id}.jpg"
+        if not rendered and legacy.exists():
+            # Queued before sizes were rendered at ingest
+            rendered = render_derivatives(source_image(legacy.read_bytes(), SCAN_VARIANTS), SCAN_VARIANTS)
+        if "image" not in rendered:
+            raise FileNotFoundError(f"No local copy of scan {scan_id}")
+        return rendered
+
+    def discard(self, scan_id):
+        """Remove the local copies that will never be uploaded"""
+        for path in self.directory.glob(f"{scan_id}.*"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[UPLOADS] Could not remove local copy {path.name}: {e}")
+
+    # -- queueing --
+
+    def enqueue(self, scan_id, user_id: str):
+        """Queue the upload of a saved scan's local copy"""
+        self.enqueue_many([scan_id], user_id)
+
+    def enqueue_many(self, scan_ids: Iterable, user_id: str):
+        now = datetime.utcnow()
+        docs = [{
+            "_id": str(scan_id),
+            "scan_id": ObjectId(str(scan_id)),
+            "user_id": str(user_id),
+            "host": self.host,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "lease_until": None,
+            "last_error": None,
+            "public_id": None,
+            "created_at": now,
+            "updated_at": now
+        } for scan_id in scan_ids]
+        if not docs:
+            return
+        self.collection.insert_many(docs, ordered=False)
+        self.start()
+        with self._wake:
+            self._wake.notify_all()
+
+    def abandon(self, scan_ids: Iterable, error):
+        """
+        Mark saved scans whose upload could not be queued as failed; like
+        scans whose upload gave up, they keep serving their local copy
+        """
+        scan_ids = list(scan_ids)
+        print(f"❌ Could not queue the upload of {len(scan_ids)} scan(s): {error}")
+        try:
+            self.scans.update_many(
+                {"_id": {"$in": [ObjectId(str(scan_id)) for scan_id in scan_ids]}, "image_state": "pending"},
+                {"$set": {"image_state": "failed"}}
+            )
+        except Exception as e:
+            print(f"[UPLOADS] Could not mark scans as failed: {e}")
+
+    def cancel(self, scan_id) -> bool:
+        """Drop the upload of a deleted scan; True when a task was cancelled"""
+        result = self.collection.update_one(
+            {"_id": str(scan_id), "status": {"$in": ["pending", "failed"]}},
+            {"$set": {"status": "cancelled", "updated_at": datetime.utcnow(),
+                      "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)}}
+        )
+        self.discard(scan_id)
+        return result.modified_count > 0
+
+    # -- workers --
+
+    def start(self):
+        """Start the worker threads (idempotent); picks up tasks left by a previous run"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"scan-upload-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"[UPLOADS] {self.workers} upload workers started on {self.host}")
+
+    def _work(self):
+        while True:
+            try:
+                task = self._claim()
+            except Exception as e:
+                print(f"[UPLOADS] Could not claim a task: {e}")
+                task = None
+            if task is None:
+                idle = self._idle_seconds()
+                with self._wake:
+                    self._wake.wait(idle)
+                continue
+            try:
+                self._process(task)
+            except Exception as e:
+                self._retry(task, str(e))
+
+    def _idle_seconds(self) -> float:
+        """Sleep until the next retry is due, at most POLL_SECONDS"""
+        try:
+            due = self.collection.find_one(
+                {"host": self.host, "status": "pending"},
+                {"next_attempt_at": 1},
+                sort=[("next_attempt_at", 1)]
+            )
+        except Exception:
+            return POLL_SECONDS
+        if due is None:
+            return POLL_SECONDS
+        wait = (due["next_attempt_at"] - datetime.utcnow()).total_seconds()
+        return min(POLL_SECONDS, max(0.05, wait))
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {
+                "host": self.host,
+                "$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "uploading", "lease_until": {"$lte": now}}
+                ]
+            },
+            {
+                "$set": {"status": "uploading", "lease_until": now + timedelta(seconds=self.lease), "updated_at": now},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _process(self, task: Dict[str, Any]):
+        scan_id = task["_id"]
+        if self.scans.count_documents({"_id": task["scan_id"]}, limit=1) == 0:
+            # Deleted before its image went out
+            self._finish(task, "cancelled")
+            self.discard(scan_id)
+            return
+
+        try:
+            rendered = self.load(scan_id)
+        except OSError as e:
+            self._fail(task, f"Local copy missing: {e}")
+            return
+
+        upload = self.uploader(rendered, task["user_id"], scan_id[-8:])
+        if not upload.get("success"):
+            self._retry(task, upload.get("error") or "Upload failed")
+            return
+
+        updated = self.scans.update_one(
+            {"_id": task["scan_id"]},
+            {"$set": {
+                "image_url": upload.get("image_url"),
+                "thumbnail_url": upload.get("thumbnail_url"),
+                "cloudinary_public_id": upload.get("public_id"),
+                "image_state": "uploaded"
+            }}
+        )
+        if updated.matched_count == 0:
+            # Deleted while uploading
+            self.deleter(upload.get("public_id"))
+        self._finish(task, "done", {"public_id": upload.get("public_id")})
+        self.discard(scan_id)
+        print(f"☁️ Scan {scan_id} uploaded after {task['attempts']} attempt(s)")
+
+    def _retry(self, task: Dict[str, Any], error: str):
+        if task["attempts"] >= self.max_attempts:
+            self._fail(task, error)
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** (task["attempts"] - 1))
+        delay *= random.uniform(0.5, 1.0)
+        print(f"⚠️ Upload of scan {task['_id']} failed (attempt {task['attempts']}), retrying in {delay:.0f}s: {error}")
+        self.collection.update_one(
+            {"_id": task["_id"]},
+            {"$set": {
+                "status": "pending",
+                "lease_until": None,
+                "last_error": error,
+                "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+                "updated_at": datetime.utcnow()
+            }}
+        )
+
+    def _fail(self, task: Dict[str, Any], error: str):
+        # The scan keeps serving its local copy
+        print(f"❌ Upload of scan {task['_id']} failed for good: {error}")
+        self._finish(task, "failed", {"last_error": error})
+        self.scans.update_one({"_id": task["scan_id"]}, {"$set": {"image_state": "failed"}})
+
+    def _finish(self, task: Dict[str, Any], status: str, fields: Optional[Dict[str, Any]] = None):
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {"_id": task["_id"]},
+            {"$set": {
+                **(fields or {}),
+                "status": status,
+                "lease_until": None,
+                "updated_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl)
+            }}
+        )
+
+    # -- reading --
+
+    def get(self, scan_id) -> Optional[Dict[str, Any]]:
+        """The upload task of a scan with JSON-friendly fields, or None"""
+        doc = self.collection.find_one({"_id": str(scan_id)})
+        if doc is None:
+            return None
+        return {
+            "scan_id": doc["_id"],
+            "status": doc.get("status"),
+            "attempts": doc.get("attempts", 0),
+            "last_error": doc.get("last_error"),
+            "next_attempt_at": doc["next_attempt_at"].isoformat() if doc.get("next_attempt_at") else None,
+            "updated_at": doc["updated_at"].isoformat() if doc.get("updated_at") else None
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """Task counts per state on this host"""
+        counts = {}
+        for state in STATES:
+            try:
+                counts[state] = self.collection.count_documents({"host": self.host, "status": state})
+            except Exception:
+                counts[state] = None
+        return {"enabled": SCAN_UPLOAD_QUEUE, "workers": len(self._threads), "host": self.host, **counts}
@@ -10,6 +10,25 @@ forum_bp = Blueprint('forum', __name__)
 # Posts Routes
 # ---------------------------
 
+def _fill_avatar_blurhashes(docs):
+    """
+    Avatar placeholders for posts saved before they were copied onto them:
+    the author's current one, when the post still shows the same photo
+    """
+    missing = [doc for doc in docs if not doc.get("user_avatar_blurhash") and doc.get("user_avatar") and doc.get("user_id")]
+    if not missing:
+        return docs
+    authors = db.users_collection.find(
+        {"_id": {"$in": list({doc["user_id"] for doc in missing})}},
+        {"photoProfile": 1, "photoBlurhash": 1}
+    )
+    hashes = {user["_id"]: user for user in authors if user.get("photoBlurhash")}
+    for doc in missing:
+        user = hashes.get(doc["user_id"])
+        if user and user.get("photoProfile") == doc["user_avatar"]:
+            doc["user_avatar_blurhash"] = user["photoBlurhash"]
+    return docs
+
 @forum_bp.route("/posts", methods=["GET", "OPTIONS"])
 def get_forum_posts():
     """Get all forum posts with optional filtering"""
@@ -39,6 +58,7 @@ def get_forum_posts():
                     .sort("created_at", -1)
                     .skip(skip)
                     .limit(limit))
+        posts = _fill_avatar_blurhashes(posts)
         
         # Helper to serialize BSON types (ObjectId, datetime) and lists
         def _serialize_doc(doc):
@@ -91,7 +111,7 @@ def get_single_post(post_id):
                     doc[k] = v.isoformat()
             return doc
 
-        post = _serialize_doc(post)
+        post = _serialize_doc(_fill_avatar_blurhashes([post])[0])
         
         return jsonify({"success": True, "post": post}), 200
         
@@ -126,6 +146,7 @@ def create_forum_post():
             "user_id": ObjectId(data["user_id"]),
             "username": user.get("name", "Anonymous"),
             "user_avatar": user.get("photoProfile", ""),
+            "user_avatar_blurhash": user.get("photoBlurhash"),
             "title": data["title"],
             "content": data["content"],
             "category": data["category"],
@@ -258,6 +279,7 @@ def create_comment():
             "user_id": ObjectId(data["user_id"]),
             "username": user.get("name", "Anonymous"),
             "user_avatar": user.get("photoProfile", ""),
+            "user_avatar_blurhash": user.get("photoBlurhash"),
             "post_id": ObjectId(data["post_id"]),
             "content": data["content"],
             "likes": 0,
@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify, send_file
+from flask_cors import cross_origin
+
+from handlers.storage_handler import get_local_storage
+
+# Create Blueprint
+media_bp = Blueprint('media', __name__)
+
+# Stored files never change: their path contains the hash of the upload
+MEDIA_MAX_AGE = 365 * 24 * 3600
+
+# ---------------------------
+# Local Image Store Routes
+# ---------------------------
+
+@media_bp.route("/<digest>/<filename>", methods=["GET"])
+@cross_origin()
+def get_media(digest, filename):
+    """A file of the local image store, with ETag, Last-Modified and Range support"""
+    path = get_local_storage().path(digest, filename)
+    if path is None or not path.is_file():
+        return jsonify({"error": "Image not found"}), 404
+    response = send_file(path, conditional=True, etag=True, max_age=MEDIA_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
@@ -3,8 +3,6 @@ from bson.objectid import ObjectId
 from auth import hash_password
 from db import users_collection, upload_user_pfp
 import datetime
-import tempfile
-import os
 
 # Create Blueprint
 profile_bp = Blueprint('profile', __name__)
@@ -28,6 +26,7 @@ def get_profile(user_id):
             "photoProfile": user.get("photoProfile", "https://via.placeholder.com/120"),
             "photoThumbnail": user.get("photoThumbnail", user.get("photoProfile", "https://via.placeholder.com/120")),
             "photoPublicId": user.get("photoPublicId", ""),
+            "photoBlurhash": user.get("photoBlurhash"),
             "createdAt": user.get("createdAt"),
             "updatedAt": user.get("updatedAt"),
             "isLoggedIn": user.get("isLoggedIn", False)
@@ -98,14 +97,8 @@ def update_profile_picture():
         
         photo_file = request.files['photo']
         
-        # Save temp file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-        photo_file.save(temp_file.name)
-        temp_file.close()
-        
-        # Read file
-        with open(temp_file.name, 'rb') as f:
-            image_data = f.read()
+        # Read straight from the upload stream
+        image_data = photo_file.read()
         
         # Upload to Cloudinary
         upload_result = upload_user_pfp(
@@ -114,9 +107,6 @@ def update_profile_picture():
             username=user.get("name", "User")
         )
         
-        # Clean up
-        os.unlink(temp_file.name)
-        
         if upload_result["success"]:
             # Update database
             users_collection.update_one(
@@ -124,7 +114,8 @@ def update_profile_picture():
                 {"$set": {
                     "photoProfile": upload_result.get("url"),
                     "photoThumbnail": upload_result.get("thumbnail"),
-                    "photoPublicId": upload_result.get("public_id")
+                    "photoPublicId": upload_result.get("public_id"),
+                    "photoBlurhash": upload_result.get("photoBlurhash")
                 }}
             )
             
@@ -133,7 +124,8 @@ def update_profile_picture():
                 "message": "Profile picture updated",
                 "photoProfile": upload_result.get("url"),
                 "photoThumbnail": upload_result.get("thumbnail"),
-                "photoPublicId": upload_result.get("public_id")
+                "photoPublicId": upload_result.get("public_id"),
+                "photoBlurhash": upload_result.get("photoBlurhash")
             }), 200
             
         return jsonify({"error": "Upload failed"}), 500
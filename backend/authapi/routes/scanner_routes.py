@@ -1,25 +1,64 @@
 # backend/authapi/routes/scanner_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, redirect, send_file, stream_with_context
 from flask_cors import cross_origin
-import tempfile
-import os
+from werkzeug.exceptions import HTTPException
 from datetime import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bson import ObjectId
+from io import BytesIO
+import json
+import os
+import time
 import uuid
+import zipfile
 
 # Use local YOLO model (your trained model)
-from ai.yolo_detector import get_yolo_detector
-from ai.durian_color import get_durian_color
-from ai.durian_desease import get_durian_disease
-from ai.durian_size import get_durian_size
-from ai.durian_shape import get_durian_shape
+# Models run in this process or in the inference service (SCANNER_INFERENCE_MODE)
+from ai.inference import get_backend, run_scan_pipeline, get_durian_disease, model_status, INFERENCE_MODE
+from ai.inference import check_quality, quality_rejection
+from ai.quality import QUALITY_GATE
+from ai.ingest import IngestError, WORKING_MAX_SIDE, probe, decode_upload
+from ai.blurhash import blurhash
+from ai.live_scan import LiveScanSession, iter_video_frames
+from ai.scan_cache import ScanCache, MongoCacheStore, SCAN_CACHE_MONGO
 from handlers.cloudinary_handler import CloudinaryScan
+from handlers.storage_handler import SCAN_VARIANTS, get_image_storage
+from handlers.derivative_handler import MIMETYPES, render_derivatives, source_image
+from handlers.scan_job_handler import ScanJobQueue
+from handlers.live_scan_handler import LiveSessionStore
+from handlers.upload_queue_handler import ScanUploadQueue, SCAN_UPLOAD_QUEUE
 from db import (
-    save_scan, get_user_scans, get_scan_by_id, delete_scan,
-    get_user_scan_stats, get_weekly_scan_data, get_quality_distribution
+    save_scan, save_scans_bulk, grade_scan, grade_fruits, get_user_scans, get_scan_by_id, delete_scan,
+    get_user_scan_stats, get_weekly_scan_data, get_quality_distribution,
+    scan_cache_collection, scan_jobs_collection, scan_uploads_collection, scans_collection
 )
 
 scanner_bp = Blueprint('scanner', __name__)
 
+# Retries and repeat scans of the same photo reuse the earlier model results
+scan_cache = ScanCache(store=MongoCacheStore(scan_cache_collection) if SCAN_CACHE_MONGO else None)
+
+# Scan images go to Cloudinary in the background; scans are saved with a local copy first
+scan_uploads = ScanUploadQueue(
+    scan_uploads_collection,
+    scans_collection,
+    CloudinaryScan.upload_scan_derivatives,
+    CloudinaryScan.delete_scan_image
+)
+
+# Multi-file endpoints get a bigger body limit than the app-wide
+# MAX_CONTENT_LENGTH; werkzeug enforces it before buffering the upload
+UPLOAD_SLACK_BYTES = 1024 * 1024  # multipart boundaries and form fields
+
+
+@scanner_bp.before_request
+def _raise_upload_limit():
+    if request.endpoint == "scanner.bulk_scan":
+        request.max_content_length = BULK_MAX_BYTES + UPLOAD_SLACK_BYTES
+    elif request.endpoint == "scanner.scan_video":
+        request.max_content_length = VIDEO_MAX_BYTES + UPLOAD_SLACK_BYTES
+
 # ---------------------------
 # Health / Test Routes
 # ---------------------------
@@ -27,36 +66,77 @@ scanner_bp = Blueprint('scanner', __name__)
 @scanner_bp.route("/health", methods=["GET"])
 @cross_origin()  # Allow CORS for GET
 def health_check():
-    detector = get_yolo_detector()
-    test_result = detector.test_connection()
+    # Liveness only: never load a model from here (see /scanner/ready)
+    detector = get_backend().detector_info(load=False)
     
     return jsonify({
         "service": "Durian Scanner API",
-        "model": str(detector.model_path.name) if detector.model_path else "Not loaded",
+        "model": detector["model"] or "Not loaded",
         "model_type": "Local YOLO (custom trained)",
-        "available": detector.available,
-        "connection_test": test_result,
+        "inference_mode": INFERENCE_MODE,
+        "available": detector["available"],
+        "connection_test": detector["connection_test"],
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+@scanner_bp.route("/ready", methods=["GET"])
+@cross_origin()
+def readiness_check():
+    """Readiness probe: 200 only once every model is loaded and warmed up"""
+    status = model_status()
+    ready = status["ready"]
+    return jsonify({
+        **status,
+        "timestamp": datetime.utcnow().isoformat()
+    }), 200 if ready else 503
+
+
+@scanner_bp.route("/diagnostics", methods=["GET"])
+@cross_origin()
+def diagnostics():
+    """Upload queue and scan cache counters; counts in Mongo, so keep it off the probes"""
+    return jsonify({
+        "upload_queue": scan_uploads.status() if SCAN_UPLOAD_QUEUE else {"enabled": False},
+        "scan_cache": scan_cache.status(),
         "timestamp": datetime.utcnow().isoformat()
     })
 
 
+# ---------------------------
+# Model Registry Routes
+# ---------------------------
+
+@scanner_bp.route("/models", methods=["GET"])
+@cross_origin()
+def list_models():
+    """Active and loaded version, size and usage of every scanner model"""
+    return jsonify({"success": True, **get_backend().registry_status()})
+
+
 @scanner_bp.route("/test", methods=["GET"])
 @cross_origin()  # Allow CORS for GET
 def test_endpoint():
     try:
-        detector = get_yolo_detector()
-        test_result = detector.test_connection()
+        detector = get_backend().detector_info(load=True)
         
         return jsonify({
             "success": True,
             "message": "Scanner API is working",
             "model_type": "Local YOLO (custom trained)",
-            "model_file": str(detector.model_path.name) if detector.model_path else "Not loaded",
-            "connection": test_result,
+            "model_file": detector["model"] or "Not loaded",
+            "connection": detector["connection_test"],
             "endpoints": {
                 "detect": "POST /scanner/detect",
+                "jobs": "POST /scanner/jobs",
+                "bulk": "POST /scanner/bulk",
+                "live": "POST /scanner/live/sessions",
+                "video": "POST /scanner/video",
                 "classify_disease": "POST /scanner/classify/disease",
                 "health": "GET /scanner/health",
+                "ready": "GET /scanner/ready",
+                "models": "GET /scanner/models",
+                "diagnostics": "GET /scanner/diagnostics",
                 "history": "GET /scanner/history/<user_id>",
                 "analytics": "GET /scanner/analytics/<user_id>"
             },
@@ -73,131 +153,798 @@ def test_endpoint():
 # Detection Routes
 # ---------------------------
 
+SCAN_CORS_HEADERS = ["Content-Type", "Authorization", "X-Requested-With", "ngrok-skip-browser-warning", "X-User-Id"]
+
+
+def _read_scan_upload():
+    """
+    Validate and read the uploaded scan image
+
+    Returns:
+        (image_bytes, request_info, None) on success, or
+        (None, None, (response, status)) when the upload is rejected
+    """
+    if 'image' not in request.files:
+        return None, None, (jsonify({"success": False, "error": "No image provided", "message": "Please upload an image file"}), 400)
+    
+    image_file = request.files['image']
+    
+    if image_file.filename == '':
+        return None, None, (jsonify({"success": False, "error": "No file selected"}), 400)
+    
+    allowed_extensions = {'jpg', 'jpeg', 'png', 'bmp', 'gif', 'webp'}
+    file_ext = image_file.filename.rsplit('.', 1)[1].lower() if '.' in image_file.filename else ''
+    if file_ext not in allowed_extensions:
+        return None, None, (jsonify({"success": False, "error": "Invalid file type", "message": f"Allowed types: {', '.join(allowed_extensions)}"}), 400)
+    
+    max_size = 10 * 1024 * 1024
+    image_file.seek(0, 2)
+    file_size = image_file.tell()
+    image_file.seek(0)
+    if file_size > max_size:
+        return None, None, (jsonify({"success": False, "error": "File too large", "message": f"Maximum file size is 10MB. Your file is {file_size/1024/1024:.1f}MB"}), 400)
+    
+    # Read straight from the upload stream; nothing is written to disk
+    image_bytes = image_file.read()
+    
+    # Dimensions come from the header; pixels are decoded later, downscaled
+    try:
+        _, (width, height) = probe(image_bytes)
+    except IngestError as e:
+        return None, None, (jsonify({"success": False, "error": "Invalid image", "message": str(e)}), 400)
+    
+    print(f"🔍 Processing image: {image_file.filename} ({file_size/1024:.1f} KB, {width}x{height})")
+    return image_bytes, {
+        "filename": image_file.filename,
+        "file_size": file_size,
+        "file_type": file_ext,
+        "width": width,
+        "height": height,
+        "timestamp": datetime.utcnow().isoformat()
+    }, None
+
+
+def _analyze_scan(image_bytes, progress=None, decoded=None):
+    """
+    Cached scan pipeline for an upload, with the cache status in result["cache"]
+
+    decoded, when given, receives the decoded ImageContext under "image_ctx"
+    (absent on cache hits) so the stored sizes are rendered without decoding again
+    """
+    # YOLO detection first; color / shape / size / disease run concurrently
+    # only when a durian was found (see SCANNER_MIN_DETECTION_CONFIDENCE).
+    # The image is decoded once and only on a cache miss.
+    # The quality gate runs before the perceptual lookup, so a dark or
+    # blurry retake is not answered with an earlier good photo's result.
+    checked = {}
+    decoded = decoded if decoded is not None else {}
+
+    def decode():
+        decoded["image_ctx"] = decode_upload(image_bytes)
+        return decoded["image_ctx"]
+
+    def gate(image_ctx):
+        checked["quality"] = check_quality(image_ctx, progress)
+        return quality_rejection(image_ctx, checked["quality"])
+
+    result, cache_status = scan_cache.get_or_compute(
+        image_bytes,
+        decode,
+        lambda image_ctx: _grade_fruits(run_scan_pipeline(image_ctx, progress=progress, quality=checked.get("quality"))),
+        gate=gate if QUALITY_GATE else None
+    )
+    result["cache"] = cache_status
+    return result
+
+
+def _grade_fruits(result):
+    """Add a market status and quality score to every fruit of an ROI scan"""
+    if result.get("fruits"):
+        result["fruits"] = grade_fruits(result["fruits"])
+    return result
+
+
+def _result_status(result):
+    """200, 422 for a photo the quality gate turned away, else 500"""
+    if result.get("success"):
+        return 200
+    return 422 if result.get("rejected") else 500
+
+
+def _is_durian_detected(result):
+    return result.get("detection", {}).get("count", 0) > 0 and not result.get("gated")
+
+
+def _analysis_for_db(result):
+    """Detector analysis with the classifier outputs merged in, as saved with a scan"""
+    # merge lightweight classification info into analysis_result
+    analysis_for_db = {**result.get("analysis", {})}
+    if result.get("color"):
+        analysis_for_db["color"] = result.get("color")
+    if result.get("size"):
+        analysis_for_db["size"] = result.get("size")
+    if result.get("shape"):
+        analysis_for_db["shape"] = result.get("shape")
+    if result.get("disease"):
+        analysis_for_db["disease"] = result.get("disease")
+    if result.get("fruits"):
+        analysis_for_db["fruits"] = result.get("fruits")
+    return analysis_for_db
+
+
+def _local_image_url(scan_id, base_url, size="image"):
+    url = f"{base_url.rstrip('/')}/scanner/images/{scan_id}"
+    return url if size == "image" else f"{url}?size={size}"
+
+
+def _store_scan_image(image_bytes, user_id, base_url, image_ctx=None):
+    """
+    Image fields for a new scan: the 800px image and 200px thumbnail are
+    rendered here (from the pipeline's decoded image when there is one),
+    then kept as local copies queued for upload to Cloudinary, or stored
+    inline when the upload queue is off (SCAN_UPLOAD_QUEUE) or images are
+    kept in the local store
+
+    Returns:
+        (scan ObjectId, dict with success, image_url, thumbnail_url,
+        public_id, blurhash and image_state, or error)
+    """
+    scan_id = ObjectId()
+    decoded = image_ctx.image if image_ctx is not None else None
+    if SCAN_UPLOAD_QUEUE and get_image_storage().remote:
+        source = decoded if decoded is not None else source_image(image_bytes, SCAN_VARIANTS)
+        scan_uploads.store(scan_id, render_derivatives(source, SCAN_VARIANTS))
+        return scan_id, {
+            "success": True,
+            "image_url": _local_image_url(scan_id, base_url),
+            "thumbnail_url": _local_image_url(scan_id, base_url, "thumbnail"),
+            "public_id": None,
+            "blurhash": blurhash(source),
+            "image_state": "pending"
+        }
+    cloudinary_data = CloudinaryScan.upload_scan_image_sync(image_bytes, user_id, str(scan_id)[-8:], base_url, decoded)
+    return scan_id, {**cloudinary_data, "image_state": "uploaded"}
+
+
+def _save_scan_result(result, image_bytes, user_id, save_to_history, base_url, image_ctx=None):
+    """Save the scan to history, queueing its image upload, when a durian was found"""
+    # ✅ GATEKEEPER LOGIC: Chinecheck natin kung may nadetect na durian
+    durian_detected = _is_durian_detected(result)
+
+    # -- Cloudinary Save if needed --
+    # ✅ UPDATED CONDITION: Idinagdag ang 'durian_detected'
+    if result.get("success") and user_id and save_to_history and durian_detected:
+        try:
+            scan_id, cloudinary_data = _store_scan_image(image_bytes, user_id, base_url, image_ctx)
+            if cloudinary_data.get("success"):
+                analysis_for_db = _analysis_for_db(result)
+
+                scan_record = save_scan(
+                    user_id=user_id,
+                    image_url=cloudinary_data.get("image_url"),
+                    thumbnail_url=cloudinary_data.get("thumbnail_url"),
+                    cloudinary_public_id=cloudinary_data.get("public_id"),
+                    detection_result=result.get("detection", {}),
+                    analysis_result=analysis_for_db,
+                    scan_id=scan_id,
+                    image_state=cloudinary_data["image_state"],
+                    blurhash=cloudinary_data.get("blurhash")
+                )
+                image_state = cloudinary_data["image_state"]
+                if scan_record and image_state == "pending":
+                    # The scan is saved either way; without a task it keeps its local copy
+                    try:
+                        scan_uploads.enqueue(scan_id, user_id)
+                    except Exception as e:
+                        scan_uploads.abandon([scan_id], e)
+                        image_state = "failed"
+                        result["upload_error"] = str(e)
+                elif not scan_record and image_state == "pending":
+                    scan_uploads.discard(scan_id)
+                if scan_record:
+                    result.update({
+                        "scan_saved": True,
+                        "scan_id": str(scan_record.get("_id")),
+                        "image_state": image_state,
+                        "cloudinary": {
+                            "image_url": cloudinary_data.get("image_url"),
+                            "thumbnail_url": cloudinary_data.get("thumbnail_url"),
+                            "blurhash": cloudinary_data.get("blurhash")
+                        }
+                    })
+            else:
+                result.update({"scan_saved": False, "cloudinary_error": cloudinary_data.get("error")})
+        except Exception as e:
+            result.update({"scan_saved": False, "save_error": str(e)})
+    else:
+        # ✅ Pag walang durian, ise-set natin ang result flags para sa frontend
+        result["scan_saved"] = False
+        if not durian_detected and not result.get("rejected"):
+            result["message"] = "No durian detected; scan not saved to history."
+    return result
+
+
 @scanner_bp.route("/detect", methods=["POST", "OPTIONS"])
-@cross_origin(origin="*", headers=["Content-Type", "Authorization", "X-Requested-With", "ngrok-skip-browser-warning", "X-User-Id"])
+@cross_origin(origin="*", headers=SCAN_CORS_HEADERS)
 def detect_durians():
     if request.method == "OPTIONS":
         return '', 200
     try:
-        # -- Image validation and temp save --
-        if 'image' not in request.files:
-            return jsonify({"success": False, "error": "No image provided", "message": "Please upload an image file"}), 400
+        # -- Image validation and read --
+        image_bytes, request_info, error = _read_scan_upload()
+        if error:
+            return error
         
-        image_file = request.files['image']
         user_id = request.form.get('user_id') or request.headers.get('X-User-Id')
         save_to_history = request.form.get('save_to_history', 'true').lower() == 'true'
         
-        if image_file.filename == '':
-            return jsonify({"success": False, "error": "No file selected"}), 400
-        
-        allowed_extensions = {'jpg', 'jpeg', 'png', 'bmp', 'gif', 'webp'}
-        file_ext = image_file.filename.rsplit('.', 1)[1].lower() if '.' in image_file.filename else ''
-        if file_ext not in allowed_extensions:
-            return jsonify({"success": False, "error": "Invalid file type", "message": f"Allowed types: {', '.join(allowed_extensions)}"}), 400
-        
-        max_size = 10 * 1024 * 1024
-        image_file.seek(0, 2)
-        file_size = image_file.tell()
-        image_file.seek(0)
-        if file_size > max_size:
-            return jsonify({"success": False, "error": "File too large", "message": f"Maximum file size is 10MB. Your file is {file_size/1024/1024:.1f}MB"}), 400
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_ext}') as tmp:
-            image_file.save(tmp.name)
-            temp_path = tmp.name
-        
-        print(f"🔍 Processing image: {image_file.filename} ({file_size/1024:.1f} KB)")
-        
-        # -- YOLO Detection --
-        detector = get_yolo_detector()
-        result = detector.predict(temp_path)
-        
-        # -- Durian Color --
-        print("[DEBUG] Calling get_durian_color with:", temp_path)
-        result["color"] = get_durian_color(temp_path)
-        
-        # -- Durian Shape --
-        print("[DEBUG] Calling get_durian_shape with:", temp_path)
-        result["shape"] = get_durian_shape(temp_path)
-        
-        # -- Durian Size --
-        result["size"] = get_durian_size(temp_path)
-
-        # -- Durian Disease (added for explicit field)
-        try:
-            disease_res = get_durian_disease(temp_path)
-            result["disease"] = disease_res
-        except Exception as e:
-            # non-critical, continue without disease data
-            result["disease"] = {"success": False, "error": str(e)}
-
-        # ✅ GATEKEEPER LOGIC: Chinecheck natin kung may nadetect na durian
-        durian_detected = result.get("detection", {}).get("count", 0) > 0
-
-        # -- Cloudinary Save if needed --
-        # ✅ UPDATED CONDITION: Idinagdag ang 'durian_detected'
-        if result.get("success") and user_id and save_to_history and durian_detected:
-            try:
-                scan_id = str(uuid.uuid4())[:8]
-                cloudinary_data = CloudinaryScan.upload_scan_image_sync(temp_path, user_id, scan_id)
-                if cloudinary_data.get("success"):
-                    # merge lightweight classification info into analysis_result
-                    analysis_for_db = {**result.get("analysis", {})}
-                    if result.get("color"):
-                        analysis_for_db["color"] = result.get("color")
-                    if result.get("size"):
-                        analysis_for_db["size"] = result.get("size")
-                    if result.get("shape"):
-                        analysis_for_db["shape"] = result.get("shape")
-                    if result.get("disease"):
-                        analysis_for_db["disease"] = result.get("disease")
-
-                    scan_record = save_scan(
-                        user_id=user_id,
-                        image_url=cloudinary_data.get("image_url"),
-                        thumbnail_url=cloudinary_data.get("thumbnail_url"),
-                        cloudinary_public_id=cloudinary_data.get("public_id"),
-                        detection_result=result.get("detection", {}),
-                        analysis_result=analysis_for_db
-                    )
-                    if scan_record:
-                        result.update({
-                            "scan_saved": True,
-                            "scan_id": str(scan_record.get("_id")),
-                            "cloudinary": {
-                                "image_url": cloudinary_data.get("image_url"),
-                                "thumbnail_url": cloudinary_data.get("thumbnail_url")
-                            }
-                        })
-                else:
-                    result.update({"scan_saved": False, "cloudinary_error": cloudinary_data.get("error")})
-            except Exception as e:
-                result.update({"scan_saved": False, "save_error": str(e)})
-        else:
-            # ✅ Pag walang durian, ise-set natin ang result flags para sa frontend
-            result["scan_saved"] = False
-            if not durian_detected:
-                result["message"] = "No durian detected; scan not saved to history."
+        decoded = {}
+        result = _analyze_scan(image_bytes, decoded=decoded)
+        _save_scan_result(result, image_bytes, user_id, save_to_history, request.host_url, decoded.get("image_ctx"))
         
-        os.unlink(temp_path)
         if result.get("success"):
-            result["request_info"] = {
-                "filename": image_file.filename,
-                "file_size": file_size,
-                "file_type": file_ext,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        return jsonify(result), 200 if result.get("success") else 500
+            result["request_info"] = request_info
+        return jsonify(result), _result_status(result)
+    except HTTPException:
+        # e.g. 413 from MAX_CONTENT_LENGTH, answered by the app's handler
+        raise
     except Exception as e:
         print(f"❌ Scanner error: {e}")
         return jsonify({"success": False, "error": str(type(e).__name__), "message": str(e), "timestamp": datetime.utcnow().isoformat()}), 500
 
+# ---------------------------
+# Bulk Scan Routes
+# ---------------------------
+
+BULK_MAX_IMAGES = int(os.getenv("SCANNER_BULK_MAX_IMAGES", "500"))
+# Images in flight at once; their classifier forwards share micro-batches
+BULK_CONCURRENCY = max(1, int(os.getenv("SCANNER_BULK_CONCURRENCY", "4")))
+BULK_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'bmp', 'gif', 'webp'}
+BULK_MAX_IMAGE_SIZE = 10 * 1024 * 1024
+# Whole request (files and archives as uploaded)
+BULK_MAX_BYTES = int(os.getenv("SCANNER_BULK_MAX_MB", "512")) * 1024 * 1024
+
+
+def _file_ext(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def _collect_bulk_images():
+    """
+    Images of a bulk request as (filename, read) pairs
+
+    Accepts any number of files under "images" (or "image") and zip
+    archives under "archive" or among the images. Uploads are closed once
+    the view returns, so their bytes are taken over here; zip members stay
+    compressed until they are read.
+
+    Returns:
+        (images, None) or (None, (response, status))
+    """
+    files = request.files.getlist('images') + request.files.getlist('image') + request.files.getlist('archive')
+    images = []
+    total_bytes = 0
+    for f in files:
+        if not f or f.filename == '':
+            continue
+        ext = _file_ext(f.filename)
+        if ext != 'zip' and ext not in BULK_IMAGE_EXTENSIONS:
+            return None, (jsonify({"success": False, "error": "Invalid file type", "message": f"{f.filename}: allowed types are {', '.join(sorted(BULK_IMAGE_EXTENSIONS))} or zip"}), 400)
+
+        data = f.read()
+        total_bytes += len(data)
+        if total_bytes > BULK_MAX_BYTES:
+            return None, (jsonify({"success": False, "error": "Upload too large", "message": f"Bulk uploads are limited to {BULK_MAX_BYTES // (1024 * 1024)}MB"}), 400)
+
+        if ext != 'zip':
+            if len(data) > BULK_MAX_IMAGE_SIZE:
+                return None, (jsonify({"success": False, "error": "File too large", "message": f"{f.filename} is larger than 10MB"}), 400)
+            images.append((f.filename, lambda data=data: data))
+            continue
+
+        try:
+            archive = zipfile.ZipFile(BytesIO(data))
+        except zipfile.BadZipFile:
+            return None, (jsonify({"success": False, "error": "Invalid archive", "message": f"{f.filename} is not a valid zip file"}), 400)
+        for info in sorted(archive.infolist(), key=lambda i: i.filename):
+            name = info.filename.rsplit('/', 1)[-1]
+            if info.is_dir() or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+            if _file_ext(name) not in BULK_IMAGE_EXTENSIONS:
+                continue
+            if info.file_size > BULK_MAX_IMAGE_SIZE:
+                return None, (jsonify({"success": False, "error": "File too large", "message": f"{info.filename} is larger than 10MB"}), 400)
+            images.append((info.filename, lambda archive=archive, info=info: archive.read(info)))
+
+    if not images:
+        return None, (jsonify({"success": False, "error": "No images provided", "message": "Upload images or a zip archive"}), 400)
+    if len(images) > BULK_MAX_IMAGES:
+        return None, (jsonify({"success": False, "error": "Too many images", "message": f"At most {BULK_MAX_IMAGES} images per request"}), 400)
+    return images, None
+
+
+def _scan_bulk_image(index, filename, read, user_id, save_to_history, base_url):
+    """Analyze one bulk image; returns its NDJSON line and the scan to save, if any"""
+    start = time.perf_counter()
+    line = {"type": "image", "index": index, "filename": filename}
+    try:
+        image_bytes = read()
+        decoded = {}
+        result = _analyze_scan(image_bytes, decoded=decoded)
+    except Exception as e:
+        line.update({"success": False, "error": str(type(e).__name__), "message": str(e)})
+        return line, None
+
+    detected = _is_durian_detected(result)
+    line.update({
+        "success": bool(result.get("success")),
+        "durian_detected": detected,
+        "cache": result.get("cache"),
+        "detection": {
+            "count": result.get("detection", {}).get("count", 0),
+            "primary": result.get("detection", {}).get("primary")
+        }
+    })
+    if not result.get("success"):
+        line.update({"error": result.get("error"), "message": result.get("message")})
+    if result.get("rejected"):
+        line.update({"rejected": True, "quality": result.get("quality")})
+    if not detected:
+        line["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return line, None
+
+    analysis = _analysis_for_db(result)
+    line.update(grade_scan(analysis))
+    for stage in ("color", "shape", "size", "disease"):
+        line[stage] = result.get(stage)
+    if result.get("fruits"):
+        line["fruits"] = [
+            {key: fruit.get(key) for key in ("index", "bbox", "confidence", "status", "quality_score")}
+            for fruit in result["fruits"]
+        ]
+
+    scan = None
+    if user_id and save_to_history:
+        scan_id, cloudinary_data = _store_scan_image(image_bytes, user_id, base_url, decoded.get("image_ctx"))
+        if cloudinary_data.get("success"):
+            scan = {
+                "_id": scan_id,
+                "image_url": cloudinary_data.get("image_url"),
+                "thumbnail_url": cloudinary_data.get("thumbnail_url"),
+                "cloudinary_public_id": cloudinary_data.get("public_id"),
+                "detection_result": result.get("detection", {}),
+                "analysis_result": analysis,
+                "image_state": cloudinary_data["image_state"],
+                "blurhash": cloudinary_data.get("blurhash")
+            }
+            line.update({"scan_id": str(scan_id), "image_url": cloudinary_data.get("image_url")})
+        else:
+            line["cloudinary_error"] = cloudinary_data.get("error")
+
+    line["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return line, scan
+
+
+def _discard_bulk_scan(future):
+    """Done callback for bulk images of an aborted stream: drop the stored image of a scan that will not be saved"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    _, scan = future.result()
+    if not scan:
+        return
+    if scan["image_state"] == "pending":
+        scan_uploads.discard(scan["_id"])
+    else:
+        CloudinaryScan.delete_scan_image(scan.get("cloudinary_public_id"))
+
+
+def _bulk_summary(lines, session_id, elapsed):
+    analyzed = [l for l in lines if l.get("success")]
+    graded = [l for l in analyzed if l.get("durian_detected")]
+    statuses = Counter(l["status"] for l in graded)
+    diseases = Counter(l["disease_type"].lower() for l in graded)
+    export_ready = statuses.get("Export Ready", 0)
+    return {
+        "type": "summary",
+        "session_id": session_id,
+        "total_images": len(lines),
+        "analyzed": len(analyzed),
+        "failed": len(lines) - len(analyzed),
+        "rejected": sum(1 for l in lines if l.get("rejected")),
+        "durians_detected": len(graded),
+        "export_ready": export_ready,
+        "export_ready_percent": round(export_ready / len(graded) * 100, 1) if graded else 0,
+        "status_counts": dict(statuses),
+        "disease_counts": dict(diseases),
+        "average_quality": round(sum(l["quality_score"] for l in graded) / len(graded), 1) if graded else 0,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "images_per_second": round(len(lines) / elapsed, 2) if elapsed > 0 else None
+    }
+
+
+@scanner_bp.route("/bulk", methods=["POST", "OPTIONS"])
+@cross_origin(origin="*", headers=SCAN_CORS_HEADERS)
+def bulk_scan():
+    """
+    Scan a crate of images (multipart files and/or zip archives)
+
+    Streams NDJSON: a "session" line, one "image" line per image as it
+    finishes, then a "summary" line. Saved scans are written with one
+    insert_many at the end; a stream cut short saves none of them.
+    """
+    if request.method == "OPTIONS":
+        return '', 200
+
+    images, error = _collect_bulk_images()
+    if error:
+        return error
+
+    user_id = request.form.get('user_id') or request.headers.get('X-User-Id')
+    save_to_history = request.form.get('save_to_history', 'true').lower() == 'true'
+    session_id = uuid.uuid4().hex
+    base_url = request.host_url
+    print(f"📦 Bulk scan {session_id}: {len(images)} images")
+
+    def generate():
+        start = time.perf_counter()
+        yield json.dumps({"type": "session", "session_id": session_id, "total_images": len(images)}) + "\n"
+
+        lines, scans = [], []
+        executor = ThreadPoolExecutor(max_workers=BULK_CONCURRENCY, thread_name_prefix="bulk-scan")
+        futures = [
+            executor.submit(_scan_bulk_image, index, filename, read, user_id, save_to_history, base_url)
+            for index, (filename, read) in enumerate(images)
+        ]
+        finished = False
+        try:
+            for future in as_completed(futures):
+                line, scan = future.result()
+                lines.append(line)
+                if scan:
+                    scans.append(scan)
+                yield json.dumps(line, default=str) + "\n"
+            finished = True
+        finally:
+            if not finished:
+                # Client went away (GeneratorExit) or an image failed: nothing is
+                # saved, so skip the queued images and drop every stored one
+                print(f"⚠️ Bulk scan {session_id} ended early after {len(lines)}/{len(images)} images")
+                for future in futures:
+                    if not future.cancel():
+                        future.add_done_callback(_discard_bulk_scan)
+            executor.shutdown(wait=finished, cancel_futures=not finished)
+
+        summary = _bulk_summary(lines, session_id, time.perf_counter() - start)
+        if scans:
+            saved = save_scans_bulk(user_id, scans)
+            summary["saved"] = saved.get("inserted", 0)
+            if not saved.get("success"):
+                summary["save_error"] = saved.get("error")
+            inserted = set(saved.get("ids", []))
+            pending = [scan["_id"] for scan in scans if scan["image_state"] == "pending" and str(scan["_id"]) in inserted]
+            for scan in scans:
+                if scan["image_state"] == "pending" and str(scan["_id"]) not in inserted:
+                    scan_uploads.discard(scan["_id"])
+            if pending:
+                try:
+                    scan_uploads.enqueue_many(pending, user_id)
+                except Exception as e:
+                    scan_uploads.abandon(pending, e)
+                    summary["upload_error"] = str(e)
+        else:
+            summary["saved"] = 0
+        yield json.dumps(summary) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ---------------------------
+# Scan Job Routes
+# ---------------------------
+
+def _run_scan_job(payload, progress):
+    """Job runner: the same work as /scanner/detect, reporting each stage"""
+    image_bytes = payload["image_bytes"]
+    decoded = {}
+    result = _analyze_scan(image_bytes, progress, decoded)
+
+    progress("save", "running")
+    _save_scan_result(result, image_bytes, payload["user_id"], payload["save_to_history"], payload["base_url"], decoded.get("image_ctx"))
+    if result.get("scan_saved"):
+        progress("save", "done")
+    elif result.get("scan_saved") is False and not ("save_error" in result or "cloudinary_error" in result):
+        progress("save", "skipped")
+    else:
+        progress("save", "failed")
+
+    if result.get("success"):
+        result["request_info"] = payload["request_info"]
+    return result
+
+
+scan_jobs = ScanJobQueue(scan_jobs_collection, _run_scan_job)
+
+
+@scanner_bp.route("/jobs", methods=["POST", "OPTIONS"])
+@cross_origin(origin="*", headers=SCAN_CORS_HEADERS)
+def create_scan_job():
+    """Queue a scan and return its job id right away (202)"""
+    if request.method == "OPTIONS":
+        return '', 200
+    try:
+        image_bytes, request_info, error = _read_scan_upload()
+        if error:
+            return error
+
+        user_id = request.form.get('user_id') or request.headers.get('X-User-Id')
+        save_to_history = request.form.get('save_to_history', 'true').lower() == 'true'
+
+        job_id = scan_jobs.submit(
+            {
+                "image_bytes": image_bytes,
+                "user_id": user_id,
+                "save_to_history": save_to_history,
+                "request_info": request_info,
+                "base_url": request.host_url
+            },
+            user_id=user_id,
+            info=request_info
+        )
+        if job_id is None:
+            return jsonify({
+                "success": False,
+                "error": "Scanner busy",
+                "message": "Too many scans in progress. Please try again shortly."
+            }), 503
+
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/scanner/jobs/{job_id}",
+            "events_url": f"/scanner/jobs/{job_id}/events"
+        }), 202
+    except HTTPException:
+        # e.g. 413 from MAX_CONTENT_LENGTH, answered by the app's handler
+        raise
+    except Exception as e:
+        print(f"❌ Scan job error: {e}")
+        return jsonify({"success": False, "error": str(type(e).__name__), "message": str(e)}), 500
+
+
+@scanner_bp.route("/jobs/<job_id>", methods=["GET"])
+@cross_origin()
+def get_scan_job(job_id):
+    """Poll a scan job: status, per-stage progress and, once done, the result"""
+    job = scan_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+
+@scanner_bp.route("/jobs/<job_id>/events", methods=["GET"])
+@cross_origin()
+def stream_scan_job(job_id):
+    """Server-Sent Events: per-stage progress, then a final "result" event"""
+    if not scan_jobs.get(job_id):
+        return jsonify({"success": False, "error": "Job not found"}), 404
+
+    try:
+        last_seq = int(request.headers.get("Last-Event-ID", "-1"))
+    except ValueError:
+        last_seq = -1
+
+    return Response(
+        stream_with_context(scan_jobs.stream(job_id, last_seq)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ---------------------------
+# Live / Video Scan Routes
+# ---------------------------
+
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'm4v', 'avi', 'webm', 'mkv'}
+VIDEO_MAX_BYTES = int(os.getenv("SCANNER_VIDEO_MAX_MB", "100")) * 1024 * 1024
+# Frames sampled from one video before the rest is ignored
+VIDEO_MAX_FRAMES = int(os.getenv("SCANNER_VIDEO_MAX_FRAMES", "600"))
+
+live_sessions = LiveSessionStore()
+
+
+def _live_session_options():
+    """Optional per-session overrides from the request body"""
+    data = request.get_json(silent=True) or request.form
+    options = {}
+    if data.get("confidence") is not None:
+        options["confidence"] = float(data["confidence"])
+    if data.get("motion_threshold") is not None:
+        options["motion_threshold"] = float(data["motion_threshold"])
+    return options
+
+
+def _live_summary(session, fruits):
+    statuses = Counter(f["status"] for f in fruits)
+    return {
+        **session.stats(),
+        "status_counts": dict(statuses),
+        "average_quality": round(sum(f["quality_score"] for f in fruits) / len(fruits), 1) if fruits else 0
+    }
+
+
+@scanner_bp.route("/live/sessions", methods=["POST", "OPTIONS"])
+@cross_origin(origin="*", headers=SCAN_CORS_HEADERS)
+def create_live_session():
+    """Start a live scan; frames are then posted to /live/sessions/<id>/frames"""
+    if request.method == "OPTIONS":
+        return '', 200
+    try:
+        options = _live_session_options()
+    except ValueError as e:
+        return jsonify({"success": False, "error": "Invalid option", "message": str(e)}), 400
+
+    session_id = live_sessions.create(**options)
+    if session_id is None:
+        return jsonify({
+            "success": False,
+            "error": "Scanner busy",
+            "message": "Too many live scans in progress. Please try again shortly."
+        }), 503
+    return jsonify({
+        "success": True,
+        "session_id": session_id,
+        "frames_url": f"/scanner/live/sessions/{session_id}/frames",
+        "finish_url": f"/scanner/live/sessions/{session_id}/finish"
+    }), 201
+
+
+@scanner_bp.route("/live/sessions/<session_id>/frames", methods=["POST", "OPTIONS"])
+@cross_origin(origin="*", headers=SCAN_CORS_HEADERS)
+def post_live_frames(session_id):
+    """
+    Feed camera frames to a live scan, in capture order
+
+    Frames come as one or more "frame" files, or as a raw image body
+    (which may be sent with chunked transfer encoding). Returns one entry
+    per frame with the tracked durians and any durians graded on it.
+    """
+    if request.method == "OPTIONS":
+        return '', 200
+
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({"success": False, "error": "Session not found"}), 404
+
+    frames = [f.read() for f in request.files.getlist('frame') if f and f.filename != '']
+    if not frames and request.mimetype.startswith('image/'):
+        frames = [request.get_data()]
+    if not frames:
+        return jsonify({"success": False, "error": "No frame provided", "message": "Upload frames as \"frame\" files or an image body"}), 400
+    if any(len(data) > BULK_MAX_IMAGE_SIZE for data in frames):
+        return jsonify({"success": False, "error": "File too large", "message": "Frames are limited to 10MB"}), 400
+
+    timestamp = request.form.get('timestamp', type=float)
+    try:
+        results = []
+        for data in frames:
+            frame = session.feed(decode_upload(data, WORKING_MAX_SIDE), timestamp)
+            frame["fruits"] = grade_fruits(frame["fruits"])
+            results.append(frame)
+            timestamp = None
+    except IngestError as e:
+        return jsonify({"success": False, "error": "Invalid image", "message": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"success": False, "error": "Live scan failed", "message": str(e)}), 409 if session.finished else 500
+    except Exception as e:
+        print(f"❌ Live scan error: {e}")
+        return jsonify({"success": False, "error": str(type(e).__name__), "message": str(e)}), 500
+
+    return jsonify({"success": True, "session_id": session_id, "frames": results, **session.stats()})
+
+
+@scanner_bp.route("/live/sessions/<session_id>", methods=["GET"])
+@cross_origin()
+def get_live_session(session_id):
+    """Frame counts, live tracks and the durians graded so far"""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({"success": False, "error": "Session not found"}), 404
+    fruits = grade_fruits(session.fruits)
+    return jsonify({
+        "success": True,
+        "session_id": session_id,
+        "tracks": [t.to_dict() for t in session.tracker.tracks],
+        "fruits": fruits,
+        "summary": _live_summary(session, fruits)
+    })
+
+
+@scanner_bp.route("/live/sessions/<session_id>/finish", methods=["POST", "OPTIONS"])
+@cross_origin(origin="*", headers=SCAN_CORS_HEADERS)
+def finish_live_session(session_id):
+    """End a live scan: grades the durians still in view and returns every grade"""
+    if request.method == "OPTIONS":
+        return '', 200
+
+    session = live_sessions.close(session_id)
+    if session is None:
+        return jsonify({"success": False, "error": "Session not found"}), 404
+    fruits = grade_fruits(session.finish())
+    return jsonify({
+        "success": True,
+        "session_id": session_id,
+        "fruits": fruits,
+        "summary": _live_summary(session, fruits)
+    })
+
+
+@scanner_bp.route("/video", methods=["POST", "OPTIONS"])
+@cross_origin(origin="*", headers=SCAN_CORS_HEADERS)
+def scan_video():
+    """
+    Scan a short video of a durian stack
+
+    Streams NDJSON: a "session" line, one "fruit" line per durian as its
+    track ends, then a "summary" line.
+    """
+    if request.method == "OPTIONS":
+        return '', 200
+
+    video = request.files.get('video')
+    if not video or video.filename == '':
+        return jsonify({"success": False, "error": "No video provided", "message": "Please upload a video file"}), 400
+    if _file_ext(video.filename) not in VIDEO_EXTENSIONS:
+        return jsonify({"success": False, "error": "Invalid file type", "message": f"Allowed types: {', '.join(sorted(VIDEO_EXTENSIONS))}"}), 400
+
+    # Uploads are closed once the view returns, so read before streaming
+    data = video.read()
+    if len(data) > VIDEO_MAX_BYTES:
+        return jsonify({"success": False, "error": "File too large", "message": f"Videos are limited to {VIDEO_MAX_BYTES // (1024 * 1024)}MB"}), 400
+
+    try:
+        options = _live_session_options()
+    except ValueError as e:
+        return jsonify({"success": False, "error": "Invalid option", "message": str(e)}), 400
+    session_id = uuid.uuid4().hex
+    print(f"🎞️ Video scan {session_id}: {video.filename} ({len(data)/1024/1024:.1f} MB)")
+
+    def generate():
+        start = time.perf_counter()
+        session = LiveScanSession(**options)
+        yield json.dumps({"type": "session", "session_id": session_id, "filename": video.filename}) + "\n"
+        try:
+            for count, (timestamp, frame) in enumerate(iter_video_frames(data)):
+                if count >= VIDEO_MAX_FRAMES:
+                    break
+                for fruit in grade_fruits(session.feed(frame, timestamp)["fruits"]):
+                    yield json.dumps({"type": "fruit", **fruit}, default=str) + "\n"
+        except Exception as e:
+            print(f"❌ Video scan error: {e}")
+            yield json.dumps({"type": "error", "error": str(type(e).__name__), "message": str(e)}) + "\n"
+
+        already = len(session.fruits)
+        fruits = grade_fruits(session.finish())
+        for fruit in fruits[already:]:
+            yield json.dumps({"type": "fruit", **fruit}, default=str) + "\n"
+        summary = _live_summary(session, fruits)
+        summary["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        yield json.dumps({"type": "summary", "session_id": session_id, **summary}) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ---------------------------
 # Disease Routes
 # ---------------------------
 
 @scanner_bp.route("/classify/disease", methods=["POST", "OPTIONS"])
-@cross_origin(origin="*", headers=["Content-Type", "Authorization", "X-Requested-With", "ngrok-skip-browser-warning", "X-User-Id"])
+@cross_origin(origin="*", headers=SCAN_CORS_HEADERS)
 def classify_disease():
     if request.method == "OPTIONS":
         return '', 200
@@ -225,14 +972,9 @@ def classify_disease():
         if file_size > max_size:
             return jsonify({"success": False, "error": "File too large"}), 400
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_ext}') as tmp:
-            image_file.save(tmp.name)
-            temp_path = tmp.name
-
-        # Run your disease model
-        result = get_durian_disease(temp_path)
-
-        os.unlink(temp_path)
+        # Decode in memory and run your disease model
+        image_ctx = decode_upload(image_file.read())
+        result = get_durian_disease(image_ctx)
 
         if not result.get("success"):
             return jsonify(result), 500
@@ -263,6 +1005,11 @@ def classify_disease():
             }
         })
 
+    except HTTPException:
+        # e.g. 413 from MAX_CONTENT_LENGTH, answered by the app's handler
+        raise
+    except IngestError as e:
+        return jsonify({"success": False, "error": "Invalid image", "message": str(e)}), 400
     except Exception as e:
         return jsonify({
             "success": False,
@@ -298,6 +1045,41 @@ def get_single_scan(scan_id):
         scan["created_at"] = scan["created_at"].isoformat()
     return jsonify({"success": True, "scan": scan})
 
+@scanner_bp.route("/images/<scan_id>", methods=["GET"])
+@cross_origin()
+def get_scan_image(scan_id):
+    """
+    The local copy of a scan image (?size=thumbnail for the thumbnail) until
+    its upload finishes, then a redirect to Cloudinary
+    """
+    size = request.args.get("size", "image")
+    if not ObjectId.is_valid(scan_id) or size not in SCAN_VARIANTS:
+        return jsonify({"success": False, "error": "Scan not found"}), 404
+    path = scan_uploads.local_path(scan_id, size)
+    if path is not None and path.is_file():
+        mimetype = MIMETYPES.get(path.suffix.lstrip("."), "image/jpeg")
+        return send_file(path, mimetype=mimetype, max_age=300, conditional=True)
+    scan = get_scan_by_id(scan_id)
+    url_field = "thumbnail_url" if size == "thumbnail" else "image_url"
+    if scan and scan.get("image_state") == "uploaded" and scan.get(url_field):
+        return redirect(scan[url_field], code=302)
+    return jsonify({"success": False, "error": "Scan image not found"}), 404
+
+@scanner_bp.route("/scan/<scan_id>/upload", methods=["GET"])
+@cross_origin()
+def get_scan_upload(scan_id):
+    """Background upload state of a scan image"""
+    scan = get_scan_by_id(scan_id)
+    if not scan:
+        return jsonify({"success": False, "error": "Scan not found"}), 404
+    return jsonify({
+        "success": True,
+        "image_state": scan.get("image_state", "uploaded"),
+        "image_url": scan.get("image_url"),
+        "thumbnail_url": scan.get("thumbnail_url"),
+        "upload": scan_uploads.get(scan_id)
+    })
+
 @scanner_bp.route("/scan/<scan_id>", methods=["DELETE"])
 @cross_origin(origin="*", headers=["X-User-Id"])
 def delete_user_scan(scan_id):
@@ -308,6 +1090,8 @@ def delete_user_scan(scan_id):
     if scan and scan.get("cloudinary_public_id"):
         CloudinaryScan.delete_scan_image(scan["cloudinary_public_id"])
     success = delete_scan(scan_id, user_id)
+    if success and scan and scan.get("image_state", "uploaded") != "uploaded":
+        scan_uploads.cancel(scan_id)
     return jsonify({"success": success, "message": "Scan deleted successfully" if success else "Could not delete scan"})
 
 @scanner_bp.route("/analytics/<user_id>", methods=["GET"])
@@ -342,6 +1126,7 @@ def get_analytics(user_id):
             "time": time_ago,
             "image_url": scan.get("image_url"),
             "thumbnail_url": scan.get("thumbnail_url"),
+            "blurhash": scan.get("blurhash"),
             "created_at": scan.get("created_at").isoformat() if scan.get("created_at") else None,
             "durian_count": scan.get("durian_count", 0),
             "confidence": scan.get("confidence", 0),
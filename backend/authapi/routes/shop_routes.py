@@ -1,8 +1,8 @@
 print("[DEBUG] shop_routes.py loaded")
 from flask import Blueprint, request, jsonify
-import cloudinary.uploader
 import os
 from db import get_db
+from handlers.storage_handler import get_image_storage
 from bson.objectid import ObjectId
 from datetime import datetime
 
@@ -20,8 +20,8 @@ def upload_image():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     try:
-        upload_result = cloudinary.uploader.upload(file)
-        url = upload_result.get('secure_url')
+        upload_result = get_image_storage().put(file.read(), None, None, {})
+        url = upload_result.get('url')
         if url:
             return jsonify({'url': url})
         else:
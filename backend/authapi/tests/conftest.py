@@ -0,0 +1,9 @@
+"""
+Run from backend/authapi after: pip install -r requirements-dev.txt
+"""
+
+import sys
+from pathlib import Path
+
+# Tests import the app modules the way app.py does (from backend/authapi)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,62 @@
+"""
+save_scans_bulk against mongomock
+"""
+
+import importlib
+
+import pymongo
+import pytest
+from bson import ObjectId
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # db.py talks to Mongo at import time
+    monkeypatch.setattr(pymongo, "MongoClient", mongomock.MongoClient)
+    return importlib.import_module("db")
+
+
+@pytest.fixture
+def collections(db, monkeypatch):
+    database = mongomock.MongoClient().durianapp
+    monkeypatch.setattr(db, "users_collection", database.users)
+    monkeypatch.setattr(db, "scans_collection", database.scans)
+    user_id = database.users.insert_one({"name": "Grower", "email": "grower@example.com"}).inserted_id
+    return database, user_id
+
+
+def _scan(scan_id=None):
+    scan = {
+        "image_url": "https://example.com/scan.webp",
+        "thumbnail_url": "https://example.com/scan_thumbnail.webp",
+        "detection_result": {"count": 1},
+        "analysis_result": {"color": {"color_class": "Greenish", "confidence": 0.9}},
+        "image_state": "pending"
+    }
+    if scan_id is not None:
+        scan["_id"] = scan_id
+    return scan
+
+
+def test_inserts_every_scan(db, collections):
+    database, user_id = collections
+    saved = db.save_scans_bulk(str(user_id), [_scan(), _scan()])
+
+    assert saved["success"] is True
+    assert saved["inserted"] == 2
+    assert database.scans.count_documents({}) == 2
+
+
+def test_partial_insert_reports_the_scans_that_were_saved(db, collections):
+    database, user_id = collections
+    taken, fresh_a, fresh_b = ObjectId(), ObjectId(), ObjectId()
+    database.scans.insert_one({"_id": taken})
+
+    saved = db.save_scans_bulk(str(user_id), [_scan(fresh_a), _scan(taken), _scan(fresh_b)])
+
+    assert saved["success"] is False
+    assert saved["inserted"] == 2
+    assert saved["ids"] == [str(fresh_a), str(fresh_b)]
+    assert database.scans.count_documents({"_id": {"$in": [fresh_a, fresh_b]}}) == 2
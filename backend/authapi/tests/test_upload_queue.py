@@ -0,0 +1,270 @@
+"""
+ScanUploadQueue against mongomock, uploading through CloudinaryScan with a
+local stand-in for the Cloudinary upload API
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+mongomock = pytest.importorskip("mongomock")
+
+import cloudinary.uploader
+from handlers import storage_handler
+from handlers.cloudinary_handler import CloudinaryScan
+from handlers.derivative_handler import Derivative
+from handlers.upload_queue_handler import ScanUploadQueue
+
+
+class FakeCloudinary:
+    """Records uploads and destroys; fails the next `failures` asset uploads"""
+
+    def __init__(self):
+        self.uploads = []
+        self.destroyed = []
+        self.failures = 0
+
+    def upload(self, file, **options):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Cloudinary unavailable")
+        public_id = options.get("public_id") or f"auto{len(self.uploads)}"
+        data = file.read()
+        self.uploads.append((public_id, data))
+        return {
+            "secure_url": f"https://res.cloudinary.test/{public_id}.webp",
+            "public_id": public_id,
+            "format": "webp",
+            "bytes": len(data)
+        }
+
+    def destroy(self, public_id, **options):
+        self.destroyed.append(public_id)
+        return {"result": "ok"}
+
+
+@pytest.fixture
+def cloud(monkeypatch):
+    fake = FakeCloudinary()
+    monkeypatch.setattr(cloudinary.uploader, "upload", fake.upload)
+    monkeypatch.setattr(cloudinary.uploader, "destroy", fake.destroy)
+    monkeypatch.setattr(storage_handler, "IMAGE_STORAGE", "cloudinary")
+    return fake
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().durian
+
+
+@pytest.fixture
+def queue(db, tmp_path, cloud):
+    # No worker threads: the tests drive _claim/_process themselves
+    return ScanUploadQueue(
+        db.scan_uploads,
+        db.scans,
+        CloudinaryScan.upload_scan_derivatives,
+        CloudinaryScan.delete_scan_image,
+        directory=tmp_path,
+        workers=0,
+        max_attempts=3,
+        backoff=10,
+        max_backoff=25,
+        lease=60
+    )
+
+
+RENDERED = {
+    "image": Derivative("800x800_limit", "webp", b"main image"),
+    "thumbnail": Derivative("200x200_fill", "webp", b"thumbnail"),
+}
+
+
+def pending_scan(db, queue, user_id="user1"):
+    """A scan saved as pending with its local copies, queued for upload"""
+    scan_id = ObjectId()
+    queue.store(scan_id, RENDERED)
+    db.scans.insert_one({"_id": scan_id, "user_id": user_id, "image_state": "pending",
+                         "image_url": "http://localhost/scanner/images/x", "thumbnail_url": None})
+    queue.enqueue(scan_id, user_id)
+    return scan_id
+
+
+def test_claim_leases_the_task_to_one_worker(db, queue):
+    scan_id = pending_scan(db, queue)
+
+    task = queue._claim()
+    assert task["_id"] == str(scan_id)
+    assert task["status"] == "uploading"
+    assert task["attempts"] == 1
+    assert task["lease_until"] > datetime.utcnow()
+    # Leased: nobody else gets it
+    assert queue._claim() is None
+
+    # The lease of a worker that died runs out and the task is claimed again
+    db.scan_uploads.update_one({"_id": task["_id"]}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+    again = queue._claim()
+    assert again["_id"] == str(scan_id)
+    assert again["attempts"] == 2
+
+
+def test_claim_skips_other_hosts(db, queue):
+    pending_scan(db, queue)
+    db.scan_uploads.update_many({}, {"$set": {"host": "another-machine"}})
+    assert queue._claim() is None
+
+
+def test_success_patches_the_scan_and_removes_local_copies(db, queue, cloud):
+    scan_id = pending_scan(db, queue)
+    assert queue.local_path(scan_id) is not None
+
+    queue._process(queue._claim())
+
+    scan = db.scans.find_one({"_id": scan_id})
+    main_id = next(public_id for public_id, data in cloud.uploads if data == b"main image")
+    assert scan["image_state"] == "uploaded"
+    assert scan["image_url"] == f"https://res.cloudinary.test/{main_id}.webp"
+    assert scan["thumbnail_url"] == f"https://res.cloudinary.test/{main_id}_thumbnail.webp"
+    assert scan["cloudinary_public_id"] == main_id
+    assert sorted(data for _, data in cloud.uploads) == [b"main image", b"thumbnail"]
+
+    task = db.scan_uploads.find_one({"_id": str(scan_id)})
+    assert task["status"] == "done"
+    assert task["public_id"] == main_id
+    assert task["expires_at"] > datetime.utcnow()
+    assert queue.local_path(scan_id) is None
+
+
+def test_failed_upload_is_retried_with_backoff(db, queue, cloud):
+    scan_id = pending_scan(db, queue)
+    cloud.failures = 1
+
+    before = datetime.utcnow()
+    queue._process(queue._claim())
+    task = db.scan_uploads.find_one({"_id": str(scan_id)})
+    assert task["status"] == "pending"
+    assert task["lease_until"] is None
+    assert "Cloudinary unavailable" in task["last_error"]
+    # backoff * 2**0, with jitter
+    delay = (task["next_attempt_at"] - before).total_seconds()
+    assert 5 <= delay <= 10.5
+    # Not due yet
+    assert queue._claim() is None
+
+    db.scan_uploads.update_one({"_id": str(scan_id)}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+    cloud.failures = 1
+    before = datetime.utcnow()
+    queue._process(queue._claim())
+    task = db.scan_uploads.find_one({"_id": str(scan_id)})
+    # backoff * 2**1, with jitter
+    delay = (task["next_attempt_at"] - before).total_seconds()
+    assert 10 <= delay <= 20.5
+    assert db.scans.find_one({"_id": scan_id})["image_state"] == "pending"
+
+    db.scan_uploads.update_one({"_id": str(scan_id)}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+    queue._process(queue._claim())
+    assert db.scan_uploads.find_one({"_id": str(scan_id)})["status"] == "done"
+    assert db.scans.find_one({"_id": scan_id})["image_state"] == "uploaded"
+
+
+def test_backoff_is_capped(db, queue):
+    scan_id = pending_scan(db, queue)
+    task = {"_id": str(scan_id), "scan_id": scan_id, "attempts": 2}
+    queue.backoff, queue.max_backoff, queue.max_attempts = 100, 30, 10
+
+    before = datetime.utcnow()
+    queue._retry(task, "boom")
+    delay = (db.scan_uploads.find_one({"_id": str(scan_id)})["next_attempt_at"] - before).total_seconds()
+    assert 15 <= delay <= 30.5
+
+
+def test_last_attempt_fails_the_scan(db, queue, cloud):
+    scan_id = pending_scan(db, queue)
+    cloud.failures = 99
+    queue.max_attempts = 1
+
+    queue._process(queue._claim())
+
+    task = db.scan_uploads.find_one({"_id": str(scan_id)})
+    assert task["status"] == "failed"
+    assert "Cloudinary unavailable" in task["last_error"]
+    assert db.scans.find_one({"_id": scan_id})["image_state"] == "failed"
+    # The scan keeps serving its local copy
+    assert queue.local_path(scan_id) is not None
+    assert queue._claim() is None
+
+
+def test_missing_local_copy_fails_without_uploading(db, queue, cloud):
+    scan_id = pending_scan(db, queue)
+    queue.discard(scan_id)
+
+    queue._process(queue._claim())
+
+    assert db.scan_uploads.find_one({"_id": str(scan_id)})["status"] == "failed"
+    assert db.scans.find_one({"_id": scan_id})["image_state"] == "failed"
+    assert cloud.uploads == []
+
+
+def test_cancel_drops_the_task_and_local_copies(db, queue, cloud):
+    scan_id = pending_scan(db, queue)
+
+    assert queue.cancel(scan_id) is True
+    assert db.scan_uploads.find_one({"_id": str(scan_id)})["status"] == "cancelled"
+    assert list(queue.directory.glob(f"{scan_id}.*")) == []
+    assert queue._claim() is None
+    assert cloud.uploads == []
+    # Nothing left to cancel
+    assert queue.cancel(scan_id) is False
+
+
+def test_scan_deleted_before_upload_is_cancelled(db, queue, cloud):
+    scan_id = pending_scan(db, queue)
+    db.scans.delete_one({"_id": scan_id})
+
+    queue._process(queue._claim())
+
+    assert db.scan_uploads.find_one({"_id": str(scan_id)})["status"] == "cancelled"
+    assert list(queue.directory.glob(f"{scan_id}.*")) == []
+    assert cloud.uploads == []
+
+
+def test_scan_deleted_while_uploading_removes_the_upload(db, queue, cloud):
+    scan_id = pending_scan(db, queue)
+    task = queue._claim()
+    upload = queue.uploader
+
+    def upload_then_delete(rendered, user_id, key):
+        result = upload(rendered, user_id, key)
+        db.scans.delete_one({"_id": scan_id})
+        return result
+
+    queue.uploader = upload_then_delete
+    queue._process(task)
+
+    main_id = db.scan_uploads.find_one({"_id": str(scan_id)})["public_id"]
+    assert main_id in cloud.destroyed
+    assert f"{main_id}_thumbnail" in cloud.destroyed
+
+
+def test_discard_removes_every_size(queue):
+    scan_id = ObjectId()
+    queue.store(scan_id, RENDERED)
+    other = ObjectId()
+    queue.store(other, RENDERED)
+
+    queue.discard(scan_id)
+
+    assert list(queue.directory.glob(f"{scan_id}.*")) == []
+    assert set(queue.load(other)) == {"image", "thumbnail"}
+
+
+def test_abandon_marks_pending_scans_failed(db, queue):
+    scan_id = pending_scan(db, queue)
+    uploaded = ObjectId()
+    db.scans.insert_one({"_id": uploaded, "image_state": "uploaded"})
+
+    queue.abandon([scan_id, uploaded], "queue unavailable")
+
+    assert db.scans.find_one({"_id": scan_id})["image_state"] == "failed"
+    assert db.scans.find_one({"_id": uploaded})["image_state"] == "uploaded"
@@ -0,0 +1,135 @@
+"""
+YOLODetector.predict with a stand-in for the ultralytics model: it "detects"
+the solid red squares drawn on a frame, missing those too small to see at
+the inference resolution
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+cv2 = pytest.importorskip("cv2")
+
+from ai.image_context import ImageContext
+from ai.tiling import TILE_THRESHOLD
+from ai.yolo_detector import YOLODetector
+
+# Fruits are pure red; anything narrower than this after resizing to imgsz is missed
+MIN_VISIBLE_PX = 8
+
+
+class _Tensor(np.ndarray):
+    """numpy array answering the torch calls the detector makes"""
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, width, height):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4).view(_Tensor)
+        self.conf = np.asarray(conf, dtype=np.float32).view(_Tensor)
+        self.cls = np.zeros(len(self.conf), dtype=np.float32).view(_Tensor)
+        centre = (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+        size = self.xyxy[:, 2:] - self.xyxy[:, :2]
+        self.xywhn = (np.concatenate([centre, size], axis=1) / [width, height, width, height]).view(_Tensor)
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            box = _Boxes.__new__(_Boxes)
+            box.xyxy, box.conf, box.cls, box.xywhn = self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1], self.xywhn[i:i + 1]
+            yield box
+
+
+class _Result:
+    names = {0: "durian"}
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class FakeYOLO:
+    def __init__(self):
+        self.calls = []
+
+    def _detect(self, frame, imgsz):
+        height, width = frame.shape[:2]
+        scale = imgsz / max(width, height)
+        red = (frame[:, :, 2] == 255) & (frame[:, :, 1] == 0) & (frame[:, :, 0] == 0)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(red.astype(np.uint8))
+        xyxy, conf = [], []
+        for x, y, w, h, _ in stats[1:]:
+            if min(w, h) * scale < MIN_VISIBLE_PX:
+                continue
+            xyxy.append([x, y, x + w, y + h])
+            # Large fruits are the confident ones
+            conf.append(0.9 if w * h > 0.05 * width * height else 0.7)
+        return _Result(_Boxes(xyxy, conf, width, height))
+
+    def predict(self, source, conf, imgsz, save, verbose):
+        frames = source if isinstance(source, list) else [source]
+        self.calls.append((len(frames), imgsz))
+        return [self._detect(frame, imgsz) for frame in frames]
+
+
+class FakePool:
+    def __init__(self, model):
+        self.model = model
+
+    @contextmanager
+    def acquire(self):
+        yield self.model
+
+
+def _detector(model):
+    detector = YOLODetector.__new__(YOLODetector)
+    detector.model = model
+    detector.available = True
+    detector.model_path = Path("durian_detector_test.pt")
+    detector.image_size = 640
+    detector.version = "test"
+    detector.cascade_sizes = [320]
+    detector._pool = FakePool(model)
+    return detector
+
+
+def _crate_photo(side):
+    """One large fruit in the middle and six small ones around it"""
+    frame = np.full((side, side, 3), 90, dtype=np.uint8)
+    frame[side // 3:side * 2 // 3, side // 3:side * 2 // 3] = (255, 0, 0)
+    small = side // 40
+    for i in range(6):
+        x = side // 10 + i * side // 7
+        frame[side // 12:side // 12 + small, x:x + small] = (255, 0, 0)
+    return ImageContext(Image.fromarray(frame))
+
+
+def test_close_up_is_accepted_by_the_cascade():
+    model = FakeYOLO()
+    result = _detector(model).predict(_crate_photo(800), cascade=True)
+
+    assert result["success"]
+    assert result["cascade"]["level"] == "320"
+    assert model.calls == [(1, 320)]
+
+
+def test_large_photo_is_tiled_even_with_a_confident_primary_fruit():
+    model = FakeYOLO()
+    image = _crate_photo(TILE_THRESHOLD + 480)
+    result = _detector(model).predict(image, cascade=True)
+
+    assert result["success"]
+    assert "tiling" in result
+    assert result["cascade"]["levels_run"] == ["tiled"]
+    assert all(imgsz == 640 for _, imgsz in model.calls)
+    assert result["detection"]["primary"]["confidence"] == pytest.approx(0.9)
+    assert result["detection"]["count"] == 7
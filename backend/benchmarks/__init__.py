@@ -0,0 +1,18 @@
+"""
+End-to-end scanner benchmarks
+Per-stage latency (decode, YOLO, classifiers, Cloudinary, Mongo), /scanner/detect
+latency percentiles and throughput at several concurrency levels, and peak
+RSS. Run from backend/:
+
+    python -m benchmarks --images path/to/photos --output bench.json
+
+See benchmarks/__main__.py for the options.
+"""
+
+import sys
+from pathlib import Path
+
+# Make the authapi package importable (ai.*, db, app)
+AUTHAPI_DIR = Path(__file__).parent.parent / "authapi"
+if str(AUTHAPI_DIR) not in sys.path:
+    sys.path.insert(0, str(AUTHAPI_DIR))
@@ -0,0 +1,189 @@
+"""
+Scanner benchmark runner
+
+Usage (from backend/):
+    python -m benchmarks --images path/to/photos
+    python -m benchmarks --images path/to/photos --concurrency 1 4 8 --requests 200 --output bench.json
+    python -m benchmarks --images path/to/photos --compare bench_main.json --output bench_branch.json
+    python -m benchmarks --images path/to/photos --url http://localhost:5000 --pid 4242
+
+By default Cloudinary and Mongo are replaced with local stand-ins
+(--cloudinary real / --mongo real use the configured services and clean up
+after themselves; --storage local uses the on-disk image store instead) and the scan cache is disabled so every request runs the
+models. Set SCANNER_INFERENCE_MODE=remote to measure through the inference
+service; pass its pid with --pid to include its peak RSS.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .corpus import load_corpus
+from .metrics import RssSampler, peak_rss_mb
+from .standins import use_local_cloudinary, use_local_mongo
+
+# Recorded with every run so results are only compared like for like
+ENV_PREFIXES = ("SCANNER_", "SCAN_CACHE_", "SCAN_UPLOAD_", "IMAGE_STORAGE", "STORAGE_", "DURIAN_", "MODEL_")
+
+
+def _git_revision() -> Dict[str, Any]:
+    repo = Path(__file__).parent.parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repo, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo, capture_output=True, text=True
+        ).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in sorted(os.environ.items()) if k.startswith(ENV_PREFIXES)},
+    }
+
+
+def _delta(old: Optional[float], new: Optional[float]) -> str:
+    if old is None or new is None:
+        return "n/a"
+    change = (new - old) / old * 100 if old else 0.0
+    return f"{old:>9.1f} -> {new:>9.1f}  ({change:+.1f}%)"
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]):
+    """Print the latency and throughput changes between two reports"""
+    print(f"\n📊 {(old['git'].get('commit') or '?')[:10]} -> {(new['git'].get('commit') or '?')[:10]}")
+    old_stages = old.get("stages", {}).get("stages", {})
+    for stage, stats in new.get("stages", {}).get("stages", {}).items():
+        before = old_stages.get(stage, {})
+        print(f"  {stage:<15} p50 {_delta(before.get('p50_ms'), stats.get('p50_ms'))}"
+              f"   p95 {_delta(before.get('p95_ms'), stats.get('p95_ms'))}")
+
+    old_load = {run["concurrency"]: run for run in old.get("load", [])}
+    for run in new.get("load", []):
+        before = old_load.get(run["concurrency"])
+        if before is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            print(f"  detect c={run['concurrency']:<3} {key:<7} {_delta(before['latency'].get(key), run['latency'].get(key))}")
+        print(f"  detect c={run['concurrency']:<3} img/s   {_delta(before['throughput_ips'], run['throughput_ips'])}")
+
+    print(f"  peak RSS MB       {_delta(old.get('peak_rss_mb'), new.get('peak_rss_mb'))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the durian scanner end to end")
+    parser.add_argument("--images", required=True, type=Path, help="Folder (or file) of corpus images")
+    parser.add_argument("--max-images", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=1, help="Passes over the corpus for per-stage timing")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed images/requests before each phase")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4],
+                        help="Client thread counts for the /scanner/detect load runs")
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per concurrency level")
+    parser.add_argument("--url", help="Benchmark a running server (e.g. http://localhost:5000) instead of the app in-process")
+    parser.add_argument("--pid", type=int, nargs="*", default=[],
+                        help="Other processes (server, inference service) whose peak RSS to sample")
+    parser.add_argument("--cloudinary", choices=("local", "real"), default="local")
+    parser.add_argument("--storage", choices=("cloudinary", "local"), default="cloudinary",
+                        help="Image storage backend (IMAGE_STORAGE); local writes to a temporary store")
+    parser.add_argument("--mongo", choices=("local", "real"), default="local")
+    parser.add_argument("--upload-latency-ms", type=float, default=0.0,
+                        help="Simulated round trip for the local Cloudinary stand-in")
+    parser.add_argument("--no-save", action="store_true", help="Skip the Cloudinary and Mongo stages")
+    parser.add_argument("--cache", action="store_true", help="Keep the scan cache enabled")
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--output", type=Path, help="Write the report as JSON")
+    parser.add_argument("--compare", type=Path, help="Earlier report to diff this run against")
+    args = parser.parse_args()
+
+    # Must be in place before the app and db modules are imported
+    if not args.cache:
+        os.environ["SCAN_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("SCANNER_PRELOAD", "false")
+    os.environ["IMAGE_STORAGE"] = args.storage
+    if args.storage == "local":
+        os.environ["STORAGE_LOCAL_DIR"] = tempfile.mkdtemp(prefix="durian-store-")
+    if args.cloudinary == "local":
+        use_local_cloudinary(Path(tempfile.mkdtemp(prefix="durian-bench-")), args.upload_latency_ms)
+    if args.mongo == "local":
+        use_local_mongo()
+
+    from .load import benchmark_load, http_sender, in_process_sender
+    from .stages import benchmark_stages, cleanup_benchmark_user, create_benchmark_user
+
+    corpus = load_corpus(args.images, args.max_images)
+    print(f"🖼️ Corpus: {len(corpus)} images from {args.images}")
+
+    # Against a remote server the benchmark user has to exist in its database
+    in_process_db = args.url is None or args.mongo == "real"
+    user_id = create_benchmark_user() if not args.no_save and in_process_db else None
+
+    report: Dict[str, Any] = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git": _git_revision(),
+        "environment": _environment(),
+        "options": {
+            "images": str(args.images),
+            "corpus_size": len(corpus),
+            "target": args.url or "in-process",
+            "inference_mode": os.getenv("SCANNER_INFERENCE_MODE", "local"),
+            "cloudinary": args.cloudinary,
+            "storage": args.storage,
+            "mongo": args.mongo,
+            "save": user_id is not None,
+            "scan_cache": args.cache,
+        },
+    }
+
+    try:
+        with RssSampler(args.pid) as sampler:
+            if not args.skip_stages:
+                print("⏱️ Per-stage latency...")
+                report["stages"] = benchmark_stages(corpus, args.repeats, args.warmup, user_id)
+                report["stages"]["peak_rss_mb"] = peak_rss_mb()
+
+            if not args.skip_load:
+                send = http_sender(args.url, user_id) if args.url else in_process_sender(user_id)
+                report["load"] = []
+                for concurrency in args.concurrency:
+                    print(f"🚀 /scanner/detect at concurrency {concurrency}...")
+                    report["load"].append(benchmark_load(send, corpus, concurrency, args.requests, args.warmup))
+        report["peak_rss_mb"] = peak_rss_mb()
+        if args.pid:
+            report["process_peak_rss_mb"] = sampler.report()
+    finally:
+        if user_id is not None:
+            removed = cleanup_benchmark_user(user_id)
+            print(f"🧹 Removed the benchmark user and {removed} scans")
+
+    for stage, stats in report.get("stages", {}).get("stages", {}).items():
+        print(f"  {stage:<15} p50 {stats.get('p50_ms', 0):>8.1f} ms   p95 {stats.get('p95_ms', 0):>8.1f} ms   errors {stats['errors']}")
+    for run in report.get("load", []):
+        lat = run["latency"]
+        print(f"  detect c={run['concurrency']:<3} p50 {lat.get('p50_ms', 0):>8.1f}  p95 {lat.get('p95_ms', 0):>8.1f}"
+              f"  p99 {lat.get('p99_ms', 0):>8.1f} ms   {run['throughput_ips']} img/s   {run['status_codes']}")
+    print(f"  peak RSS {report['peak_rss_mb']} MB")
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"💾 Report written to {args.output}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
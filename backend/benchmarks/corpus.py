@@ -0,0 +1,23 @@
+"""Local image corpus the benchmarks run on"""
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def list_images(folder: Path, limit: Optional[int] = None) -> List[Path]:
+    """Image files in a folder (recursive), sorted so runs are comparable"""
+    folder = Path(folder)
+    if folder.is_file():
+        return [folder]
+    images = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return images[:limit] if limit else images
+
+
+def load_corpus(folder: Path, limit: Optional[int] = None) -> List[Tuple[str, bytes]]:
+    """(file name, raw bytes) of every corpus image, read once up front"""
+    corpus = [(path.name, path.read_bytes()) for path in list_images(folder, limit)]
+    if not corpus:
+        raise SystemExit(f"No images found in {folder}")
+    return corpus
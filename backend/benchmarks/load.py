@@ -0,0 +1,111 @@
+"""
+/scanner/detect under load
+Fires the corpus at the endpoint from N client threads and reports latency
+percentiles, throughput and status codes. Targets the Flask app in this
+process by default, or a running server when a base URL is given.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import latency_stats
+
+DETECT_PATH = "/scanner/detect"
+
+# Sends one upload and returns the HTTP status code
+Send = Callable[[str, bytes], int]
+
+
+def in_process_sender(user_id: Optional[str]) -> Send:
+    """Posts through Flask test clients (one per thread) of the app in this process"""
+    import app as app_module
+
+    local = threading.local()
+    form = {"user_id": user_id} if user_id else {"save_to_history": "false"}
+
+    def send(name: str, data: bytes) -> int:
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        response = client.post(
+            DETECT_PATH,
+            data={**form, "image": (BytesIO(data), name)},
+            content_type="multipart/form-data"
+        )
+        return response.status_code
+
+    return send
+
+
+def http_sender(base_url: str, user_id: Optional[str], timeout: float = 120.0) -> Send:
+    """Posts to a running server over HTTP (one session per thread)"""
+    import requests
+
+    local = threading.local()
+    url = base_url.rstrip("/") + DETECT_PATH
+    form = {"user_id": user_id} if user_id else {"save_to_history": "false"}
+
+    def send(name: str, data: bytes) -> int:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        try:
+            response = session.post(url, data=form, files={"image": (name, data)}, timeout=timeout)
+        except requests.RequestException as e:
+            print(f"⚠️ {name}: {e}")
+            return 0
+        return response.status_code
+
+    return send
+
+
+def benchmark_load(
+    send: Send,
+    corpus: List[Tuple[str, bytes]],
+    concurrency: int,
+    requests_count: int,
+    warmup: int = 1
+) -> Dict[str, Any]:
+    """
+    Latency and throughput of /scanner/detect at one concurrency level
+
+    Args:
+        send: in_process_sender or http_sender
+        corpus: (name, bytes) pairs, cycled through in order
+        concurrency: Client threads issuing requests back to back
+        requests_count: Timed requests in total
+        warmup: Untimed requests sent first, one at a time
+    """
+    for i in range(warmup):
+        send(*corpus[i % len(corpus)])
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def one(i: int):
+        name, data = corpus[i % len(corpus)]
+        start = time.perf_counter()
+        status = send(name, data)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests_count)))
+    wall = time.perf_counter() - wall_start
+
+    ok = statuses.get("200", 0)
+    return {
+        "concurrency": concurrency,
+        "requests": requests_count,
+        "wall_seconds": round(wall, 3),
+        "throughput_ips": round(ok / wall, 2) if wall > 0 else 0.0,
+        "status_codes": statuses,
+        "latency": latency_stats(latencies),
+    }
@@ -0,0 +1,105 @@
+"""Latency percentiles, timers and memory measurement"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import psutil
+
+
+def latency_stats(samples_ms: List[float]) -> Dict[str, Any]:
+    """count / mean / p50 / p95 / p99 / max of latencies in milliseconds"""
+    if not samples_ms:
+        return {"count": 0}
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "count": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(samples.max()), 2),
+    }
+
+
+class StageTimer:
+    """Collects wall-clock samples and error counts per named stage"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+            raise
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+
+    def fail(self, stage: str):
+        """Count a stage that returned an error result instead of raising"""
+        self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        stages = list(self.samples) + [s for s in self.errors if s not in self.samples]
+        return {
+            stage: {**latency_stats(self.samples.get(stage, [])), "errors": self.errors.get(stage, 0)}
+            for stage in stages
+        }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except ImportError:
+        # Windows: the working-set peak is the closest equivalent
+        return round(psutil.Process().memory_info().peak_wset / 1024 / 1024, 1)
+
+
+class RssSampler:
+    """
+    Samples the RSS of other processes (a separate web server or the
+    inference service) in the background and keeps the peak of each
+    """
+
+    def __init__(self, pids: Iterable[int], interval: float = 0.05):
+        self.processes = {pid: psutil.Process(pid) for pid in pids}
+        self.interval = interval
+        self.peaks: Dict[int, float] = {pid: 0.0 for pid in self.processes}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid, process in self.processes.items():
+                try:
+                    rss = process.memory_info().rss / 1024 / 1024
+                except psutil.Error:
+                    continue
+                self.peaks[pid] = max(self.peaks[pid], rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        if self.processes:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self) -> Dict[str, float]:
+        return {str(pid): round(peak, 1) for pid, peak in self.peaks.items()}
@@ -0,0 +1,147 @@
+"""
+Per-stage latency
+Runs each scanner stage on its own, in the order the /detect route does:
+decode -> quality gate (timed, never enforced) -> YOLO -> color / shape / size / disease on the primary fruit's crop
+-> stored sizes (800px image, 200px thumbnail) -> upload -> Mongo insert. Stages go through
+ai.inference, so SCANNER_INFERENCE_MODE=remote measures the service round trip.
+"""
+
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import StageTimer, latency_stats
+
+ROI_PADDING = float(os.getenv("SCANNER_ROI_PADDING", "0.1"))
+
+CLASSIFIER_STAGES = ("color", "shape", "size", "disease")
+STAGES = ("decode", "quality", "yolo") + CLASSIFIER_STAGES + ("derivatives", "cloudinary", "mongo")
+
+BENCHMARK_USER = {"name": "Benchmark", "email": "benchmark@durian.local", "role": "user"}
+
+
+def create_benchmark_user() -> str:
+    """A throwaway user the benchmark saves its scans under"""
+    import db
+    return str(db.users_collection.insert_one({**BENCHMARK_USER, "benchmark": True}).inserted_id)
+
+
+def cleanup_benchmark_user(user_id: str) -> int:
+    """Delete the benchmark user, its scans and their uploaded images"""
+    import db
+    from bson import ObjectId
+    from handlers.cloudinary_handler import CloudinaryScan
+
+    user_oid = ObjectId(user_id)
+    scans = list(db.scans_collection.find({"user_id": user_oid}, {"cloudinary_public_id": 1}))
+    for scan in scans:
+        if scan.get("cloudinary_public_id"):
+            CloudinaryScan.delete_scan_image(scan["cloudinary_public_id"])
+    db.scans_collection.delete_many({"user_id": user_oid})
+    db.users_collection.delete_one({"_id": user_oid})
+    return len(scans)
+
+
+def _scan_once(data: bytes, user_id: Optional[str], timer: StageTimer):
+    from ai.ingest import decode_upload
+    from ai.quality import assess_quality
+    from ai.inference import detect, get_durian_color, get_durian_shape, get_durian_size, get_durian_disease
+
+    classifiers = {
+        "color": get_durian_color,
+        "shape": get_durian_shape,
+        "size": get_durian_size,
+        "disease": get_durian_disease,
+    }
+
+    with timer.time("decode"):
+        image_ctx = decode_upload(data)
+
+    with timer.time("quality"):
+        assess_quality(image_ctx)
+
+    with timer.time("yolo"):
+        detection = detect(image_ctx)
+    if not detection.get("success"):
+        timer.fail("yolo")
+
+    # Classify the primary fruit's crop as the ROI pipeline does, or the
+    # whole image when nothing was found
+    primary = detection.get("detection", {}).get("primary")
+    target = image_ctx.crop(primary["bbox"], ROI_PADDING) if primary else image_ctx
+
+    results = {}
+    for stage, classify in classifiers.items():
+        with timer.time(stage):
+            results[stage] = classify(target)
+        if not results[stage].get("success"):
+            timer.fail(stage)
+
+    if user_id is None:
+        return
+
+    import db
+    from handlers.cloudinary_handler import CloudinaryScan
+    from handlers.derivative_handler import render_derivatives
+    from handlers.storage_handler import SCAN_VARIANTS
+
+    with timer.time("derivatives"):
+        rendered = render_derivatives(image_ctx.image, SCAN_VARIANTS)
+
+    with timer.time("cloudinary"):
+        upload = CloudinaryScan.upload_scan_derivatives(rendered, user_id, str(uuid.uuid4())[:8])
+    if not upload.get("success"):
+        timer.fail("cloudinary")
+        return
+
+    with timer.time("mongo"):
+        record = db.save_scan(
+            user_id=user_id,
+            image_url=upload.get("image_url"),
+            thumbnail_url=upload.get("thumbnail_url"),
+            cloudinary_public_id=upload.get("public_id"),
+            detection_result=detection.get("detection", {}),
+            analysis_result={**detection.get("analysis", {}), **results}
+        )
+    if record is None:
+        timer.fail("mongo")
+
+
+def benchmark_stages(
+    corpus: List[Tuple[str, bytes]],
+    repeats: int = 1,
+    warmup: int = 1,
+    user_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Time every stage on every corpus image
+
+    Args:
+        corpus: (name, bytes) pairs from corpus.load_corpus
+        repeats: Passes over the corpus
+        warmup: Untimed images run first (model loading, allocator warm-up)
+        user_id: Save scans under this user; None skips Cloudinary and Mongo
+    """
+    for name, data in corpus[:warmup]:
+        _scan_once(data, user_id, StageTimer())
+
+    timer = StageTimer()
+    totals: List[float] = []
+    for _ in range(repeats):
+        for name, data in corpus:
+            start = time.perf_counter()
+            try:
+                _scan_once(data, user_id, timer)
+            except Exception as e:
+                print(f"⚠️ {name}: {e}")
+                continue
+            totals.append((time.perf_counter() - start) * 1000)
+
+    stages = timer.report()
+    return {
+        "images": len(corpus),
+        "repeats": repeats,
+        "stages": {stage: stages[stage] for stage in STAGES if stage in stages},
+        "sequential_total": latency_stats(totals),
+    }
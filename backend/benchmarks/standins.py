@@ -0,0 +1,70 @@
+"""
+Local stand-ins for Cloudinary and MongoDB
+Both must be installed before db (or app) is imported. The Cloudinary
+stand-in writes uploads to a local folder and answers like the real API;
+the Mongo stand-in is an in-memory mongomock client.
+"""
+
+import hashlib
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+
+def use_local_cloudinary(out_dir: Path, latency_ms: float = 0.0):
+    """
+    Route cloudinary.uploader.upload/destroy to files under out_dir
+
+    Args:
+        out_dir: Where uploaded images are written
+        latency_ms: Simulated network round trip added to every call
+    """
+    import cloudinary.uploader
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def upload(source, **options) -> Dict[str, Any]:
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        if isinstance(source, (str, Path)):
+            data = Path(source).read_bytes()
+        elif isinstance(source, (bytes, bytearray)):
+            data = bytes(source)
+        else:
+            data = source.read()
+        public_id = options.get("public_id") or hashlib.sha256(data).hexdigest()[:16]
+        path = out_dir / f"{public_id.replace('/', '_')}.jpg"
+        path.write_bytes(data)
+        url = path.resolve().as_uri()
+        return {
+            "secure_url": url,
+            "public_id": public_id,
+            "format": "jpg",
+            "bytes": len(data),
+            "eager": [{"width": e.get("width"), "secure_url": url} for e in options.get("eager", [])],
+        }
+
+    def destroy(public_id, **options) -> Dict[str, str]:
+        path = out_dir / f"{public_id.replace('/', '_')}.jpg"
+        if path.exists():
+            path.unlink()
+            return {"result": "ok"}
+        return {"result": "not found"}
+
+    cloudinary.uploader.upload = upload
+    cloudinary.uploader.destroy = destroy
+    print(f"📁 Cloudinary stand-in: uploads go to {out_dir}")
+
+
+def use_local_mongo():
+    """Replace pymongo.MongoClient with an in-memory mongomock client"""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("The local Mongo stand-in needs mongomock: pip install mongomock")
+    import pymongo
+
+    pymongo.MongoClient = mongomock.MongoClient
+    print("🗄️ Mongo stand-in: in-memory mongomock")
+
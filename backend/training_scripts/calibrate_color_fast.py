@@ -0,0 +1,193 @@
+"""
+Calibration for the color fast path (ai/color_fast.py)
+Fits the histogram softmax regression on labeled images, then picks the
+lowest confidence threshold at which the scanner's answers (fast path when
+confident, CNN otherwise) still agree with the CNN alone on held-out images
+at --target-agreement. Writes backend/models/durian_color_histogram.json,
+which the scanner picks up without a restart.
+
+The images folder has one subfolder per color class:
+    photos/Brownish/*.jpg
+    photos/Greenish/*.jpg
+
+Usage:
+    python calibrate_color_fast.py --images path/to/photos
+    python calibrate_color_fast.py --images path/to/photos --crop --report color_fast_report.json
+
+Requirements:
+    pip install torch timm ultralytics
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Make the authapi package importable (ai.*)
+sys.path.insert(0, str(Path(__file__).parent.parent / "authapi"))
+
+from ai.color_fast import COLOR_FAST_MODEL, HistogramColorModel, color_features_batch, softmax
+from ai.durian_color import COLOR_CLASSES, get_durian_color_batch
+from ai.image_context import ImageContext
+from ai.model_registry import get_model_registry
+from ai.pipeline import ROI_PADDING
+from quantize_models import list_images
+
+
+def labeled_images(folder: Path, limit_per_class: int) -> List[Tuple[Path, int]]:
+    """(path, class index) for every image in a class subfolder"""
+    by_name = {name.lower(): i for i, name in enumerate(COLOR_CLASSES)}
+    samples = []
+    for sub in sorted(p for p in folder.iterdir() if p.is_dir()):
+        label = by_name.get(sub.name.lower())
+        if label is None:
+            print(f"⚠️ Skipping {sub.name}: not one of {COLOR_CLASSES}")
+            continue
+        samples += [(path, label) for path in list_images(sub, limit_per_class)]
+    return samples
+
+
+def load_regions(samples: List[Tuple[Path, int]], crop: bool) -> Tuple[List[ImageContext], np.ndarray]:
+    """Decoded images (primary-detection crops with --crop) and their labels"""
+    detector = None
+    if crop:
+        from ai.yolo_detector import get_yolo_detector
+        detector = get_yolo_detector()
+
+    images, labels = [], []
+    for path, label in samples:
+        image = ImageContext.from_path(str(path))
+        if detector is not None:
+            primary = detector.predict(image).get("detection", {}).get("primary")
+            if primary is None:
+                print(f"⚠️ {path.name}: no durian detected, skipping")
+                continue
+            image = image.crop(primary["bbox"], ROI_PADDING)
+        images.append(image)
+        labels.append(label)
+    return images, np.asarray(labels, dtype=np.int64)
+
+
+def fit_softmax(x: np.ndarray, y: np.ndarray, n_classes: int, l2: float, epochs: int, lr: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Full-batch gradient descent on the L2-regularized cross-entropy"""
+    weights = np.zeros((n_classes, x.shape[1]), dtype=np.float64)
+    bias = np.zeros(n_classes, dtype=np.float64)
+    onehot = np.eye(n_classes)[y]
+    for _ in range(epochs):
+        probs = softmax(x @ weights.T + bias)
+        error = (probs - onehot) / len(x)
+        weights -= lr * (error.T @ x + l2 * weights)
+        bias -= lr * error.sum(axis=0)
+    return weights, bias
+
+
+def sweep(fast_probs: np.ndarray, cnn_pred: np.ndarray, labels: np.ndarray) -> List[Dict[str, float]]:
+    """Coverage, agreement with the CNN and accuracy per confidence threshold"""
+    fast_pred = fast_probs.argmax(axis=1)
+    fast_conf = fast_probs.max(axis=1)
+    rows = []
+    for threshold in np.round(np.arange(1.0 / fast_probs.shape[1], 1.0, 0.01), 2):
+        covered = fast_conf >= threshold
+        combined = np.where(covered, fast_pred, cnn_pred)
+        rows.append({
+            "min_confidence": float(threshold),
+            "coverage": round(float(covered.mean()), 4),
+            "agreement_with_cnn": round(float((combined == cnn_pred).mean()), 4),
+            "accuracy": round(float((combined == labels).mean()), 4),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the color histogram fast path")
+    parser.add_argument("--images", required=True, type=Path, help="Folder with one subfolder per color class")
+    parser.add_argument("--max-per-class", type=int, default=2000)
+    parser.add_argument("--crop", action="store_true", help="Calibrate on the detector's primary crop, as the scanner classifies")
+    parser.add_argument("--val-split", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target-agreement", type=float, default=0.99,
+                        help="Held-out agreement with the CNN the chosen threshold must keep")
+    parser.add_argument("--l2", type=float, default=1e-3)
+    parser.add_argument("--epochs", type=int, default=2000)
+    parser.add_argument("--lr", type=float, default=0.5)
+    parser.add_argument("--output", type=Path, default=COLOR_FAST_MODEL, help="Model JSON to write")
+    parser.add_argument("--report", type=Path, help="Also write the agreement report as JSON")
+    args = parser.parse_args()
+
+    samples = labeled_images(args.images, args.max_per_class)
+    images, labels = load_regions(samples, args.crop)
+    if len(images) < 10 or len(set(labels.tolist())) < 2:
+        print(f"❌ Need labeled images of at least two classes in {args.images}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    features = color_features_batch(images)
+    fast_ms = (time.perf_counter() - start) * 1000 / len(images)
+
+    order = np.random.default_rng(args.seed).permutation(len(images))
+    n_val = max(1, int(len(order) * args.val_split))
+    val_idx, train_idx = order[:n_val], order[n_val:]
+
+    mean = features[train_idx].mean(axis=0)
+    std = features[train_idx].std(axis=0) + 1e-6
+    x_train = (features[train_idx] - mean) / std
+    weights, bias = fit_softmax(x_train, labels[train_idx], len(COLOR_CLASSES), args.l2, args.epochs, args.lr)
+    model = HistogramColorModel(COLOR_CLASSES, weights, bias, mean, std, min_confidence=1.01)
+
+    # The CNN the fast path stands in for: the active registry version
+    cnn_path = str(get_model_registry().spec("color").path)
+    val_images = [images[i] for i in val_idx]
+    start = time.perf_counter()
+    cnn_results = get_durian_color_batch(val_images, model_path=cnn_path)
+    cnn_ms = (time.perf_counter() - start) * 1000 / len(val_images)
+    if not all(r.get("success") for r in cnn_results):
+        print(f"❌ CNN failed: {next(r for r in cnn_results if not r.get('success'))}")
+        sys.exit(1)
+    cnn_pred = np.asarray([r["class_index"] for r in cnn_results])
+
+    val_labels = labels[val_idx]
+    fast_probs = model.predict_proba(features[val_idx])
+    rows = sweep(fast_probs, cnn_pred, val_labels)
+    passing = [row for row in rows if row["agreement_with_cnn"] >= args.target_agreement]
+    chosen = passing[0] if passing else None
+    model.min_confidence = chosen["min_confidence"] if chosen else 1.01
+
+    report: Dict[str, Any] = {
+        "calibrated_at": datetime.utcnow().isoformat(),
+        "images": {"train": int(len(train_idx)), "val": int(len(val_idx)), "cropped": args.crop},
+        "class_counts": {name: int((labels == i).sum()) for i, name in enumerate(COLOR_CLASSES)},
+        "cnn_model": Path(cnn_path).name,
+        "fast_accuracy": round(float((fast_probs.argmax(axis=1) == val_labels).mean()), 4),
+        "cnn_accuracy": round(float((cnn_pred == val_labels).mean()), 4),
+        "fast_cnn_agreement": round(float((fast_probs.argmax(axis=1) == cnn_pred).mean()), 4),
+        "target_agreement": args.target_agreement,
+        "chosen": chosen,
+        "fast_ms_per_image": round(fast_ms, 3),
+        "cnn_ms_per_image": round(cnn_ms, 3),
+    }
+    model.version = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    model.report = report
+    model.save(args.output)
+
+    print(f"📊 Fast accuracy {report['fast_accuracy']:.2%}  CNN accuracy {report['cnn_accuracy']:.2%}  "
+          f"fast/CNN agreement {report['fast_cnn_agreement']:.2%}")
+    print(f"⏱️ Features {fast_ms:.2f} ms/image vs CNN {cnn_ms:.2f} ms/image")
+    if chosen:
+        print(f"✅ min_confidence {chosen['min_confidence']}: {chosen['coverage']:.1%} of images skip the CNN, "
+              f"{chosen['agreement_with_cnn']:.2%} agreement with the CNN")
+    else:
+        print(f"❌ No threshold reaches {args.target_agreement:.2%} agreement; the fast path will never answer")
+    print(f"💾 Model written to {args.output}")
+
+    if args.report:
+        args.report.write_text(json.dumps({**report, "sweep": rows}, indent=2))
+        print(f"📝 Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+FP32 vs INT8 comparison for the scanner models
+Runs both versions of each model on the same local images and reports top-1
+agreement (primary detection class for the YOLO models), latency and model
+size. Enable DURIAN_QUANTIZED=true only for a report where every model is safe.
+
+Usage:
+    python compare_quantized.py --images path/to/photos
+    python compare_quantized.py --images path/to/photos --output int8_report.json
+
+Requirements:
+    pip install torch timm ultralytics onnxruntime
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+
+# Make the authapi package importable (ai.*)
+sys.path.insert(0, str(Path(__file__).parent.parent / "authapi"))
+
+from ai.onnx_backend import OnnxClassifier, quantized_path_for
+from export_onnx import CLASSIFIERS
+from quantize_models import ALL_MODELS, YOLO_MODELS, classifier_input, list_images
+
+
+def _timed(fn: Callable[[], Any]):
+    start = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - start) * 1000
+
+
+def _latency(samples: List[float]) -> Dict[str, float]:
+    return {
+        "mean_ms": round(float(np.mean(samples)), 2),
+        "p95_ms": round(float(np.percentile(samples, 95)), 2),
+    }
+
+
+def _report(name: str, agree: List[bool], fp32_ms: List[float], int8_ms: List[float],
+            fp32_path: Path, int8_path: Path, min_agreement: float) -> Dict[str, Any]:
+    agreement = float(np.mean(agree))
+    fp32_lat, int8_lat = _latency(fp32_ms), _latency(int8_ms)
+    return {
+        "model": name,
+        "images": len(agree),
+        "top1_agreement": round(agreement, 4),
+        "fp32": {**fp32_lat, "size_mb": round(fp32_path.stat().st_size / 1024 / 1024, 2)},
+        "int8": {**int8_lat, "size_mb": round(int8_path.stat().st_size / 1024 / 1024, 2)},
+        "speedup": round(fp32_lat["mean_ms"] / max(int8_lat["mean_ms"], 1e-6), 2),
+        "safe": agreement >= min_agreement,
+    }
+
+
+def compare_classifier(name: str, images: List[Path], min_agreement: float) -> Optional[Dict[str, Any]]:
+    model_path, build, input_size = CLASSIFIERS[name]
+    int8_path = quantized_path_for(model_path)
+    if not Path(model_path).exists() or not int8_path.exists():
+        print(f"⚠️ {name}: FP32 or INT8 model missing, skipping")
+        return None
+
+    fp32_model = build(model_path)
+    int8_model = OnnxClassifier(int8_path)
+
+    agree, fp32_ms, int8_ms = [], [], []
+    for image_path in images:
+        x = torch.from_numpy(classifier_input(image_path, input_size))
+        with torch.no_grad():
+            fp32_out, t_fp32 = _timed(lambda: fp32_model(x))
+        int8_out, t_int8 = _timed(lambda: int8_model(x))
+        agree.append(int(fp32_out.argmax(dim=1)[0]) == int(int8_out.argmax(dim=1)[0]))
+        fp32_ms.append(t_fp32)
+        int8_ms.append(t_int8)
+
+    return _report(name, agree, fp32_ms, int8_ms, Path(model_path), int8_path, min_agreement)
+
+
+def compare_yolo(name: str, images: List[Path], min_agreement: float) -> Optional[Dict[str, Any]]:
+    from ultralytics import YOLO
+
+    model_path = Path(YOLO_MODELS[name])
+    int8_path = quantized_path_for(model_path)
+    if not model_path.exists() or not int8_path.exists():
+        print(f"⚠️ {name}: FP32 or INT8 model missing, skipping")
+        return None
+
+    fp32_model = YOLO(str(model_path))
+    int8_model = YOLO(str(int8_path), task="detect")
+
+    def primary_class(model, image_path):
+        boxes = model.predict(source=str(image_path), conf=0.25, save=False, verbose=False)[0].boxes
+        if boxes is None or len(boxes) == 0:
+            return None  # "nothing detected" is a label too
+        return int(boxes.cls[int(boxes.conf.argmax())])
+
+    agree, fp32_ms, int8_ms = [], [], []
+    for image_path in images:
+        fp32_cls, t_fp32 = _timed(lambda: primary_class(fp32_model, image_path))
+        int8_cls, t_int8 = _timed(lambda: primary_class(int8_model, image_path))
+        agree.append(fp32_cls == int8_cls)
+        fp32_ms.append(t_fp32)
+        int8_ms.append(t_int8)
+
+    return _report(name, agree, fp32_ms, int8_ms, model_path, int8_path, min_agreement)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FP32 and INT8 scanner models")
+    parser.add_argument("--images", required=True, type=Path, help="Folder of evaluation images")
+    parser.add_argument("--max-images", type=int, default=500)
+    parser.add_argument("--models", nargs="+", choices=ALL_MODELS, default=ALL_MODELS)
+    parser.add_argument("--min-agreement", type=float, default=0.98,
+                        help="Top-1 agreement required to call a model safe")
+    parser.add_argument("--output", type=Path, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    images = list_images(args.images, args.max_images)
+    if not images:
+        print(f"❌ No images found in {args.images}")
+        sys.exit(1)
+
+    print(f"📊 Comparing FP32 vs INT8 on {len(images)} images...\n")
+    reports = []
+    for name in args.models:
+        compare = compare_classifier if name in CLASSIFIERS else compare_yolo
+        report = compare(name, images, args.min_agreement)
+        if report is None:
+            continue
+        reports.append(report)
+        print(
+            f"{'✅' if report['safe'] else '❌'} {name:<9} "
+            f"agreement {report['top1_agreement']:.2%}  "
+            f"fp32 {report['fp32']['mean_ms']:.1f} ms / {report['fp32']['size_mb']:.1f} MB  "
+            f"int8 {report['int8']['mean_ms']:.1f} ms / {report['int8']['size_mb']:.1f} MB  "
+            f"(x{report['speedup']})"
+        )
+
+    all_safe = bool(reports) and all(r["safe"] for r in reports)
+    summary = {
+        "images": len(images),
+        "min_agreement": args.min_agreement,
+        "all_safe": all_safe,
+        "models": reports,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2))
+        print(f"\n📝 Report written to {args.output}")
+
+    print("\nDURIAN_QUANTIZED=true is", "safe to enable" if all_safe else "NOT recommended")
+    sys.exit(0 if all_safe else 1)
+
+
+if __name__ == "__main__":
+    main()
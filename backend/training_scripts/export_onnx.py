@@ -0,0 +1,105 @@
+"""
+Export the EfficientNet classifiers to ONNX
+Writes <model>.onnx next to each classifier's active .pth (per
+backend/models/manifest.json) with a dynamic batch axis. The scanner serves
+the .onnx through onnxruntime automatically (DURIAN_CLASSIFIER_BACKEND=auto)
+and falls back to PyTorch when it is missing.
+
+The SHA-256 of the .pth is recorded in the graph; the scanner ignores a
+.onnx whose .pth has changed since, so re-run this after retraining.
+
+Each export is checked against PyTorch on a random batch; when the softmax
+outputs differ by more than PARITY_TOLERANCE the .onnx is deleted (so the
+scanner keeps serving PyTorch) and the script exits with status 1.
+
+Usage:
+    python export_onnx.py                 # color, size and shape
+    python export_onnx.py color shape     # selected models only
+
+Requirements:
+    pip install torch timm onnx onnxruntime
+"""
+
+import sys
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import torch
+
+# Make the authapi package importable (ai.*)
+sys.path.insert(0, str(Path(__file__).parent.parent / "authapi"))
+
+from ai import durian_color, durian_size, durian_shape
+from ai.model_registry import get_model_registry
+from ai.onnx_backend import OnnxClassifier, export_classifier, onnx_path_for
+
+# Largest softmax difference vs PyTorch an export may have
+PARITY_TOLERANCE = 1e-3
+
+
+def _classifier(name, build):
+    """(.pth, torch builder, input size) of the version active in the manifest"""
+    spec = get_model_registry().spec(name)
+    builder = partial(build, architecture=spec.architecture, num_classes=len(spec.classes))
+    return spec.path, builder, spec.input_size
+
+
+CLASSIFIERS = {
+    "color": _classifier("color", durian_color.build_color_model),
+    "size": _classifier("size", durian_size.build_size_model),
+    "shape": _classifier("shape", durian_shape.build_shape_model),
+}
+
+
+def export_one(name: str) -> str:
+    """
+    Export one classifier and check the graph against PyTorch
+
+    Returns:
+        "exported", "skipped" (no weights) or "failed" (parity check)
+    """
+    model_path, build, input_size = CLASSIFIERS[name]
+    if not Path(model_path).exists():
+        print(f"⚠️ {name}: {model_path} not found, skipping")
+        return "skipped"
+
+    model = build(model_path)
+    onnx_path = export_classifier(model, onnx_path_for(model_path), input_size, source=model_path)
+
+    # Parity check on a small batch (also exercises the dynamic batch axis)
+    x = torch.randn(2, 3, *input_size)
+    with torch.no_grad():
+        expected = torch.softmax(model(x), dim=1).numpy()
+    actual = torch.softmax(OnnxClassifier(onnx_path)(x), dim=1).numpy()
+    max_diff = float(np.abs(expected - actual).max())
+
+    if not max_diff <= PARITY_TOLERANCE:
+        # Never leave a wrong graph where the scanner would pick it up
+        onnx_path.unlink(missing_ok=True)
+        print(f"❌ {name}: max softmax diff vs torch {max_diff:.2e} exceeds {PARITY_TOLERANCE:.0e}; {onnx_path.name} removed")
+        return "failed"
+
+    print(f"✅ {name}: {onnx_path.name} (max softmax diff vs torch: {max_diff:.2e})")
+    return "exported"
+
+
+def main():
+    names = sys.argv[1:] or list(CLASSIFIERS)
+    unknown = [n for n in names if n not in CLASSIFIERS]
+    if unknown:
+        print(f"❌ Unknown model(s): {', '.join(unknown)}. Choose from: {', '.join(CLASSIFIERS)}")
+        sys.exit(1)
+
+    print("📦 Exporting classifiers to ONNX...")
+    results = {n: export_one(n) for n in names}
+    exported = [n for n, result in results.items() if result == "exported"]
+    failed = [n for n, result in results.items() if result == "failed"]
+    print(f"\nDone: {len(exported)}/{len(names)} exported")
+    if failed:
+        print(f"❌ Parity check failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
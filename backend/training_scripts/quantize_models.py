@@ -0,0 +1,175 @@
+"""
+INT8 post-training static quantization for the scanner models
+Calibrates on a folder of local durian photos and writes <model>.int8.onnx
+next to each model in backend/models. The scanner only serves these files
+when DURIAN_QUANTIZED=true, so run compare_quantized.py on the same kind of
+images first and enable the mode only if the agreement report is good.
+
+Usage:
+    python quantize_models.py --calib path/to/photos
+    python quantize_models.py --calib path/to/photos --models color detector
+
+Requirements:
+    pip install torch timm ultralytics onnx onnxruntime
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from PIL import Image
+
+# Make the authapi package importable (ai.*)
+sys.path.insert(0, str(Path(__file__).parent.parent / "authapi"))
+
+from ai import durian_desease, yolo_detector  # noqa: F401 (registry defaults)
+from ai.model_registry import get_model_registry
+from ai.image_context import get_transform
+from ai.onnx_backend import OnnxClassifier, onnx_path_for, quantized_path_for, weights_digest
+from export_onnx import CLASSIFIERS, export_one
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+YOLO_IMAGE_SIZE = 640
+
+# Active versions per backend/models/manifest.json
+YOLO_MODELS = {
+    "detector": get_model_registry().spec("detector").path,
+    "disease": get_model_registry().spec("disease").path,
+}
+ALL_MODELS = list(CLASSIFIERS) + list(YOLO_MODELS)
+
+
+def list_images(folder: Path, limit: Optional[int] = None) -> List[Path]:
+    """Image files in a folder (recursive), sorted for reproducible calibration"""
+    images = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return images[:limit] if limit else images
+
+
+def classifier_input(image_path: Path, input_size) -> np.ndarray:
+    """1x3xHxW float32 input, preprocessed exactly as the scanner does"""
+    with Image.open(image_path) as img:
+        return get_transform(input_size)(img.convert("RGB")).unsqueeze(0).numpy()
+
+
+def letterbox_input(image_path: Path, size: int = YOLO_IMAGE_SIZE) -> np.ndarray:
+    """1x3xSxS float32 RGB input letterboxed like ultralytics (gray 114 padding)"""
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        scale = size / max(img.size)
+        resized = img.resize(
+            (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+            Image.BILINEAR
+        )
+    canvas = Image.new("RGB", (size, size), (114, 114, 114))
+    canvas.paste(resized, ((size - resized.width) // 2, (size - resized.height) // 2))
+    x = np.asarray(canvas, dtype=np.float32).transpose(2, 0, 1) / 255.0
+    return x[None]
+
+
+def make_reader(input_name: str, images: List[Path], to_input: Callable[[Path], np.ndarray]):
+    """onnxruntime CalibrationDataReader over local images"""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class ImageFolderReader(CalibrationDataReader):
+        def __init__(self):
+            self._batches: Iterator[Dict[str, np.ndarray]] = (
+                {input_name: to_input(p)} for p in images
+            )
+
+        def get_next(self):
+            return next(self._batches, None)
+
+    return ImageFolderReader()
+
+
+def quantize_graph(
+    fp32_path: Path,
+    int8_path: Path,
+    images: List[Path],
+    to_input: Callable[[Path], np.ndarray],
+    op_types: Optional[List[str]] = None
+):
+    """Static QDQ quantization: INT8 weights (per channel) and UINT8 activations"""
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    input_name = ort.InferenceSession(
+        str(fp32_path), providers=["CPUExecutionProvider"]
+    ).get_inputs()[0].name
+
+    quantize_static(
+        str(fp32_path),
+        str(int8_path),
+        make_reader(input_name, images, to_input),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        op_types_to_quantize=op_types
+    )
+
+
+def quantize_classifier(name: str, images: List[Path]) -> bool:
+    model_path, _, input_size = CLASSIFIERS[name]
+    fp32_path = onnx_path_for(model_path)
+    # A missing graph, or one exported from older weights, is (re-)exported first
+    stale = not fp32_path.exists() or OnnxClassifier(fp32_path).source_digest != weights_digest(model_path)
+    if stale and export_one(name) != "exported":
+        return False
+
+    int8_path = quantized_path_for(model_path)
+    quantize_graph(fp32_path, int8_path, images, lambda p: classifier_input(p, input_size))
+    print(f"✅ {name}: {int8_path.name} ({_size_mb(fp32_path):.1f} MB -> {_size_mb(int8_path):.1f} MB)")
+    return True
+
+
+def quantize_yolo(name: str, images: List[Path]) -> bool:
+    from ultralytics import YOLO
+
+    model_path = Path(YOLO_MODELS[name])
+    if not model_path.exists():
+        print(f"⚠️ {name}: {model_path} not found, skipping")
+        return False
+
+    # Fixed 640x640 graph; ultralytics letterboxes every input to it
+    fp32_path = Path(YOLO(str(model_path)).export(
+        format="onnx", imgsz=YOLO_IMAGE_SIZE, dynamic=False, simplify=True
+    ))
+    int8_path = quantized_path_for(model_path)
+    # Only conv/matmul weights are quantized; the box decoding head stays FP32
+    quantize_graph(fp32_path, int8_path, images, letterbox_input, op_types=["Conv", "MatMul"])
+    print(f"✅ {name}: {int8_path.name} ({_size_mb(fp32_path):.1f} MB -> {_size_mb(int8_path):.1f} MB)")
+    return True
+
+
+def _size_mb(path: Path) -> float:
+    return path.stat().st_size / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 static quantization of the scanner models")
+    parser.add_argument("--calib", required=True, type=Path, help="Folder of calibration images")
+    parser.add_argument("--max-images", type=int, default=200, help="Calibration images to use")
+    parser.add_argument("--models", nargs="+", choices=ALL_MODELS, default=ALL_MODELS)
+    args = parser.parse_args()
+
+    images = list_images(args.calib, args.max_images)
+    if not images:
+        print(f"❌ No images found in {args.calib}")
+        sys.exit(1)
+
+    print(f"🔧 Quantizing {', '.join(args.models)} with {len(images)} calibration images...")
+    done = []
+    for name in args.models:
+        ok = quantize_classifier(name, images) if name in CLASSIFIERS else quantize_yolo(name, images)
+        if ok:
+            done.append(name)
+
+    print(f"\nDone: {len(done)}/{len(args.models)} quantized")
+    print("Next: python compare_quantized.py --images <folder> before setting DURIAN_QUANTIZED=true")
+
+
+if __name__ == "__main__":
+    main()